@@ -1,5 +1,4 @@
 import os
-import torch
 from dotenv import load_dotenv
 
 # Load variables from .env file
@@ -8,7 +7,56 @@ load_dotenv()
 # --- Qdrant Configuration ---
 QDRANT_HOST = "localhost"
 QDRANT_PORT = 6333
+QDRANT_GRPC_PORT = 6334
+QDRANT_PREFER_GRPC = False
+QDRANT_POOL_SIZE = 100         # keep-alive HTTP connections per client
+# Host path of the Qdrant storage volume; only used to report on-disk size.
+QDRANT_STORAGE_PATH = os.getenv("QDRANT_STORAGE_PATH")
 COLLECTION_NAME = "colpali_qdrant_os_textbook"
+# Storage/index layout, one of qdrant_client.COLLECTION_PROFILES. With a
+# profile that makes `initial` rerank-only, set SEARCH_PREFETCH_VECTOR to an
+# HNSW-indexed vector (e.g. "mean_pooling") to fetch candidates from.
+COLLECTION_PROFILE = os.getenv("COLLECTION_PROFILE", "default")
+SEARCH_PREFETCH_VECTOR = None
+SEARCH_PREFETCH_LIMIT = 100
+# "auto" hashes points over the profile's shards. "book" gives every book its
+# own shard key and "book_group" hashes books into SHARD_GROUPS keys; searches
+# scoped to books are then routed only to their shards.
+SHARDING_MODE = os.getenv("SHARDING_MODE", "auto")
+SHARD_GROUPS = 4
+# Bulk load: run_indexing disables index building while streaming points
+# and re-enables it (at INDEXING_THRESHOLD KB per segment) once at the end.
+BULK_LOAD_MODE = os.getenv("BULK_LOAD_MODE", "1") == "1"
+INDEXING_THRESHOLD = 20000
+INDEXING_LOG_FILE = "logs/indexing_runs.csv"
+# Blue/green: COLLECTION_NAME is an alias. run_indexing builds a new
+# <name>_v<timestamp> collection, switches the alias once it is optimised
+# and keeps KEEP_COLLECTION_VERSIONS previous versions for rollback.
+# With it off the alias is switched before loading and old versions dropped.
+BLUE_GREEN_INDEXING = True
+KEEP_COLLECTION_VERSIONS = 1
+
+# Payload projection: candidates only carry the light fields, the heavy
+# fields are hydrated in one batched call for the final top-k.
+SEARCH_PAYLOAD_FIELDS = ["book_name", "page_number", "object_name"]
+HYDRATE_PAYLOAD_FIELDS = ["page_text", "page_url", "thumbnail_url"]
+
+# --- Sparse / Hybrid Search Configuration ---
+SPARSE_VECTOR_NAME = "bm25"
+BM25_K1 = 1.2
+BM25_B = 0.75
+BM25_AVG_DOC_LEN = 256
+SEARCH_MODE = "dense"          # "dense" or "hybrid"
+HYBRID_MODE = "rerank"         # "rerank" (BM25 -> MaxSim) or "rrf" (fusion)
+HYBRID_PREFETCH_LIMIT = 100
+
+# --- Search Parameters ---
+# None leaves the server default. `initial` is binary-quantised, so the
+# quantisation knobs trade recall for latency; see run_search_param_sweep.py.
+SEARCH_HNSW_EF = None
+SEARCH_EXACT = False
+QUANTIZATION_RESCORE = None    # rescore quantised candidates with original vectors
+QUANTIZATION_OVERSAMPLING = None  # e.g. 2.0 fetches 2x limit candidates before rescoring
 
 # --- MinIO Configuration ---
 MINIO_HOST = "localhost:9000"
@@ -16,10 +64,117 @@ MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minio-password")
 MINIO_BUCKET = "textbooks"
 MINIO_SECURE = False
+MINIO_POOL_SIZE = 32
+IMAGE_FETCH_WORKERS = 8        # bounded pool for concurrent result-page downloads
+PREFETCH_NEXT_PAGE = True      # speculatively download the next page of results
+
+# Thumbnails are rendered at ingest into a separate bucket (so indexing never
+# picks them up), keyed w<width>/<book>/page_N.jpg parallel to the full page.
+THUMBNAIL_BUCKET = "textbooks-thumbnails"
+THUMBNAIL_WIDTHS = [256, 512]
+THUMBNAIL_DISPLAY_WIDTH = 256  # size referenced by the payload's thumbnail_url
+THUMBNAIL_CACHE_BYTES = 32 * 1024 * 1024
 
 # --- VLM Model Configuration ---
 MODEL_NAME = "vidore/colpali-v1.3"
 IMAGE_SEQ_LENGTH = 1024
 DIM = 128
-DEVICE = "cuda:0" if torch.cuda.is_available() else "cpu"
 BATCH_SIZE = 2
+ENCODE_WORKERS = 1             # threads running query forward passes in async paths
+# "bf16" or "int8" (dynamic int8 Linear layers, CPU only) for query encoding.
+# Indexing always uses bf16 so stored page vectors keep full fidelity.
+ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "bf16")
+# Query-token pruning before MaxSim: drop special/augmentation tokens and
+# near-duplicates, then keep at most QUERY_MAX_TOKENS (None = no cap).
+QUERY_TOKEN_PRUNING = False
+QUERY_MAX_TOKENS = None
+QUERY_DEDUP_THRESHOLD = 0.98
+
+# Pre-converted bf16 safetensors written by prepare_weights.py. Loaders use a
+# snapshot when one exists here and fall back to the Hub repo otherwise.
+WEIGHT_SNAPSHOT_DIR = os.getenv("WEIGHT_SNAPSHOT_DIR", "weights")
+
+# --- Retrieval Service Configuration ---
+SERVICE_HOST = "0.0.0.0"
+SERVICE_PORT = 8000
+SERVICE_WORKERS = 1            # each worker process loads its own models
+SERVICE_URL = os.getenv("RETRIEVAL_SERVICE_URL", f"http://localhost:{SERVICE_PORT}")
+SERVICE_TIMEOUT = 120          # seconds, client-side request timeout
+SERVICE_ENABLE_LLM = True
+LLM_MODEL_NAME = "meta-llama/Llama-2-7b-chat-hf"
+LLM_CONTINUOUS_BATCHING = True # merge concurrent generations into shared decode steps
+LLM_MAX_BATCH_SIZE = 8
+LLM_PREFIX_CACHE = True        # prefill the constant instruction prefix once
+CONTEXT_TOKEN_BUDGET = 2048    # max prompt tokens spent on retrieved page text
+
+# Semantic answer cache: reuse an answer for a near-identical query that
+# retrieved the same pages; cleared when the collection changes.
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_MAX_ENTRIES = 1024
+ANSWER_CACHE_THRESHOLD = 0.95  # cosine similarity of pooled query embeddings
+ANSWER_CACHE_CHECK_INTERVAL = 5.0  # seconds between collection fingerprint checks
+TOP_K = 5
+
+# --- Collection Snapshots ---
+# manage_snapshots.py exports the collection plus an indexing manifest to
+# SNAPSHOT_DIR (and SNAPSHOT_BUCKET in MinIO). Benchmarks restore
+# BENCHMARK_SNAPSHOT, when set, instead of re-encoding the library.
+SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_BUCKET = "qdrant-snapshots"
+BENCHMARK_SNAPSHOT = os.getenv("BENCHMARK_SNAPSHOT")
+# Settings the stored vectors depend on; a snapshot built with different
+# values is refused on restore.
+INDEXING_SETTINGS = {
+    "model_name": MODEL_NAME,
+    "dim": DIM,
+    "image_seq_length": IMAGE_SEQ_LENGTH,
+    "sparse_vector_name": SPARSE_VECTOR_NAME,
+    "bm25_k1": BM25_K1,
+    "bm25_b": BM25_B,
+    "bm25_avg_doc_len": BM25_AVG_DOC_LEN,
+}
+
+
+# --- Tracing ---
+# Nestable per-stage spans (image download, encoder steps, upsert, search,
+# hydration, LLM prefill/decode). TRACING=1 enables them; spans are buffered
+# in memory and written to TRACE_DIR every TRACE_FLUSH_INTERVAL seconds and
+# on exit, as Chrome trace-event JSON (chrome://tracing, Perfetto) or OTLP/JSON.
+TRACING_ENABLED = os.getenv("TRACING", "0") == "1"
+TRACE_DIR = "logs/traces"
+TRACE_FORMAT = os.getenv("TRACE_FORMAT", "chrome")  # "chrome" or "otlp"
+TRACE_MAX_SPANS = 100_000      # buffered spans; later ones are dropped until the next flush
+TRACE_FLUSH_INTERVAL = 60.0
+
+# --- Metrics ---
+# Counters, gauges and latency histograms (pages indexed, encode/upsert
+# time, upsert retries, per-stage query latency, cache hit rates) in the
+# Prometheus text format. run_server.py serves them at /metrics; run_indexing
+# and the Streamlit app start a small HTTP server on their own port.
+METRICS_ENABLED = os.getenv("METRICS", "1") == "1"
+INDEXING_METRICS_PORT = 9101
+APP_METRICS_PORT = 9102
+UPSERT_RETRIES = 3
+UPSERT_RETRY_BACKOFF = 0.5     # seconds before the first retry, doubled on each further one
+
+# --- Resource Monitor ---
+# experiments/monitor.py listens here for phase markers (UDP) sent by the
+# benchmark scripts through services.phase_markers.
+MONITOR_PHASE_HOST = "127.0.0.1"
+MONITOR_PHASE_PORT = 9125
+
+# --- Deferred Settings ---
+# DEVICE needs torch to probe for CUDA. It is resolved on first access
+# (PEP 562 module __getattr__) so scripts that never load a model, such as
+# the PDF rasteriser and the plotting tools, do not pay the torch import.
+
+def _detect_device() -> str:
+    import torch
+    return "cuda:0" if torch.cuda.is_available() else "cpu"
+
+def __getattr__(name: str):
+    if name == "DEVICE":
+        value = os.getenv("DEVICE") or _detect_device()
+        globals()["DEVICE"] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
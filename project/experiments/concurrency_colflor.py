@@ -36,7 +36,7 @@ def run_single_retrieval(query_text: str, model, processor, q_client):
 
         query_vector = vlm_encoder.encode_query(
             model, processor, query_text, config.DEVICE
-        )
+        )["initial"]
 
         results = qdrant_client.search_qdrant(
             q_client, 
@@ -0,0 +1,97 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+import pandas as pd
+
+# Entry points measured by default (module paths relative to the project root).
+# plot_concurrency is omitted because it writes its chart at import time.
+ENTRY_POINTS = [
+    "config",
+    "process_pdfs",
+    "run_indexing",
+    "run_retrieval",
+    "run_app",
+    "run_server",
+    "experiments.plot_res",
+    "experiments.monitor",
+]
+HEAVY_PACKAGES = ["torch", "transformers", "colpali_engine", "qdrant_client"]
+RESULTS_FILE = "logs/import_time_report.csv"
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_import(module: str) -> dict:
+    """
+    Imports one module in a fresh interpreter with -X importtime and returns
+    its wall-clock time, cumulative import time and which heavy packages
+    ended up loaded.
+    """
+    probe = (
+        f"import sys; import {module}; "
+        f"print(','.join(p for p in {HEAVY_PACKAGES!r} if p in sys.modules))"
+    )
+    start_time = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=PROJECT_ROOT, capture_output=True, text=True
+    )
+    wall_ms = (time.perf_counter() - start_time) * 1000
+
+    # Lines look like "import time:  self [us] | cumulative | imported package";
+    # top-level imports are the ones whose package name is not indented.
+    top_level_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        if not name.startswith("  "):
+            top_level_us += int(cumulative)
+
+    return {
+        "entry_point": module,
+        "ok": proc.returncode == 0,
+        "wall_ms": wall_ms,
+        "import_ms": top_level_us / 1000,
+        "heavy_loaded": proc.stdout.strip() if proc.returncode == 0 else "",
+    }
+
+
+def main():
+    """
+    Reports the start-up (import) cost of each entry point. Run it once on
+    the old tree and once on the new one with different --label values;
+    rows are appended to the same CSV and compared side by side.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--label", default="current", help="tag for this measurement, e.g. before/after")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per entry point (best is kept)")
+    parser.add_argument("modules", nargs="*", default=ENTRY_POINTS)
+    args = parser.parse_args()
+
+    rows = []
+    for module in args.modules:
+        runs = [measure_import(module) for _ in range(args.repeat)]
+        best = min(runs, key=lambda r: r["wall_ms"])
+        best["label"] = args.label
+        rows.append(best)
+        status = "" if best["ok"] else "  (import failed)"
+        print(f"{module:<24} {best['wall_ms']:8.0f} ms wall  {best['import_ms']:8.0f} ms imports"
+              f"  heavy=[{best['heavy_loaded']}]{status}")
+
+    results_path = os.path.join(PROJECT_ROOT, RESULTS_FILE)
+    os.makedirs(os.path.dirname(results_path), exist_ok=True)
+    df = pd.DataFrame(rows)
+    if os.path.exists(results_path):
+        previous = pd.read_csv(results_path)
+        df = pd.concat([previous[previous["label"] != args.label], df], ignore_index=True)
+    df.to_csv(results_path, index=False)
+    print(f"Results saved to {results_path}")
+
+    if df["label"].nunique() > 1:
+        print("\n--- Wall-clock start-up by label (ms) ---")
+        print(df.pivot(index="entry_point", columns="label", values="wall_ms").round(0))
+
+if __name__ == "__main__":
+    main()
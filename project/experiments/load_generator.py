@@ -0,0 +1,207 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import httpx
+import pandas as pd
+
+import config
+from services import phase_markers, qdrant_client
+from services.latency_histogram import LatencyHistogram
+
+STAGES = ["e2e", "encode", "search"]
+QUERIES_FILE = "experiments/benchmark_queries.txt"
+RESULTS_DIR = "logs/loadgen"
+SUMMARY_FILE = "logs/loadgen_results.csv"
+
+
+def load_queries(path: str) -> list:
+    """One query per line; blank lines and # comments are skipped. Duplicates weight the mix."""
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+async def make_request_fn(stage: str, http: httpx.AsyncClient, queries: list, top_k: int):
+    """
+    Returns the coroutine function issuing one request for the stage:
+      e2e:    POST /search on the retrieval service (encode + search + hydrate)
+      encode: POST /encode on the retrieval service
+      search: Qdrant search only, with query vectors encoded up front
+    """
+    if stage == "e2e":
+        async def request(query):
+            response = await http.post("/search", json={"query": query, "top_k": top_k})
+            response.raise_for_status()
+        return request, None
+
+    if stage == "encode":
+        async def request(query):
+            response = await http.post("/encode", json={"query": query})
+            response.raise_for_status()
+        return request, None
+
+    # Search-only: encode each distinct query once through the service, then
+    # drive Qdrant directly so encoder time is excluded.
+    vectors = {}
+    for query in sorted(set(queries)):
+        response = await http.post("/encode", json={"query": query})
+        response.raise_for_status()
+        vectors[query] = response.json()["initial"]
+    q_client = await qdrant_client.get_async_qdrant_client(
+        config.QDRANT_HOST,
+        config.QDRANT_PORT,
+        prefer_grpc=config.QDRANT_PREFER_GRPC,
+        grpc_port=config.QDRANT_GRPC_PORT,
+        pool_size=config.QDRANT_POOL_SIZE
+    )
+
+    async def request(query):
+        results = await qdrant_client.async_search_qdrant(
+            q_client, config.COLLECTION_NAME, vectors[query], top_k,
+            payload_fields=config.SEARCH_PAYLOAD_FIELDS
+        )
+        if not results:
+            raise RuntimeError("search returned no results")
+    return request, q_client
+
+
+async def run_open_loop(request_fn, queries, rate, duration, warmup, arrival, seed) -> dict:
+    """
+    Issues requests at a fixed offered rate regardless of how fast earlier
+    ones complete (open loop). Latency is measured from each request's
+    intended send time, so when the system (or the generator) falls
+    behind, queueing delay is counted instead of silently omitted.
+    Requests scheduled during the warm-up window are not recorded.
+    """
+    rng = random.Random(seed)
+    histogram = LatencyHistogram()
+    stats = {"errors": 0, "in_flight": 0, "peak_in_flight": 0, "max_send_lag_ms": 0.0}
+
+    async def fire(query, intended, measured):
+        stats["in_flight"] += 1
+        stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+        try:
+            await request_fn(query)
+            ok = True
+        except Exception:
+            ok = False
+        finally:
+            stats["in_flight"] -= 1
+        if measured:
+            if ok:
+                histogram.record((time.perf_counter() - intended) * 1000)
+            else:
+                stats["errors"] += 1
+
+    tasks = []
+    start = time.perf_counter() + 0.1
+    offset = 0.0
+    while offset < warmup + duration:
+        intended = start + offset
+        delay = intended - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            stats["max_send_lag_ms"] = max(stats["max_send_lag_ms"], -delay * 1000)
+        tasks.append(asyncio.create_task(fire(rng.choice(queries), intended, offset >= warmup)))
+        offset += rng.expovariate(rate) if arrival == "poisson" else 1.0 / rate
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - (start + warmup)
+
+    return {
+        "histogram": histogram,
+        "errors": stats["errors"],
+        "throughput_qps": histogram.count / elapsed if elapsed > 0 else 0.0,
+        "peak_in_flight": stats["peak_in_flight"],
+        "max_send_lag_ms": stats["max_send_lag_ms"],
+    }
+
+
+async def run(args):
+    queries = load_queries(args.queries)
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    async with httpx.AsyncClient(base_url=config.SERVICE_URL, timeout=config.SERVICE_TIMEOUT, limits=limits) as http:
+        request_fn, q_client = await make_request_fn(args.stage, http, queries, args.top_k)
+        rows = []
+        try:
+            for rate in args.rates:
+                print(f"\n--- Stage: {args.stage} | Offered rate: {rate} req/s | "
+                      f"{args.warmup}s warm-up + {args.duration}s measured ---")
+                # Marks the run (warm-up included) for the resource monitor's timeline
+                with phase_markers.phase(
+                    f"{args.label}/{args.stage}@{rate:g}qps", config.MONITOR_PHASE_HOST, config.MONITOR_PHASE_PORT,
+                    warmup_s=args.warmup
+                ):
+                    result = await run_open_loop(
+                        request_fn, queries, rate, args.duration, args.warmup, args.arrival, args.seed
+                    )
+                summary = result["histogram"].summary()
+                row = {
+                    "label": args.label,
+                    "stage": args.stage,
+                    "arrival": args.arrival,
+                    "offered_qps": rate,
+                    "throughput_qps": result["throughput_qps"],
+                    "errors": result["errors"],
+                    "peak_in_flight": result["peak_in_flight"],
+                    "max_send_lag_ms": result["max_send_lag_ms"],
+                    **summary,
+                }
+                rows.append(row)
+                print(f"  Throughput: {row['throughput_qps']:.1f} req/s | p50: {summary['p50_ms'] or 0:.1f} ms | "
+                      f"p99: {summary['p99_ms'] or 0:.1f} ms | errors: {row['errors']}")
+                if result["max_send_lag_ms"] > 10:
+                    print(f"  Warning: generator fell up to {result['max_send_lag_ms']:.0f} ms behind schedule")
+
+                os.makedirs(RESULTS_DIR, exist_ok=True)
+                path = os.path.join(RESULTS_DIR, f"{args.label}_{args.stage}_{rate:g}qps.json")
+                with open(path, "w") as f:
+                    json.dump({
+                        **row,
+                        "duration_s": args.duration,
+                        "warmup_s": args.warmup,
+                        "queries_file": args.queries,
+                        "histogram": result["histogram"].to_dict(),
+                    }, f, indent=2)
+        finally:
+            if q_client is not None:
+                await q_client.close()
+    return rows
+
+
+def main():
+    """
+    Open-loop load generator for the retrieval service. Requests arrive at
+    a fixed (or Poisson) rate, with queries drawn from a file; latencies go
+    into an HDR-style histogram after a warm-up period. Each rate writes a
+    JSON result (with histogram buckets) and a row in the summary CSV that
+    plot_concurrency.py reads.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--stage", choices=STAGES, default="e2e")
+    parser.add_argument("--rates", type=float, nargs="+", default=[1, 2, 5, 10], help="offered request rates (req/s)")
+    parser.add_argument("--duration", type=float, default=60, help="measured seconds per rate")
+    parser.add_argument("--warmup", type=float, default=10, help="seconds excluded from the results")
+    parser.add_argument("--arrival", choices=["uniform", "poisson"], default="poisson")
+    parser.add_argument("--queries", default=QUERIES_FILE)
+    parser.add_argument("--top-k", type=int, default=config.TOP_K)
+    parser.add_argument("--connections", type=int, default=100, help="HTTP connection pool size")
+    parser.add_argument("--label", default="run", help="tag stored with the results")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("--- Initializing Open-Loop Load Generator ---")
+    rows = asyncio.run(run(args))
+
+    print("\n--- Load Generation Complete ---")
+    results_df = pd.DataFrame(rows)
+    if os.path.exists(SUMMARY_FILE):
+        results_df = pd.concat([pd.read_csv(SUMMARY_FILE), results_df], ignore_index=True)
+    results_df.to_csv(SUMMARY_FILE, index=False)
+    print(f"Results saved to {SUMMARY_FILE}")
+    print(pd.DataFrame(rows)[["stage", "offered_qps", "throughput_qps", "p50_ms", "p99_ms", "errors"]])
+
+if __name__ == "__main__":
+    main()
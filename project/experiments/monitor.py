@@ -1,56 +1,252 @@
+import argparse
+import json
+import os
 import psutil
+import select
+import socket
 import time
 import csv
 import datetime
 
+import config
+
 # Configuration
 OUTPUT_FILE = "logs/system_resources.csv"
-INTERVAL = 1.0 
+PROCESS_OUTPUT_FILE = "logs/process_resources.csv"
+PHASES_FILE = "logs/benchmark_phases.csv"
+INTERVAL = 1.0
+RESCAN_INTERVAL = 2.0          # seconds between searches for newly started processes
+# label=pattern; a process matches when its name equals the pattern or its
+# command line contains it. Children of a matched process are counted too.
+DEFAULT_PROCESSES = ["qdrant=qdrant", "server=run_server.py", "indexing=run_indexing.py"]
+
+PROCESS_COLUMNS = [
+    "timestamp", "process", "pids", "cpu_percent", "rss_mb", "threads",
+    "read_mb_s", "write_mb_s", "minor_faults_s", "major_faults_s",
+]
+
+
+def parse_targets(specs) -> dict:
+    targets = {}
+    for spec in specs:
+        label, sep, pattern = spec.partition("=")
+        targets[label] = pattern if sep else label
+    return targets
+
+
+def read_page_faults(pid: int) -> tuple:
+    """Cumulative (minor, major) page faults from /proc/<pid>/stat (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # The command name may contain spaces; fields follow the last ')'
+            fields = f.read().rsplit(")", 1)[1].split()
+        return int(fields[7]), int(fields[9])
+    except (OSError, IndexError, ValueError):
+        return 0, 0
+
+
+class ProcessGroup:
+    """
+    The processes behind one label, tracked across samples so CPU, disk I/O
+    and page faults can be reported as rates over the actual elapsed time.
+    """
+
+    def __init__(self, label: str, pattern: str):
+        self.label = label
+        self.pattern = pattern
+        self.processes = {}   # pid -> psutil.Process
+        self.last = {}        # pid -> (read_bytes, write_bytes, minor_faults, major_faults)
+
+    def matches(self, proc: psutil.Process) -> bool:
+        try:
+            return proc.name() == self.pattern or self.pattern in " ".join(proc.cmdline())
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            return False
+
+    def rescan(self, own_pid: int):
+        found = set()
+        for proc in psutil.process_iter():
+            if proc.pid != own_pid and self.matches(proc):
+                found.add(proc.pid)
+                try:
+                    found.update(child.pid for child in proc.children(recursive=True))
+                except psutil.Error:
+                    pass
+        for pid in found - set(self.processes):
+            try:
+                proc = psutil.Process(pid)
+                proc.cpu_percent(None)  # prime, like the system-wide counter
+                self.processes[pid] = proc
+                self.last[pid] = self._counters(proc)
+            except psutil.Error:
+                pass
+
+    @staticmethod
+    def _counters(proc: psutil.Process) -> tuple:
+        try:
+            io = proc.io_counters()
+            read_bytes, write_bytes = io.read_bytes, io.write_bytes
+        except (psutil.AccessDenied, AttributeError):
+            read_bytes = write_bytes = 0
+        return (read_bytes, write_bytes) + read_page_faults(proc.pid)
+
+    def sample(self, elapsed: float) -> dict:
+        totals = {"cpu_percent": 0.0, "rss": 0, "threads": 0, "deltas": [0, 0, 0, 0]}
+        for pid, proc in list(self.processes.items()):
+            try:
+                with proc.oneshot():
+                    totals["cpu_percent"] += proc.cpu_percent(None)
+                    totals["rss"] += proc.memory_info().rss
+                    totals["threads"] += proc.num_threads()
+                    counters = self._counters(proc)
+            except psutil.Error:
+                # Exited since the last sample
+                del self.processes[pid]
+                self.last.pop(pid, None)
+                continue
+            for i, (now, before) in enumerate(zip(counters, self.last[pid])):
+                totals["deltas"][i] += max(now - before, 0)
+            self.last[pid] = counters
+        read_bytes, write_bytes, minor_faults, major_faults = totals["deltas"]
+        return {
+            "process": self.label,
+            "pids": len(self.processes),
+            "cpu_percent": f"{totals['cpu_percent']:.1f}",
+            "rss_mb": f"{totals['rss'] / 1024 / 1024:.1f}",
+            "threads": totals["threads"],
+            "read_mb_s": f"{read_bytes / 1024 / 1024 / elapsed:.2f}",
+            "write_mb_s": f"{write_bytes / 1024 / 1024 / elapsed:.2f}",
+            "minor_faults_s": f"{minor_faults / elapsed:.0f}",
+            "major_faults_s": f"{major_faults / elapsed:.0f}",
+        }
+
+
+def parse_phase_marker(datagram: bytes) -> tuple:
+    """
+    (sent_at, event, phase, extra fields) of a marker sent by
+    services.phase_markers, or of a plain-text "<start|end> <phase>" one.
+    """
+    text = datagram.decode("utf-8", "replace").strip()
+    try:
+        marker = json.loads(text)
+        sent_at = datetime.datetime.fromtimestamp(float(marker.pop("time", time.time())))
+        return sent_at, str(marker.pop("event", "start")), str(marker.pop("phase")), marker
+    except (ValueError, KeyError, TypeError, AttributeError):
+        event, _, phase = text.partition(" ")
+        return datetime.datetime.now(), event, phase, {}
+
+
+def monitor_resources(interval: float, targets: dict, phase_port: int):
+    print(f"Starting resource monitor ({interval}s interval). Logging to {OUTPUT_FILE}, "
+          f"{PROCESS_OUTPUT_FILE} and {PHASES_FILE}...")
+    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
 
-def monitor_resources():
-    print(f"Starting resource monitor. Logging to {OUTPUT_FILE}...")
-    
     # 1. Prime the CPU counter so the first loop value is accurate
     psutil.cpu_percent(interval=None)
-    
+
     # 2. Initialize network counters for the differential calculation
     last_net_io = psutil.net_io_counters()
-    
-    with open(OUTPUT_FILE, "w", newline="") as f:
+
+    # 3. Find the tracked processes and listen for phase markers
+    own_pid = os.getpid()
+    groups = [ProcessGroup(label, pattern) for label, pattern in targets.items()]
+    for group in groups:
+        group.rescan(own_pid)
+        print(f"  {group.label}: {len(group.processes)} process(es) matching '{group.pattern}'")
+    phase_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    phase_socket.bind((config.MONITOR_PHASE_HOST, phase_port))
+    print(f"  Listening for phase markers on udp://{config.MONITOR_PHASE_HOST}:{phase_port}")
+
+    with open(OUTPUT_FILE, "w", newline="") as f, \
+            open(PROCESS_OUTPUT_FILE, "w", newline="") as process_file, \
+            open(PHASES_FILE, "w", newline="") as phases_file:
         writer = csv.writer(f)
         writer.writerow(["timestamp", "cpu_percent", "memory_percent", "net_sent_mb_s", "net_recv_mb_s"])
-        
+        process_writer = csv.DictWriter(process_file, fieldnames=PROCESS_COLUMNS)
+        process_writer.writeheader()
+        phases_writer = csv.writer(phases_file)
+        phases_writer.writerow(["timestamp", "event", "phase", "fields"])
+
+        last_sample = time.perf_counter()
+        last_rescan = last_sample
+        next_sample = last_sample + interval
         try:
             while True:
-                # Sleep first to create the interval for measurement
-                time.sleep(INTERVAL)
-                
+                # Wait for the next sample on a fixed schedule, handling phase
+                # markers as they arrive instead of once per interval
+                timeout = next_sample - time.perf_counter()
+                if timeout > 0:
+                    readable, _, _ = select.select([phase_socket], [], [], timeout)
+                    if readable:
+                        sent_at, event, phase, fields = parse_phase_marker(phase_socket.recv(65536))
+                        phases_writer.writerow([sent_at.isoformat(), event, phase, json.dumps(fields) if fields else ""])
+                        phases_file.flush()
+                        print(f"[{sent_at:%H:%M:%S.%f}] phase {event}: {phase}")
+                        continue
+                next_sample += interval
+
+                now = time.perf_counter()
+                elapsed = now - last_sample
+                last_sample = now
                 timestamp = datetime.datetime.now().isoformat()
-                
+
                 # CPU & Memory
-                # interval=None is now safe because we sleep(INTERVAL) above
-                cpu = psutil.cpu_percent(interval=None) 
+                # interval=None measures since the previous call, one interval ago
+                cpu = psutil.cpu_percent(interval=None)
                 mem = psutil.virtual_memory().percent
-                
+
                 # Network I/O (Differential)
                 net_io_now = psutil.net_io_counters()
-                
+
                 # Calculate delta (bytes since last loop)
                 sent_bytes_delta = net_io_now.bytes_sent - last_net_io.bytes_sent
                 recv_bytes_delta = net_io_now.bytes_recv - last_net_io.bytes_recv
-                
-                # Convert to MB/s (assuming INTERVAL is 1.0)
-                sent_mb_s = (sent_bytes_delta / 1024 / 1024) / INTERVAL
-                recv_mb_s = (recv_bytes_delta / 1024 / 1024) / INTERVAL
-                
-                # Reset the baseline for the next second
+
+                # Convert to MB/s over the time actually elapsed
+                sent_mb_s = (sent_bytes_delta / 1024 / 1024) / elapsed
+                recv_mb_s = (recv_bytes_delta / 1024 / 1024) / elapsed
+
+                # Reset the baseline for the next sample
                 last_net_io = net_io_now
-                
+
                 writer.writerow([timestamp, cpu, mem, f"{sent_mb_s:.2f}", f"{recv_mb_s:.2f}"])
                 f.flush()
-                
+
+                # Per-process usage
+                for group in groups:
+                    process_writer.writerow({"timestamp": timestamp, **group.sample(elapsed)})
+                process_file.flush()
+                if next_sample <= time.perf_counter():
+                    # Sampling took longer than the interval; skip the missed slots
+                    next_sample = time.perf_counter() + interval
+                if now - last_rescan >= RESCAN_INTERVAL:
+                    for group in groups:
+                        group.rescan(own_pid)
+                    last_rescan = now
+
         except KeyboardInterrupt:
             print("Monitoring stopped.")
+        finally:
+            phase_socket.close()
+
+
+def main():
+    """
+    Samples system-wide CPU, memory and network usage plus, for each named
+    process group (e.g. the Qdrant server vs. the Python encoder), CPU%,
+    RSS, threads, disk read/write rates and page-fault rates. Benchmarks
+    mark their phases with services.phase_markers; the markers are logged
+    next to the samples so plot_res.py can overlay them.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--interval", type=float, default=INTERVAL, help="seconds between samples (e.g. 0.1)")
+    parser.add_argument(
+        "--process", action="append", metavar="LABEL=PATTERN",
+        help=f"process group to track (repeatable); default: {' '.join(DEFAULT_PROCESSES)}"
+    )
+    parser.add_argument("--phase-port", type=int, default=config.MONITOR_PHASE_PORT)
+    args = parser.parse_args()
+    monitor_resources(args.interval, parse_targets(args.process or DEFAULT_PROCESSES), args.phase_port)
 
 if __name__ == "__main__":
-    monitor_resources()
\ No newline at end of file
+    main()
@@ -3,8 +3,46 @@ import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import os
 
+
+def load_phases(phases_file: str, end_time) -> list:
+    """
+    Pairs the monitor's start/end phase markers into (phase, start, end)
+    intervals; a phase still open at the end of the log runs to end_time.
+    """
+    if not os.path.exists(phases_file):
+        return []
+    markers = pd.read_csv(phases_file)
+    if markers.empty:
+        return []
+    markers['timestamp'] = pd.to_datetime(markers['timestamp'])
+    intervals, open_phases = [], {}
+    for marker in markers.sort_values('timestamp').itertuples():
+        if marker.event == 'start':
+            open_phases.setdefault(marker.phase, []).append(marker.timestamp)
+        elif marker.event == 'end' and open_phases.get(marker.phase):
+            intervals.append((marker.phase, open_phases[marker.phase].pop(), marker.timestamp))
+    for phase, starts in open_phases.items():
+        intervals.extend((phase, start, end_time) for start in starts)
+    return sorted(intervals, key=lambda interval: interval[1])
+
+
+def overlay_phases(axes, intervals):
+    """Shades each benchmark phase on every axis and names it above the top one."""
+    names = list(dict.fromkeys(phase for phase, _, _ in intervals))
+    colors = {name: plt.cm.tab10(i % 10) for i, name in enumerate(names)}
+    for phase, start, end in intervals:
+        for ax in axes:
+            ax.axvspan(start, end, color=colors[phase], alpha=0.12, linewidth=0)
+        axes[0].annotate(
+            phase, xy=(start, 1.0), xycoords=('data', 'axes fraction'),
+            xytext=(2, 2), textcoords='offset points', fontsize=8, rotation=30, color=colors[phase]
+        )
+
+
 def plot_system_resources():
     input_file = "logs/system_resources.csv"
+    process_file = "logs/process_resources.csv"
+    phases_file = "logs/benchmark_phases.csv"
     output_image = "logs/system_resources_plot.png"
 
     if not os.path.exists(input_file):
@@ -14,36 +52,68 @@ def plot_system_resources():
     try:
         # 1. Load Data
         df = pd.read_csv(input_file)
-        
+
         # Convert timestamp string to actual datetime objects for plotting
         df['timestamp'] = pd.to_datetime(df['timestamp'])
-        
-        # 2. Setup Plot (2 Rows, 1 Column)
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10), sharex=True)
-        
+
+        processes = pd.read_csv(process_file) if os.path.exists(process_file) else pd.DataFrame()
+        if not processes.empty:
+            processes['timestamp'] = pd.to_datetime(processes['timestamp'])
+        phases = load_phases(phases_file, df['timestamp'].max())
+
+        # 2. Setup Plot (2 system rows, plus 4 per-process rows when tracked)
+        rows = 2 if processes.empty else 6
+        fig, axes = plt.subplots(rows, 1, figsize=(12, 10 if processes.empty else 22), sharex=True)
+        ax1, ax2 = axes[0], axes[1]
+
         # --- Subplot 1: CPU & Memory Usage ---
-        ax1.set_title("System Resource Usage During Load Test")
+        ax1.set_title("System Resource Usage During Load Test", pad=30 if phases else None)
         ax1.plot(df['timestamp'], df['cpu_percent'], label='CPU (%)', color='#1f77b4', linewidth=2)
         ax1.plot(df['timestamp'], df['memory_percent'], label='Memory (%)', color='#ff7f0e', linewidth=2)
         ax1.set_ylabel("Usage (%)")
         ax1.set_ylim(0, 105)  # Fix y-axis to 0-100%
         ax1.grid(True, linestyle='--', alpha=0.6)
         ax1.legend(loc='upper left', frameon=True)
-        
+
         # --- Subplot 2: Network I/O ---
         ax2.set_title("Network I/O Speed")
         ax2.plot(df['timestamp'], df['net_sent_mb_s'], label='Upload (MB/s)', color='#2ca02c', linewidth=1.5)
         ax2.plot(df['timestamp'], df['net_recv_mb_s'], label='Download (MB/s)', color='#d62728', linewidth=1.5)
         ax2.set_ylabel("Throughput (MB/s)")
-        ax2.set_xlabel("Time")
         ax2.grid(True, linestyle='--', alpha=0.6)
         ax2.legend(loc='upper left', frameon=True)
-        
+
+        # --- Subplots 3-6: Per-Process Usage ---
+        if not processes.empty:
+            ax3, ax4, ax5, ax6 = axes[2:]
+            ax3.set_title("CPU by Process (100% = one core)")
+            ax4.set_title("Resident Memory by Process")
+            ax5.set_title("Disk I/O by Process (solid: read, dashed: write)")
+            ax6.set_title("Page Faults by Process (solid: minor, dashed: major)")
+            for i, (name, group) in enumerate(processes.groupby('process', sort=False)):
+                color = plt.cm.Dark2(i % 8)
+                ax3.plot(group['timestamp'], group['cpu_percent'], label=name, color=color, linewidth=1.5)
+                ax4.plot(group['timestamp'], group['rss_mb'], label=name, color=color, linewidth=1.5)
+                ax5.plot(group['timestamp'], group['read_mb_s'], label=f"{name} read", color=color, linewidth=1.5)
+                ax5.plot(group['timestamp'], group['write_mb_s'], label=f"{name} write", color=color, linestyle='--', linewidth=1.5)
+                ax6.plot(group['timestamp'], group['minor_faults_s'], label=f"{name} minor", color=color, linewidth=1.5)
+                ax6.plot(group['timestamp'], group['major_faults_s'], label=f"{name} major", color=color, linestyle='--', linewidth=1.5)
+            ax3.set_ylabel("CPU (%)")
+            ax4.set_ylabel("RSS (MB)")
+            ax5.set_ylabel("Throughput (MB/s)")
+            ax6.set_ylabel("Faults / s")
+            for ax in (ax3, ax4, ax5, ax6):
+                ax.grid(True, linestyle='--', alpha=0.6)
+                ax.legend(loc='upper left', frameon=True, fontsize=8)
+
+        overlay_phases(axes, phases)
+        axes[-1].set_xlabel("Time")
+
         # 3. Format Time Axis
         # Shows Hour:Minute:Second
-        ax2.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
+        axes[-1].xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
         plt.xticks(rotation=45)
-        
+
         # 4. Save and Show
         plt.tight_layout()
         plt.savefig(output_image)
@@ -54,4 +124,4 @@ def plot_system_resources():
         print(f"An error occurred while plotting: {e}")
 
 if __name__ == "__main__":
-    plot_system_resources()
\ No newline at end of file
+    plot_system_resources()
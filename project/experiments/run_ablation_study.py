@@ -1,51 +1,160 @@
+import argparse
+import csv
+import sys
 import time
+import os
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
-import os
 
 import config
-from services import minio_client, qdrant_client, vlm_encoder
+from services import (
+    collection_snapshots, minio_client, phase_markers, qdrant_client, retrieval_metrics, sparse_encoder, vlm_encoder
+)
 
 
 VECTOR_FIELDS_TO_TEST = ["initial", "max_pooling", "mean_pooling"]
+POOLED_FIELDS = ["max_pooling", "mean_pooling"]
 
-BENCHMARK_QUERIES = [
-    "What is a process?",
-    "Describe CPU scheduling",
-    "Explain the concept of a deadlock",
-    "What is fourier optics?",
-    "Difference between thread and process"
-]
-
+QRELS_FILE = "experiments/qrels.tsv"
+QUERIES_FILE = "experiments/benchmark_queries.txt"
+POOL_FILE = "experiments/qrels_pool.tsv"
 RESULTS_FILE = "logs/ablation_results.csv"
+RAW_RESULTS_FILE = "logs/ablation_raw.csv"
+TOP_K = 5
+NUM_RUNS = 3
+PREFETCH_LIMIT = 100
+
+
+def make_dense_runner(field):
+    def run(q_client, dense, sparse):
+        return qdrant_client.search_qdrant(
+            q_client, config.COLLECTION_NAME, dense, TOP_K,
+            vector_name=field,
+            payload_fields=config.SEARCH_PAYLOAD_FIELDS
+        )
+    return run
+
+
+def make_two_stage_runner(prefetch_field):
+    # Candidates from the pooled field, reranked with full token MaxSim
+    def run(q_client, dense, sparse):
+        return qdrant_client.search_qdrant(
+            q_client, config.COLLECTION_NAME, dense, TOP_K,
+            vector_name="initial",
+            payload_fields=config.SEARCH_PAYLOAD_FIELDS,
+            prefetch_vector_name=prefetch_field,
+            prefetch_limit=PREFETCH_LIMIT
+        )
+    return run
+
+
+def make_hybrid_runner(field, mode):
+    def run(q_client, dense, sparse):
+        return qdrant_client.hybrid_search_qdrant(
+            q_client, config.COLLECTION_NAME, dense, sparse, TOP_K,
+            mode=mode,
+            prefetch_limit=PREFETCH_LIMIT,
+            vector_name=field,
+            sparse_vector_name=config.SPARSE_VECTOR_NAME,
+            payload_fields=config.SEARCH_PAYLOAD_FIELDS
+        )
+    return run
+
+
+# (search mode, vector field) -> runner
+CONFIGURATIONS = {
+    **{("dense", field): make_dense_runner(field) for field in VECTOR_FIELDS_TO_TEST},
+    **{("two_stage", field): make_two_stage_runner(field) for field in POOLED_FIELDS},
+    **{("hybrid_rerank", field): make_hybrid_runner(field, "rerank") for field in VECTOR_FIELDS_TO_TEST},
+    **{("hybrid_rrf", field): make_hybrid_runner(field, "rrf") for field in VECTOR_FIELDS_TO_TEST},
+}
+
+
+def load_queries(path: str) -> list:
+    """Distinct queries of a one-per-line file; blank lines and # comments are skipped."""
+    with open(path) as f:
+        return list(dict.fromkeys(line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")))
 
-def run_latency_test_for_field(model, processor, q_client, field_name):
+
+def write_judgement_pool(path: str, q_client, encoded: list):
     """
-    Runs the benchmark queries against a SPECIFIC vector field.
-    Returns the average latency in ms.
+    Pooling, as in TREC: the union of every configuration's top-k pages per
+    query is written as grade-0 qrels lines, so only those pages need to be
+    judged by hand before the quality metrics mean anything.
     """
-    latencies = []
-    
-    for query_text in BENCHMARK_QUERIES:
-        query_vector = vlm_encoder.encode_query(model, processor, query_text, config.DEVICE)
-        
-        start_time = time.time()
-        qdrant_client.search_qdrant(
-            q_client, 
-            config.COLLECTION_NAME, 
-            query_vector, 
-            top_k=3, 
-            vector_name=field_name
+    with open(path, "w", newline="") as f:
+        f.write(
+            f"# Candidate pages for {QRELS_FILE}: the top {TOP_K} of every ablation configuration.\n"
+            "# Set the last column to 1 (relevant) or 2 (highly relevant); 0 means judged not relevant.\n"
         )
-        search_time = time.time() - start_time
-        
-        latencies.append(search_time * 1000)
-        
-    return sum(latencies) / len(latencies)
+        writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+        for query_text, dense, sparse in encoded:
+            pool = {}
+            for runner in CONFIGURATIONS.values():
+                for point in runner(q_client, dense, sparse):
+                    book_name, page_number = retrieval_metrics.page_key(point.payload or {})
+                    if book_name is not None and page_number is not None:
+                        pool.setdefault((book_name, page_number), None)
+            writer.writerows([query_text, book_name, page_number, 0] for book_name, page_number in pool)
+
+
+def summarize(df: pd.DataFrame) -> pd.DataFrame:
+    """Per-configuration quality (averaged over queries) next to latency percentiles (over all runs)."""
+    quality = df[df["run"] == 0].groupby(["mode", "vector_field"], sort=False).agg(
+        **{
+            f"recall_at_{TOP_K}": (f"recall_at_{TOP_K}", "mean"),
+            "mrr": ("mrr", "mean"),
+            f"ndcg_at_{TOP_K}": (f"ndcg_at_{TOP_K}", "mean"),
+        }
+    )
+    latency = df.groupby(["mode", "vector_field"], sort=False)["latency_ms"].agg(
+        p50_latency_ms=lambda x: np.percentile(x, 50),
+        p95_latency_ms=lambda x: np.percentile(x, 95),
+        p99_latency_ms=lambda x: np.percentile(x, 99),
+    )
+    summary = quality.join(latency).reset_index()
+    baseline = summary.loc[
+        (summary["mode"] == "dense") & (summary["vector_field"] == "initial"), "p50_latency_ms"
+    ]
+    if not baseline.empty:
+        summary["speedup_factor"] = baseline.values[0] / summary["p50_latency_ms"]
+    return summary
+
 
 def main():
+    """
+    Joint quality/latency ablation. Every query in the qrels file is run
+    against each vector field under each search mode (dense, two-stage
+    pooled prefetch with `initial` rerank, BM25 hybrid rerank and RRF).
+    Recall@k, MRR and nDCG@k are computed from the labelled pages; p50/p95/p99
+    latency is taken over NUM_RUNS repetitions. With --min-recall, the
+    configuration with the lowest p95 latency meeting that recall is reported.
+    Without judgements, --pool writes the candidate pages to grade first.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--qrels", default=QRELS_FILE)
+    parser.add_argument("--min-recall", type=float, default=None, help=f"quality bar on recall@{TOP_K}")
+    parser.add_argument(
+        "--pool", nargs="?", const=POOL_FILE, metavar="PATH",
+        help=f"write candidate pages for the queries in {QUERIES_FILE} to be judged (default {POOL_FILE}) and exit"
+    )
+    args = parser.parse_args()
+
     print("--- Initializing Vector Field Ablation Study ---")
-    
+    if args.pool is not None:
+        queries = load_queries(QUERIES_FILE)
+    else:
+        qrels = retrieval_metrics.load_qrels(args.qrels)
+        if not any(qrels.values()):
+            sys.exit(
+                f"No relevant pages are judged in {args.qrels}, so recall/MRR/nDCG cannot be computed.\n"
+                f"Run `python experiments/run_ablation_study.py --pool` against the indexed library, grade the\n"
+                f"pages listed in {POOL_FILE} and copy the graded lines into {args.qrels}."
+            )
+        queries = list(qrels)
+        print(f"Loaded {sum(len(pages) for pages in qrels.values())} relevant pages for {len(qrels)} queries.")
+
     try:
         model, processor = vlm_encoder.load_vlm_model(config.MODEL_NAME, config.DEVICE)
         q_client = qdrant_client.get_qdrant_client(config.QDRANT_HOST, config.QDRANT_PORT)
@@ -53,42 +162,75 @@ def main():
         print(f"Failed to initialize services: {e}")
         return
 
+    if config.BENCHMARK_SNAPSHOT:
+        m_client = minio_client.get_minio_client(
+            config.MINIO_HOST, config.MINIO_ACCESS_KEY, config.MINIO_SECRET_KEY, config.MINIO_SECURE
+        )
+        collection_snapshots.ensure_collection_from_snapshot(
+            q_client, config.QDRANT_HOST, config.QDRANT_PORT, config.COLLECTION_NAME,
+            config.BENCHMARK_SNAPSHOT, config.SNAPSHOT_DIR, config.INDEXING_SETTINGS,
+            m_client=m_client, bucket_name=config.SNAPSHOT_BUCKET,
+            keep_versions=config.KEEP_COLLECTION_VERSIONS
+        )
     count = q_client.count(config.COLLECTION_NAME, exact=True).count
     print(f"Benchmarking against {count} indexed documents.")
-    
-    results = []
 
+    print("Pre-encoding queries...")
+    encoded = [
+        (
+            query_text,
+            vlm_encoder.encode_query(model, processor, query_text, config.DEVICE)["initial"],
+            sparse_encoder.encode_query(query_text),
+        )
+        for query_text in queries
+    ]
+
+    if args.pool is not None:
+        write_judgement_pool(args.pool, q_client, encoded)
+        print(f"Wrote candidate pages for {len(queries)} queries to {args.pool}; grade them and add them to {args.qrels}.")
+        return
 
     print("\n--- Starting Benchmark Loops ---")
-    for field in VECTOR_FIELDS_TO_TEST:
-        print(f"\nEvaluating Field: {field}")
-
-        run_times = []
-        for i in range(3):
-            avg_ms = run_latency_test_for_field(model, processor, q_client, field)
-            run_times.append(avg_ms)
-            print(f"  Run {i+1}: {avg_ms:.2f} ms")
-        final_avg = sum(run_times) / len(run_times)
-        best_time = min(run_times)
-        
-        print(f"  >> Result: {final_avg:.2f} ms avg")
-        
-        results.append({
-            "vector_field": field,
-            "avg_latency_ms": final_avg,
-            "best_latency_ms": best_time,
-        })
+    rows = []
+    for run in tqdm(range(NUM_RUNS), desc="Sampling Runs"):
+        for (mode, field), runner in CONFIGURATIONS.items():
+            with phase_markers.phase(f"{mode}/{field}", config.MONITOR_PHASE_HOST, config.MONITOR_PHASE_PORT, run=run):
+                timed_results = []
+                for query_text, dense, sparse in encoded:
+                    start_time = time.perf_counter()
+                    results = runner(q_client, dense, sparse)
+                    timed_results.append((query_text, results, (time.perf_counter() - start_time) * 1000))
+
+            for query_text, results, latency_ms in timed_results:
+                ranked = [retrieval_metrics.page_key(p.payload or {}) for p in results]
+                rows.append({
+                    "run": run,
+                    "mode": mode,
+                    "vector_field": field,
+                    "query": query_text,
+                    "latency_ms": latency_ms,
+                    "num_results": len(results),
+                    **retrieval_metrics.score_ranking(ranked, qrels[query_text], TOP_K),
+                })
 
     print("\n--- Ablation Study Complete ---")
-    df = pd.DataFrame(results)
-    
-    baseline_latency = df.loc[df['vector_field'] == 'initial', 'avg_latency_ms'].values[0]
-    df['speedup_factor'] = baseline_latency / df['avg_latency_ms']
-    
-    print(df)
+    df = pd.DataFrame(rows)
+    summary = summarize(df)
+    print(summary.round(3))
+
+    if args.min_recall is not None:
+        passing = summary[summary[f"recall_at_{TOP_K}"] >= args.min_recall]
+        if passing.empty:
+            print(f"\nNo configuration reaches recall@{TOP_K} >= {args.min_recall}")
+        else:
+            best = passing.sort_values("p95_latency_ms").iloc[0]
+            print(f"\nCheapest configuration with recall@{TOP_K} >= {args.min_recall}: "
+                  f"{best['mode']}/{best['vector_field']} (p95 {best['p95_latency_ms']:.1f} ms)")
+
     os.makedirs("logs", exist_ok=True)
-    df.to_csv(RESULTS_FILE, index=False)
-    print(f"Results saved to {RESULTS_FILE}")
+    summary.to_csv(RESULTS_FILE, index=False)
+    df.to_csv(RAW_RESULTS_FILE, index=False)
+    print(f"Results saved to {RESULTS_FILE} (per-query rows in {RAW_RESULTS_FILE})")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
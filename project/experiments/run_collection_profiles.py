@@ -0,0 +1,135 @@
+import time
+import os
+import re
+import numpy as np
+import pandas as pd
+import requests
+from qdrant_client import models
+
+import config
+from services import qdrant_client, vlm_encoder
+
+
+BENCHMARK_QUERIES = [
+    "What is a process?", "What is a thread?", "Explain deadlock",
+    "Virtual memory definition", "CPU scheduling types", "Semaphores vs Mutex",
+]
+PROFILES = list(qdrant_client.COLLECTION_PROFILES)
+COPY_BATCH_SIZE = 32
+TOP_K = 5
+RESULTS_FILE = "logs/collection_profile_results.csv"
+
+
+def qdrant_resident_bytes() -> float:
+    """Resident memory of the Qdrant process from its Prometheus endpoint."""
+    try:
+        text = requests.get(f"http://{config.QDRANT_HOST}:{config.QDRANT_PORT}/metrics", timeout=10).text
+    except requests.RequestException:
+        return float("nan")
+    match = re.search(r"^memory_resident_bytes\s+([0-9.eE+]+)", text, re.MULTILINE)
+    return float(match.group(1)) if match else float("nan")
+
+
+def collection_disk_bytes(collection_name: str) -> float:
+    """Size of the collection's storage directory, if the volume is reachable."""
+    if not config.QDRANT_STORAGE_PATH:
+        return float("nan")
+    root = os.path.join(config.QDRANT_STORAGE_PATH, "collections", collection_name)
+    return float(sum(
+        os.path.getsize(os.path.join(dirpath, filename))
+        for dirpath, _, filenames in os.walk(root) for filename in filenames
+    ))
+
+
+def copy_points(q_client, source: str, target: str) -> int:
+    """Copies every point (payload and all vectors) from source to target."""
+    copied, offset = 0, None
+    while True:
+        records, offset = q_client.scroll(
+            collection_name=source, limit=COPY_BATCH_SIZE, offset=offset,
+            with_payload=True, with_vectors=True
+        )
+        if records:
+            q_client.upsert(
+                collection_name=target,
+                points=[models.PointStruct(id=r.id, vector=r.vector, payload=r.payload) for r in records],
+                wait=True
+            )
+            copied += len(records)
+        if offset is None:
+            return copied
+
+
+def main():
+    """
+    Builds one copy of the indexed collection per profile in
+    qdrant_client.COLLECTION_PROFILES and records, for each: time to load
+    the points, time until indexing finished, Qdrant resident-memory growth,
+    on-disk size and dense search latency. Points are copied from
+    config.COLLECTION_NAME, so pages are not re-encoded.
+    """
+    print("--- Initializing Collection Profile Benchmark ---")
+    try:
+        model, processor = vlm_encoder.load_vlm_model(config.MODEL_NAME, config.DEVICE)
+        q_client = qdrant_client.get_qdrant_client(config.QDRANT_HOST, config.QDRANT_PORT)
+    except Exception as e:
+        print(f"Failed to initialize services: {e}")
+        return
+
+    query_vectors = [
+        vlm_encoder.encode_query(model, processor, query_text, config.DEVICE)["initial"]
+        for query_text in BENCHMARK_QUERIES
+    ]
+
+    results_log = []
+    for profile in PROFILES:
+        collection_name = f"{config.COLLECTION_NAME}_{profile}"
+        print(f"\n--- Profile: {profile} ({collection_name}) ---")
+        layout = qdrant_client.get_collection_profile(profile)
+        qdrant_client.create_qdrant_collection_if_not_exists(
+            q_client, collection_name, config.DIM, force_recreate=True,
+            sparse_vector_name=config.SPARSE_VECTOR_NAME, profile=profile
+        )
+        memory_before = qdrant_resident_bytes()
+
+        start_time = time.perf_counter()
+        num_points = copy_points(q_client, config.COLLECTION_NAME, collection_name)
+        load_s = time.perf_counter() - start_time
+        index_wait_s = qdrant_client.wait_for_collection_indexed(q_client, collection_name)
+        print(f"  Loaded {num_points} points in {load_s:.1f}s, indexed after a further {index_wait_s:.1f}s")
+
+        # Rerank-only `initial` has no graph, so candidates come from mean_pooling
+        prefetch_vector = "mean_pooling" if "initial" in layout["rerank_only"] else None
+        latencies = []
+        for query_vector in query_vectors:
+            start_time = time.perf_counter()
+            qdrant_client.search_qdrant(
+                q_client, collection_name, query_vector, TOP_K,
+                payload_fields=config.SEARCH_PAYLOAD_FIELDS,
+                prefetch_vector_name=prefetch_vector,
+                prefetch_limit=config.SEARCH_PREFETCH_LIMIT
+            )
+            latencies.append((time.perf_counter() - start_time) * 1000)
+
+        results_log.append({
+            "profile": profile,
+            "points": num_points,
+            "load_s": load_s,
+            "index_wait_s": index_wait_s,
+            "build_s": load_s + index_wait_s,
+            "memory_delta_mb": (qdrant_resident_bytes() - memory_before) / 1024 / 1024,
+            "disk_mb": collection_disk_bytes(collection_name) / 1024 / 1024,
+            "avg_search_ms": np.mean(latencies),
+            "p95_search_ms": np.percentile(latencies, 95),
+        })
+        q_client.delete_collection(collection_name)
+
+    print("\n--- Collection Profile Benchmark Complete ---")
+    os.makedirs("logs", exist_ok=True)
+    results_df = pd.DataFrame(results_log)
+    results_df.to_csv(RESULTS_FILE, index=False)
+    print(f"Results saved to {RESULTS_FILE}")
+    print(results_df.round(2))
+
+if __name__ == "__main__":
+    main()
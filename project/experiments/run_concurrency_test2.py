@@ -4,9 +4,8 @@ import os
 import numpy as np
 import pandas as pd
 from tqdm.asyncio import tqdm 
-from qdrant_client import AsyncQdrantClient
 import config
-from services import vlm_encoder
+from services import qdrant_client, vlm_encoder
 
 
 CONCURRENCY_LEVELS = [10000] 
@@ -17,24 +16,21 @@ RESULTS_FILE = "logs/qdrant_concurrency_results.csv"
 async def run_async_search(client, vector, semaphore):
     """Performs a single search using a semaphore to throttle active requests."""
     async with semaphore:
-        try:
-            start = time.perf_counter()
-
-            await client.query_points(
-                collection_name=config.COLLECTION_NAME,
-                query=vector,
-                using="initial",
-                limit=3,
-                timeout=300
-            )
-            return (time.perf_counter() - start) * 1000
-        except Exception as e:
-            print(f"DEBUG: {e}")
+        start = time.perf_counter()
+        results = await qdrant_client.async_search_qdrant(
+            client,
+            config.COLLECTION_NAME,
+            vector,
+            top_k=3,
+            vector_name="initial",
+            payload_fields=config.SEARCH_PAYLOAD_FIELDS
+        )
+        if not results:
             return None
+        return (time.perf_counter() - start) * 1000
 
-async def run_benchmark_step(level, pre_encoded_vector):
-    """Sets up the async client and runs a batch of queries for a specific level."""
-    client = AsyncQdrantClient(host=config.QDRANT_HOST, port=config.QDRANT_PORT)
+async def run_benchmark_step(client, level, pre_encoded_vector):
+    """Runs a batch of queries for a specific level on the shared client."""
     semaphore = asyncio.Semaphore(level)
     
     
@@ -46,8 +42,6 @@ async def run_benchmark_step(level, pre_encoded_vector):
     latencies = await tqdm.gather(*tasks, desc=f"Workers={level}")
     total_time = time.perf_counter() - start_time
     
-    await client.close()
-    
     valid_latencies = [l for l in latencies if l is not None]
     if not valid_latencies:
         return None
@@ -60,6 +54,31 @@ async def run_benchmark_step(level, pre_encoded_vector):
         "p99_latency_ms": np.percentile(valid_latencies, 99)
     }
 
+async def run_all_levels(pre_encoded_vector):
+    """Runs every concurrency level against one long-lived, pooled client."""
+    client = await qdrant_client.get_async_qdrant_client(
+        config.QDRANT_HOST,
+        config.QDRANT_PORT,
+        prefer_grpc=config.QDRANT_PREFER_GRPC,
+        grpc_port=config.QDRANT_GRPC_PORT,
+        pool_size=config.QDRANT_POOL_SIZE
+    )
+    results_log = []
+    try:
+        for level in CONCURRENCY_LEVELS:
+            print(f"\n--- Testing Concurrency Level: {level} ---")
+            
+            step_result = await run_benchmark_step(client, level, pre_encoded_vector)
+            
+            if step_result:
+                results_log.append(step_result)
+                print(f"Throughput: {step_result['throughput_qps']:.2f} QPS | Avg: {step_result['avg_latency_ms']:.2f}ms")
+            else:
+                print(f"Level {level} failed to return results.")
+    finally:
+        await client.close()
+    return results_log
+
 def main():
     print("--- Initializing Qdrant Concurrency Test ---")
     try:
@@ -77,19 +96,7 @@ def main():
         print(f"Failed setup: {e}")
         return
 
-    results_log = []
-
-    
-    for level in CONCURRENCY_LEVELS:
-        print(f"\n--- Testing Concurrency Level: {level} ---")
-        
-        step_result = asyncio.run(run_benchmark_step(level, pre_encoded_vector))
-        
-        if step_result:
-            results_log.append(step_result)
-            print(f"Throughput: {step_result['throughput_qps']:.2f} QPS | Avg: {step_result['avg_latency_ms']:.2f}ms")
-        else:
-            print(f"Level {level} failed to return results.")
+    results_log = asyncio.run(run_all_levels(pre_encoded_vector))
 
     
     os.makedirs("logs", exist_ok=True)
@@ -0,0 +1,163 @@
+import gc
+import time
+import os
+import numpy as np
+import pandas as pd
+
+import config
+from services import minio_client, qdrant_client, vlm_encoder
+
+
+BENCHMARK_QUERIES = [
+    "What is a process?", "What is a thread?", "Explain deadlock",
+    "Virtual memory definition", "CPU scheduling types", "Semaphores vs Mutex",
+    "paging vs segmentation", "context switch overhead", "process control block",
+    "bankers algorithm", "thrashing causes", "kernel mode vs user mode"
+]
+BACKENDS = ["bf16", "int8"]
+REFERENCE_BACKEND = "bf16"
+NUM_PAGES = 8
+TOP_K = 5
+DEVICE = "cpu"  # the int8 backend targets CPU-only nodes; compare like for like
+RESULTS_FILE = "logs/encoder_backend_results.csv"
+FIDELITY_FILE = "logs/encoder_backend_fidelity.csv"
+
+
+def mean_token_cosine(a, b) -> float:
+    """Mean cosine similarity between aligned token vectors of two encodings."""
+    a, b = np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32)
+    dots = (a * b).sum(axis=-1)
+    norms = np.linalg.norm(a, axis=-1) * np.linalg.norm(b, axis=-1)
+    return float(np.mean(dots / np.maximum(norms, 1e-12)))
+
+
+def run_backend(backend, pages, q_client):
+    """
+    Loads one backend, times encode_query / encode_batch and keeps the
+    embeddings and top-k ids for the fidelity comparison.
+    """
+    model, processor = vlm_encoder.load_vlm_model(
+        config.MODEL_NAME, DEVICE, snapshot_dir=config.WEIGHT_SNAPSHOT_DIR, backend=backend
+    )
+    # Warm-up so one-off allocation and kernel selection are not timed
+    vlm_encoder.encode_query(model, processor, BENCHMARK_QUERIES[0], DEVICE)
+
+    query_latencies, query_vectors, top_ids = [], [], []
+    for query_text in BENCHMARK_QUERIES:
+        start_time = time.perf_counter()
+        query_vector = vlm_encoder.encode_query(model, processor, query_text, DEVICE)
+        query_latencies.append((time.perf_counter() - start_time) * 1000)
+        query_vectors.append(query_vector["initial"])
+        results = qdrant_client.search_qdrant(
+            q_client, config.COLLECTION_NAME, query_vector["initial"], TOP_K,
+            payload_fields=config.SEARCH_PAYLOAD_FIELDS
+        )
+        top_ids.append([p.id for p in results])
+
+    batch_latencies, page_vectors = [], []
+    for i in range(0, len(pages), config.BATCH_SIZE):
+        batch = pages[i:i + config.BATCH_SIZE]
+        start_time = time.perf_counter()
+        vectors_dict = vlm_encoder.encode_batch(
+            model, processor, batch, DEVICE, config.IMAGE_SEQ_LENGTH, config.DIM
+        )
+        batch_latencies.append((time.perf_counter() - start_time) * 1000)
+        page_vectors.extend(vectors_dict["initial"])
+
+    del model
+    gc.collect()
+    summary = {
+        "backend": backend,
+        "encode_query_avg_ms": np.mean(query_latencies),
+        "encode_query_p95_ms": np.percentile(query_latencies, 95),
+        "queries_per_s": 1000 / np.mean(query_latencies),
+        "encode_batch_avg_ms": np.mean(batch_latencies) if batch_latencies else None,
+        "pages_per_s": len(pages) / (sum(batch_latencies) / 1000) if batch_latencies else None,
+    }
+    return summary, {"queries": query_vectors, "pages": page_vectors, "top_ids": top_ids}
+
+
+def main():
+    """
+    Compares the bf16 and dynamic-int8 ColPali backends on CPU.
+    Latency/throughput is measured for encode_query and encode_batch;
+    fidelity is the token-level cosine to the bf16 embeddings and the
+    overlap of the top-k pages retrieved with each backend's query vectors.
+    """
+    print("--- Initializing Encoder Backend Comparison ---")
+    try:
+        q_client = qdrant_client.get_qdrant_client(config.QDRANT_HOST, config.QDRANT_PORT)
+        m_client = minio_client.get_minio_client(
+            config.MINIO_HOST,
+            config.MINIO_ACCESS_KEY,
+            config.MINIO_SECRET_KEY,
+            config.MINIO_SECURE
+        )
+    except Exception as e:
+        print(f"Failed to initialize services: {e}")
+        return
+
+    objects_list = sorted(
+        minio_client.list_images_in_bucket(m_client, config.MINIO_BUCKET), key=lambda x: x.object_name
+    )[:NUM_PAGES]
+    pages = [
+        image for image in (
+            minio_client.download_image_to_pil(m_client, config.MINIO_BUCKET, obj.object_name)
+            for obj in objects_list
+        ) if image is not None
+    ]
+    print(f"Loaded {len(pages)} sample pages for encode_batch.")
+
+    summaries, outputs = [], {}
+    for backend in BACKENDS:
+        print(f"\n--- Backend: {backend} ---")
+        try:
+            summary, outputs[backend] = run_backend(backend, pages, q_client)
+        except Exception as e:
+            print(f"Backend {backend} failed: {e}")
+            continue
+        summaries.append(summary)
+        print(f"  encode_query: {summary['encode_query_avg_ms']:.0f} ms avg")
+
+    if REFERENCE_BACKEND not in outputs:
+        print("Reference backend did not run; skipping fidelity check.")
+        return
+
+    reference = outputs[REFERENCE_BACKEND]
+    fidelity_rows = []
+    for backend, output in outputs.items():
+        if backend == REFERENCE_BACKEND:
+            continue
+        for query_text, ref_vec, vec, ref_ids, ids in zip(
+            BENCHMARK_QUERIES, reference["queries"], output["queries"], reference["top_ids"], output["top_ids"]
+        ):
+            fidelity_rows.append({
+                "backend": backend,
+                "kind": "query",
+                "item": query_text,
+                "token_cosine": mean_token_cosine(ref_vec, vec),
+                f"top{TOP_K}_overlap": len(set(ref_ids) & set(ids)) / TOP_K,
+            })
+        for page_index, (ref_vec, vec) in enumerate(zip(reference["pages"], output["pages"])):
+            fidelity_rows.append({
+                "backend": backend,
+                "kind": "page",
+                "item": objects_list[page_index].object_name,
+                "token_cosine": mean_token_cosine(ref_vec, vec),
+            })
+
+    print("\n--- Encoder Backend Comparison Complete ---")
+    os.makedirs("logs", exist_ok=True)
+    results_df = pd.DataFrame(summaries)
+    results_df.to_csv(RESULTS_FILE, index=False)
+    print(f"Results saved to {RESULTS_FILE}")
+    print(results_df)
+
+    if fidelity_rows:
+        fidelity_df = pd.DataFrame(fidelity_rows)
+        fidelity_df.to_csv(FIDELITY_FILE, index=False)
+        print(f"Fidelity saved to {FIDELITY_FILE}")
+        print(fidelity_df.groupby(["backend", "kind"]).mean(numeric_only=True))
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,9 @@ import os
 import random
 from tqdm import tqdm
 import pandas as pd
-from qdrant_client import models
 
 import config
-from services import minio_client, qdrant_client, vlm_encoder
+from services import collection_snapshots, minio_client, qdrant_client, vlm_encoder
 
 BENCHMARK_QUERIES = [
     "What is a process?",
@@ -16,6 +15,9 @@ BENCHMARK_QUERIES = [
     "Describe CPU scheduling"
 ]
 RESULTS_FILE = "logs/scalability_results_full_library.csv"
+# Scratch collection grown step by step; COLLECTION_NAME is the serving alias
+# and must never be recreated or partially filled by a benchmark.
+EVAL_COLLECTION = f"{config.COLLECTION_NAME}_scalability"
 
 
 def run_retrieval_benchmark(model, processor, q_client) -> float:
@@ -23,13 +25,13 @@ def run_retrieval_benchmark(model, processor, q_client) -> float:
 
     
     for query_text in BENCHMARK_QUERIES:
-        query_vector = vlm_encoder.encode_query(model, processor, query_text, config.DEVICE)
+        query_vector = vlm_encoder.encode_query(model, processor, query_text, config.DEVICE)["initial"]
         
 
         start_time = time.time()
         results = qdrant_client.search_qdrant(
             q_client, 
-            config.COLLECTION_NAME, 
+            EVAL_COLLECTION, 
             query_vector, 
             top_k=3,
             vector_name="initial"
@@ -45,29 +47,37 @@ def run_retrieval_benchmark(model, processor, q_client) -> float:
     return avg_latency_ms
 
 
-def main():
+def measure_checkpoint(model, processor, q_client) -> dict:
+    """Benchmarks retrieval at the current size of EVAL_COLLECTION."""
+    time.sleep(2)  # Let fresh writes settle before timing searches
+    current_index_size = q_client.count(EVAL_COLLECTION, exact=True).count
+    print(f"Current Index Size: {current_index_size} vectors")
+
+    print("Running benchmark 3 times to stabilize cache...")
+    latencies = [
+        run_retrieval_benchmark(model, processor, q_client),
+        run_retrieval_benchmark(model, processor, q_client),
+        run_retrieval_benchmark(model, processor, q_client)
+    ]
+    avg_latency = sum(latencies) / len(latencies)
+
+    print(f"--- Result: {current_index_size} docs = {avg_latency:.2f} ms avg retrieval ---")
+
+    return {
+        "corpus_size": current_index_size,
+        "avg_retrieval_latency_ms": avg_latency
+    }
+
+
+def index_in_steps(model, processor, q_client, m_client) -> list:
     """
-    Main function to orchestrate the scalability test across ALL folders.
+    Indexes the library into EVAL_COLLECTION in growing steps and
+    benchmarks retrieval at each checkpoint.
     """
-    
-    print("--- Initializing RAG Scalability Test (Full Library) ---")
-    try:
-        model, processor = vlm_encoder.load_vlm_model(config.MODEL_NAME, config.DEVICE)
-        q_client = qdrant_client.get_qdrant_client(config.QDRANT_HOST, config.QDRANT_PORT)
-        m_client = minio_client.get_minio_client(
-            config.MINIO_HOST, 
-            config.MINIO_ACCESS_KEY, 
-            config.MINIO_SECRET_KEY, 
-            config.MINIO_SECURE
-        )
-    except Exception as e:
-        print(f"Failed to initialize services. Exiting. Error: {e}")
-        return
-
-    print(f"--- Force-recreating Qdrant Collection: {config.COLLECTION_NAME} ---")
+    print(f"--- Force-recreating Qdrant Collection: {EVAL_COLLECTION} ---")
     qdrant_client.create_qdrant_collection_if_not_exists(
         q_client, 
-        config.COLLECTION_NAME, 
+        EVAL_COLLECTION, 
         config.DIM,
         force_recreate=True
     )
@@ -75,7 +85,7 @@ def main():
     objects_list = minio_client.list_images_in_bucket(m_client, config.MINIO_BUCKET)
     if not objects_list:
         print("No images found in MinIO bucket. Exiting.")
-        return
+        return []
 
     objects_list.sort(key=lambda x: x.object_name)
     
@@ -134,7 +144,7 @@ def main():
 
                         if len(image_batch) == config.BATCH_SIZE:
                             vectors_dict = vlm_encoder.encode_batch(model, processor, image_batch, config.DEVICE, config.IMAGE_SEQ_LENGTH, config.DIM)
-                            qdrant_client.upsert_batch_to_qdrant(q_client, config.COLLECTION_NAME, point_ids, payload_batch, vectors_dict)
+                            qdrant_client.upsert_batch_to_qdrant(q_client, EVAL_COLLECTION, point_ids, payload_batch, vectors_dict)
                             image_batch, payload_batch, point_ids = [], [], []
 
                     except Exception as e:
@@ -144,27 +154,47 @@ def main():
 
                 if image_batch:
                     vectors_dict = vlm_encoder.encode_batch(model, processor, image_batch, config.DEVICE, config.IMAGE_SEQ_LENGTH, config.DIM)
-                    qdrant_client.upsert_batch_to_qdrant(q_client, config.COLLECTION_NAME, point_ids, payload_batch, vectors_dict)
+                    qdrant_client.upsert_batch_to_qdrant(q_client, EVAL_COLLECTION, point_ids, payload_batch, vectors_dict)
 
         print(f"Indexing for step {step_size} complete. Stabilizing...")
-        time.sleep(2)
-        current_index_size = q_client.count(config.COLLECTION_NAME, exact=True).count
-        print(f"Current Index Size: {current_index_size} vectors")
- 
-        print("Running benchmark 3 times to stabilize cache...")
-        latencies = [
-            run_retrieval_benchmark(model, processor, q_client),
-            run_retrieval_benchmark(model, processor, q_client),
-            run_retrieval_benchmark(model, processor, q_client)
-        ]
-        avg_latency = sum(latencies) / len(latencies)
-        
-        print(f"--- Result: {current_index_size} docs = {avg_latency:.2f} ms avg retrieval ---")
-        
-        results_log.append({
-            "corpus_size": current_index_size,
-            "avg_retrieval_latency_ms": avg_latency
-        })
+        results_log.append(measure_checkpoint(model, processor, q_client))
+
+    return results_log
+
+
+def main():
+    """
+    Main function to orchestrate the scalability test across ALL folders.
+    """
+    
+    print("--- Initializing RAG Scalability Test (Full Library) ---")
+    try:
+        model, processor = vlm_encoder.load_vlm_model(config.MODEL_NAME, config.DEVICE)
+        q_client = qdrant_client.get_qdrant_client(config.QDRANT_HOST, config.QDRANT_PORT)
+        m_client = minio_client.get_minio_client(
+            config.MINIO_HOST, 
+            config.MINIO_ACCESS_KEY, 
+            config.MINIO_SECRET_KEY, 
+            config.MINIO_SECURE
+        )
+    except Exception as e:
+        print(f"Failed to initialize services. Exiting. Error: {e}")
+        return
+
+    if config.BENCHMARK_SNAPSHOT:
+        # A snapshot holds the full library only: restore it instead of
+        # re-encoding every page, and measure just the final checkpoint
+        collection_snapshots.ensure_collection_from_snapshot(
+            q_client, config.QDRANT_HOST, config.QDRANT_PORT, EVAL_COLLECTION,
+            config.BENCHMARK_SNAPSHOT, config.SNAPSHOT_DIR, config.INDEXING_SETTINGS,
+            m_client=m_client, bucket_name=config.SNAPSHOT_BUCKET, as_alias=False
+        )
+        results_log = [measure_checkpoint(model, processor, q_client)]
+    else:
+        results_log = index_in_steps(model, processor, q_client, m_client)
+    q_client.delete_collection(EVAL_COLLECTION)
+    if not results_log:
+        return
 
     print("\n--- Full Library Scalability Test Complete ---")
     os.makedirs("logs", exist_ok=True)
@@ -0,0 +1,114 @@
+import time
+import os
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+import config
+from services import qdrant_client, sparse_encoder, vlm_encoder
+
+
+BENCHMARK_QUERIES = [
+    "What is a process?", "What is a thread?", "Explain deadlock",
+    "Virtual memory definition", "CPU scheduling types", "Semaphores vs Mutex",
+    "paging vs segmentation", "context switch overhead", "process control block",
+    "bankers algorithm", "thrashing causes", "kernel mode vs user mode"
+]
+TOP_K = 5
+NUM_RUNS = 5
+RESULTS_FILE = "logs/hybrid_search_results.csv"
+
+
+def run_dense(q_client, query_vector, sparse_vector, prefetch_limit, search_params=None):
+    return qdrant_client.search_qdrant(
+        q_client, config.COLLECTION_NAME, query_vector, TOP_K,
+        payload_fields=config.SEARCH_PAYLOAD_FIELDS,
+        search_params=search_params
+    )
+
+
+def make_hybrid_runner(mode):
+    def run_hybrid(q_client, query_vector, sparse_vector, prefetch_limit):
+        return qdrant_client.hybrid_search_qdrant(
+            q_client, config.COLLECTION_NAME, query_vector, sparse_vector, TOP_K,
+            mode=mode,
+            prefetch_limit=prefetch_limit,
+            sparse_vector_name=config.SPARSE_VECTOR_NAME,
+            payload_fields=config.SEARCH_PAYLOAD_FIELDS
+        )
+    return run_hybrid
+
+
+SEARCH_MODES = {
+    "dense": run_dense,
+    "hybrid_rerank": make_hybrid_runner("rerank"),
+    "hybrid_rrf": make_hybrid_runner("rrf"),
+}
+PREFETCH_LIMITS = [20, 50, 100, 200]
+
+
+def main():
+    """
+    Compares dense-only MaxSim search with the BM25 hybrid modes.
+    Recall@k is measured against the exhaustive ColPali ranking (an exact,
+    unquantised dense scan), i.e. how much of the dense result the cheaper
+    hybrid stage preserves.
+    """
+    print("--- Initializing Hybrid Search Evaluation ---")
+
+    try:
+        model, processor = vlm_encoder.load_vlm_model(config.MODEL_NAME, config.DEVICE)
+        q_client = qdrant_client.get_qdrant_client(config.QDRANT_HOST, config.QDRANT_PORT)
+    except Exception as e:
+        print(f"Failed to initialize services: {e}")
+        return
+
+    print("Pre-encoding benchmark queries...")
+    encoded = []
+    for query_text in BENCHMARK_QUERIES:
+        dense = vlm_encoder.encode_query(model, processor, query_text, config.DEVICE)["initial"]
+        encoded.append((query_text, dense, sparse_encoder.encode_query(query_text)))
+
+    exact_params = qdrant_client.build_search_params(exact=True, ignore_quantization=True)
+    reference = {
+        query_text: {p.id for p in run_dense(q_client, dense, sparse, None, exact_params)}
+        for query_text, dense, sparse in encoded
+    }
+
+    rows = []
+    for run in tqdm(range(NUM_RUNS), desc="Sampling Runs"):
+        for mode, runner in SEARCH_MODES.items():
+            limits = [None] if mode == "dense" else PREFETCH_LIMITS
+            for prefetch_limit in limits:
+                for query_text, dense, sparse in encoded:
+                    start_time = time.perf_counter()
+                    results = runner(q_client, dense, sparse, prefetch_limit)
+                    latency_ms = (time.perf_counter() - start_time) * 1000
+
+                    expected = reference[query_text]
+                    found = {p.id for p in results}
+                    recall = len(found & expected) / len(expected) if expected else 0.0
+                    rows.append({
+                        "run": run,
+                        "mode": mode,
+                        "prefetch_limit": prefetch_limit,
+                        "query": query_text,
+                        "latency_ms": latency_ms,
+                        f"recall_at_{TOP_K}": recall
+                    })
+
+    df = pd.DataFrame(rows)
+    summary = df.groupby(["mode", "prefetch_limit"], dropna=False).agg(
+        avg_latency_ms=("latency_ms", "mean"),
+        p95_latency_ms=("latency_ms", lambda x: np.percentile(x, 95)),
+        recall=(f"recall_at_{TOP_K}", "mean")
+    )
+    print("\n--- Hybrid vs Dense Results ---")
+    print(summary)
+
+    os.makedirs("logs", exist_ok=True)
+    df.to_csv(RESULTS_FILE, index=False)
+    print(f"Raw data saved to {RESULTS_FILE}")
+
+if __name__ == "__main__":
+    main()
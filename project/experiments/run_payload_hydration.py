@@ -0,0 +1,98 @@
+import time
+import os
+import json
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+import config
+from services import qdrant_client, vlm_encoder
+
+
+BENCHMARK_QUERIES = [
+    "What is a process?", "What is a thread?", "Explain deadlock",
+    "Virtual memory definition", "CPU scheduling types", "Semaphores vs Mutex",
+    "paging vs segmentation", "context switch overhead", "process control block",
+    "bankers algorithm", "thrashing causes", "kernel mode vs user mode"
+]
+CANDIDATE_LIMIT = 50
+TOP_K = 5
+NUM_RUNS = 5
+RESULTS_FILE = "logs/payload_hydration_results.csv"
+
+
+def payload_bytes(points) -> int:
+    """Approximates the payload bytes carried by a list of points."""
+    return sum(len(json.dumps(point.payload or {})) for point in points)
+
+
+def run_full_payload(q_client, query_vector):
+    """Baseline: every candidate carries the full payload."""
+    start_time = time.perf_counter()
+    candidates = qdrant_client.search_qdrant(
+        q_client, config.COLLECTION_NAME, query_vector, CANDIDATE_LIMIT
+    )
+    latency_ms = (time.perf_counter() - start_time) * 1000
+    return latency_ms, payload_bytes(candidates)
+
+
+def run_lean_payload(q_client, query_vector):
+    """Candidates carry only light fields; top-k is hydrated afterwards."""
+    start_time = time.perf_counter()
+    candidates = qdrant_client.search_qdrant(
+        q_client, config.COLLECTION_NAME, query_vector, CANDIDATE_LIMIT,
+        payload_fields=config.SEARCH_PAYLOAD_FIELDS
+    )
+    final = qdrant_client.hydrate_points(
+        q_client, config.COLLECTION_NAME, candidates[:TOP_K],
+        config.HYDRATE_PAYLOAD_FIELDS
+    )
+    latency_ms = (time.perf_counter() - start_time) * 1000
+    # Light fields for all candidates plus the hydrated fields for the top-k
+    return latency_ms, payload_bytes(candidates[TOP_K:]) + payload_bytes(final)
+
+
+def main():
+    print("--- Initializing Payload Hydration Benchmark ---")
+
+    try:
+        model, processor = vlm_encoder.load_vlm_model(config.MODEL_NAME, config.DEVICE)
+        q_client = qdrant_client.get_qdrant_client(config.QDRANT_HOST, config.QDRANT_PORT)
+    except Exception as e:
+        print(f"Failed to initialize services: {e}")
+        return
+
+    print("Pre-encoding benchmark queries...")
+    query_vectors = [
+        vlm_encoder.encode_query(model, processor, query_text, config.DEVICE)["initial"]
+        for query_text in BENCHMARK_QUERIES
+    ]
+
+    rows = []
+    for run in tqdm(range(NUM_RUNS), desc="Sampling Runs"):
+        for query_text, query_vector in zip(BENCHMARK_QUERIES, query_vectors):
+            for mode, runner in (("full", run_full_payload), ("lean", run_lean_payload)):
+                latency_ms, n_bytes = runner(q_client, query_vector)
+                rows.append({
+                    "run": run,
+                    "query": query_text,
+                    "mode": mode,
+                    "latency_ms": latency_ms,
+                    "payload_bytes": n_bytes
+                })
+
+    df = pd.DataFrame(rows)
+    summary = df.groupby("mode").agg(
+        avg_latency_ms=("latency_ms", "mean"),
+        p95_latency_ms=("latency_ms", lambda x: np.percentile(x, 95)),
+        avg_payload_bytes=("payload_bytes", "mean")
+    )
+    print("\n--- Payload Hydration Results ---")
+    print(summary)
+
+    os.makedirs("logs", exist_ok=True)
+    df.to_csv(RESULTS_FILE, index=False)
+    print(f"Raw data saved to {RESULTS_FILE}")
+
+if __name__ == "__main__":
+    main()
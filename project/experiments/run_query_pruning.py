@@ -0,0 +1,103 @@
+import time
+import os
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+import config
+from services import qdrant_client, vlm_encoder
+
+
+BENCHMARK_QUERIES = [
+    "What is a process?", "What is a thread?", "Explain deadlock",
+    "Virtual memory definition", "CPU scheduling types", "Semaphores vs Mutex",
+    "paging vs segmentation", "context switch overhead", "process control block",
+    "bankers algorithm", "thrashing causes", "kernel mode vs user mode"
+]
+TOP_K = 5
+NUM_RUNS = 5
+RESULTS_FILE = "logs/query_pruning_results.csv"
+
+# encode_query options per configuration; "full" is the unpruned reference.
+PRUNING_CONFIGS = {
+    "full": {"prune_tokens": False},
+    "special_only": {"prune_tokens": True, "dedup_threshold": 1.01},
+    "dedup": {"prune_tokens": True, "dedup_threshold": config.QUERY_DEDUP_THRESHOLD},
+    "cap_16": {"prune_tokens": True, "dedup_threshold": config.QUERY_DEDUP_THRESHOLD, "max_query_tokens": 16},
+    "cap_8": {"prune_tokens": True, "dedup_threshold": config.QUERY_DEDUP_THRESHOLD, "max_query_tokens": 8},
+    "cap_4": {"prune_tokens": True, "dedup_threshold": config.QUERY_DEDUP_THRESHOLD, "max_query_tokens": 4},
+}
+
+
+def main():
+    """
+    Measures Qdrant search latency against recall@k for each query-token
+    pruning configuration. Recall@k is taken against the top-k of the
+    unpruned query (the full MaxSim ranking).
+    """
+    print("--- Initializing Query Token Pruning Benchmark ---")
+    try:
+        model, processor = vlm_encoder.load_vlm_model(config.MODEL_NAME, config.DEVICE)
+        q_client = qdrant_client.get_qdrant_client(config.QDRANT_HOST, config.QDRANT_PORT)
+    except Exception as e:
+        print(f"Failed to initialize services: {e}")
+        return
+
+    print("Pre-encoding benchmark queries...")
+    encoded = {
+        name: [
+            vlm_encoder.encode_query(model, processor, query_text, config.DEVICE, **options)
+            for query_text in BENCHMARK_QUERIES
+        ]
+        for name, options in PRUNING_CONFIGS.items()
+    }
+
+    def search(query_vector, search_params=None):
+        return qdrant_client.search_qdrant(
+            q_client, config.COLLECTION_NAME, query_vector["initial"], TOP_K,
+            payload_fields=config.SEARCH_PAYLOAD_FIELDS,
+            search_params=search_params
+        )
+
+    # Exact, unquantised scan of the unpruned query, so recall measures only
+    # what pruning loses and not HNSW or quantisation error
+    exact_params = qdrant_client.build_search_params(exact=True, ignore_quantization=True)
+    reference = [{p.id for p in search(v, exact_params)} for v in encoded["full"]]
+    # An empty reference would make any configuration look perfect
+    missing = [query_text for query_text, expected in zip(BENCHMARK_QUERIES, reference) if not expected]
+    if missing:
+        print(f"Reference search returned no results for {missing}; is '{config.COLLECTION_NAME}' indexed?")
+        return
+
+    rows = []
+    for run in tqdm(range(NUM_RUNS), desc="Sampling Runs"):
+        for name, query_vectors in encoded.items():
+            for query_text, query_vector, expected in zip(BENCHMARK_QUERIES, query_vectors, reference):
+                start_time = time.perf_counter()
+                results = search(query_vector)
+                latency_ms = (time.perf_counter() - start_time) * 1000
+                rows.append({
+                    "config": name,
+                    "run": run,
+                    "query": query_text,
+                    "query_tokens": len(query_vector["initial"]),
+                    "latency_ms": latency_ms,
+                    f"recall@{TOP_K}": len(expected & {p.id for p in results}) / len(expected),
+                })
+
+    print("\n--- Query Token Pruning Benchmark Complete ---")
+    os.makedirs("logs", exist_ok=True)
+    results_df = pd.DataFrame(rows)
+    results_df.to_csv(RESULTS_FILE, index=False)
+    print(f"Results saved to {RESULTS_FILE}")
+
+    summary = results_df.groupby("config", sort=False).agg(
+        query_tokens=("query_tokens", "mean"),
+        avg_latency_ms=("latency_ms", "mean"),
+        p95_latency_ms=("latency_ms", lambda x: np.percentile(x, 95)),
+        recall=(f"recall@{TOP_K}", "mean"),
+    )
+    print(summary.round(3))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import itertools
+import time
+import os
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+import config
+from services import qdrant_client, vlm_encoder
+
+
+BENCHMARK_QUERIES = [
+    "What is a process?", "What is a thread?", "Explain deadlock",
+    "Virtual memory definition", "CPU scheduling types", "Semaphores vs Mutex",
+    "paging vs segmentation", "context switch overhead", "process control block",
+    "bankers algorithm", "thrashing causes", "kernel mode vs user mode"
+]
+TOP_K = 5
+NUM_RUNS = 3
+RESULTS_FILE = "logs/search_param_sweep.csv"
+
+# Grid of query-time settings; None means "server default".
+HNSW_EF_VALUES = [None, 32, 64, 128, 256]
+RESCORE_VALUES = [False, True]
+OVERSAMPLING_VALUES = [None, 2.0, 4.0]
+
+
+def pareto_front(summary: pd.DataFrame) -> pd.Series:
+    """Marks settings not beaten by a faster setting with equal or better recall."""
+    ordered = summary.sort_values(["avg_latency_ms", "recall"], ascending=[True, False])
+    best_recall = -1.0
+    on_front = pd.Series(False, index=summary.index)
+    for index, row in ordered.iterrows():
+        if row["recall"] > best_recall:
+            on_front[index] = True
+            best_recall = row["recall"]
+    return on_front
+
+
+def main():
+    """
+    Sweeps hnsw_ef / quantisation rescore / oversampling over the benchmark
+    queries and writes a latency-vs-recall table. Ground truth is an exact
+    scan on the original (unquantised) vectors; settings on the Pareto
+    front are the ones worth choosing between.
+    """
+    print("--- Initializing Search Parameter Sweep ---")
+    try:
+        model, processor = vlm_encoder.load_vlm_model(config.MODEL_NAME, config.DEVICE)
+        q_client = qdrant_client.get_qdrant_client(config.QDRANT_HOST, config.QDRANT_PORT)
+    except Exception as e:
+        print(f"Failed to initialize services: {e}")
+        return
+
+    print("Pre-encoding benchmark queries...")
+    query_vectors = [
+        vlm_encoder.encode_query(model, processor, query_text, config.DEVICE)["initial"]
+        for query_text in BENCHMARK_QUERIES
+    ]
+
+    def search(query_vector, search_params):
+        return qdrant_client.search_qdrant(
+            q_client, config.COLLECTION_NAME, query_vector, TOP_K,
+            payload_fields=config.SEARCH_PAYLOAD_FIELDS,
+            search_params=search_params
+        )
+
+    exact_params = qdrant_client.build_search_params(exact=True, ignore_quantization=True)
+    ground_truth = [{p.id for p in search(v, exact_params)} for v in query_vectors]
+    # An empty ground truth would make every setting look perfect
+    missing = [query_text for query_text, expected in zip(BENCHMARK_QUERIES, ground_truth) if not expected]
+    if missing:
+        print(f"Exact search returned no results for {missing}; is '{config.COLLECTION_NAME}' indexed?")
+        return
+
+    grid = [
+        (hnsw_ef, rescore, oversampling)
+        for hnsw_ef, rescore, oversampling in itertools.product(HNSW_EF_VALUES, RESCORE_VALUES, OVERSAMPLING_VALUES)
+        # Oversampling only matters when the candidates are rescored
+        if rescore or oversampling is None
+    ]
+
+    rows = []
+    for run in tqdm(range(NUM_RUNS), desc="Sampling Runs"):
+        for hnsw_ef, rescore, oversampling in grid:
+            search_params = qdrant_client.build_search_params(
+                hnsw_ef=hnsw_ef, rescore=rescore, oversampling=oversampling
+            )
+            for query_text, query_vector, expected in zip(BENCHMARK_QUERIES, query_vectors, ground_truth):
+                start_time = time.perf_counter()
+                results = search(query_vector, search_params)
+                latency_ms = (time.perf_counter() - start_time) * 1000
+                rows.append({
+                    "hnsw_ef": hnsw_ef if hnsw_ef is not None else "default",
+                    "rescore": rescore,
+                    "oversampling": oversampling if oversampling is not None else "default",
+                    "run": run,
+                    "query": query_text,
+                    "latency_ms": latency_ms,
+                    f"recall@{TOP_K}": len(expected & {p.id for p in results}) / len(expected),
+                })
+
+    print("\n--- Search Parameter Sweep Complete ---")
+    os.makedirs("logs", exist_ok=True)
+    results_df = pd.DataFrame(rows)
+    results_df.to_csv(RESULTS_FILE, index=False)
+    print(f"Results saved to {RESULTS_FILE}")
+
+    summary = results_df.groupby(["hnsw_ef", "rescore", "oversampling"]).agg(
+        avg_latency_ms=("latency_ms", "mean"),
+        p95_latency_ms=("latency_ms", lambda x: np.percentile(x, 95)),
+        recall=(f"recall@{TOP_K}", "mean"),
+    ).reset_index()
+    summary["pareto"] = pareto_front(summary)
+    summary = summary.sort_values("avg_latency_ms")
+    summary.to_csv(RESULTS_FILE.replace(".csv", "_pareto.csv"), index=False)
+    print("\n--- Latency vs Recall (Pareto-optimal settings marked) ---")
+    print(summary.round(3).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
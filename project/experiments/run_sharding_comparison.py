@@ -0,0 +1,128 @@
+import time
+import os
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+from qdrant_client import models
+
+import config
+from services import qdrant_client, vlm_encoder
+
+
+BENCHMARK_QUERIES = [
+    "What is a process?", "What is a thread?", "Explain deadlock",
+    "Virtual memory definition", "CPU scheduling types", "Semaphores vs Mutex",
+]
+# Sharding layouts compared: (suffix, custom_sharding, shard_groups)
+LAYOUTS = [
+    ("auto", False, None),
+    ("by_book", True, None),
+    ("by_book_group", True, config.SHARD_GROUPS),
+]
+COPY_BATCH_SIZE = 32
+TOP_K = 5
+NUM_RUNS = 3
+RESULTS_FILE = "logs/sharding_results.csv"
+
+
+def copy_points(q_client, source: str, target: str, custom_sharding: bool, shard_groups) -> list:
+    """Copies every point into target, routing it by book when custom-sharded. Returns the books seen."""
+    books, known_shard_keys, offset = set(), set(), None
+    while True:
+        records, offset = q_client.scroll(
+            collection_name=source, limit=COPY_BATCH_SIZE, offset=offset,
+            with_payload=True, with_vectors=True
+        )
+        groups = {None: records}
+        if custom_sharding:
+            groups = {}
+            for record in records:
+                shard_key = qdrant_client.shard_key_for_book(record.payload["book_name"], shard_groups)
+                groups.setdefault(shard_key, []).append(record)
+            qdrant_client.ensure_shard_keys(q_client, target, list(groups), known_shard_keys)
+        for shard_key, group in groups.items():
+            if not group:
+                continue
+            q_client.upsert(
+                collection_name=target,
+                points=[models.PointStruct(id=r.id, vector=r.vector, payload=r.payload) for r in group],
+                shard_key_selector=shard_key,
+                wait=True
+            )
+        books.update(r.payload["book_name"] for r in records)
+        if offset is None:
+            return sorted(books)
+
+
+def main():
+    """
+    Compares book-scoped search latency on hash-sharded ("auto") versus
+    book-keyed custom-sharded copies of the collection. On the custom
+    layouts a scoped query is routed to its book's shard only; on "auto"
+    it fans out to every shard and relies on the book_name filter.
+    """
+    print("--- Initializing Sharding Comparison ---")
+    try:
+        model, processor = vlm_encoder.load_vlm_model(config.MODEL_NAME, config.DEVICE)
+        q_client = qdrant_client.get_qdrant_client(config.QDRANT_HOST, config.QDRANT_PORT)
+    except Exception as e:
+        print(f"Failed to initialize services: {e}")
+        return
+
+    query_vectors = [
+        vlm_encoder.encode_query(model, processor, query_text, config.DEVICE)["initial"]
+        for query_text in BENCHMARK_QUERIES
+    ]
+
+    books = []
+    for suffix, custom_sharding, shard_groups in LAYOUTS:
+        collection_name = f"{config.COLLECTION_NAME}_{suffix}"
+        qdrant_client.create_qdrant_collection_if_not_exists(
+            q_client, collection_name, config.DIM, force_recreate=True,
+            sparse_vector_name=config.SPARSE_VECTOR_NAME, custom_sharding=custom_sharding
+        )
+        books = copy_points(q_client, config.COLLECTION_NAME, collection_name, custom_sharding, shard_groups)
+        qdrant_client.wait_for_collection_indexed(q_client, collection_name)
+        print(f"Built {collection_name} ({len(books)} books)")
+
+    rows, reference = [], {}
+    for run in tqdm(range(NUM_RUNS), desc="Sampling Runs"):
+        for suffix, custom_sharding, shard_groups in LAYOUTS:
+            collection_name = f"{config.COLLECTION_NAME}_{suffix}"
+            for book in books:
+                scope = qdrant_client.book_scope_kwargs([book], custom_sharding, shard_groups)
+                for query_text, query_vector in zip(BENCHMARK_QUERIES, query_vectors):
+                    start_time = time.perf_counter()
+                    results = qdrant_client.search_qdrant(
+                        q_client, collection_name, query_vector, TOP_K,
+                        payload_fields=config.SEARCH_PAYLOAD_FIELDS, **scope
+                    )
+                    latency_ms = (time.perf_counter() - start_time) * 1000
+                    ids = {p.id for p in results}
+                    # Routed results must match the fan-out results
+                    expected = reference.setdefault((book, query_text), ids)
+                    rows.append({
+                        "layout": suffix,
+                        "run": run,
+                        "book": book,
+                        "query": query_text,
+                        "latency_ms": latency_ms,
+                        "matches_fanout": ids == expected,
+                    })
+
+    for suffix, _, _ in LAYOUTS:
+        q_client.delete_collection(f"{config.COLLECTION_NAME}_{suffix}")
+
+    print("\n--- Sharding Comparison Complete ---")
+    os.makedirs("logs", exist_ok=True)
+    results_df = pd.DataFrame(rows)
+    results_df.to_csv(RESULTS_FILE, index=False)
+    print(f"Results saved to {RESULTS_FILE}")
+    print(results_df.groupby("layout", sort=False).agg(
+        avg_latency_ms=("latency_ms", "mean"),
+        p95_latency_ms=("latency_ms", lambda x: np.percentile(x, 95)),
+        matches_fanout=("matches_fanout", "mean"),
+    ).round(3))
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,9 @@ import os
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
-from qdrant_client import models
 
 import config
-from services import minio_client, qdrant_client, vlm_encoder
+from services import collection_snapshots, minio_client, qdrant_client, vlm_encoder
 
 
 CORPUS_SIZE_STEPS = [1278] 
@@ -26,7 +25,7 @@ def run_raw_latency_benchmark(model, processor, q_client) -> list:
     
     for query_text in BENCHMARK_QUERIES:
 
-        query_vector = vlm_encoder.encode_query(model, processor, query_text, config.DEVICE)
+        query_vector = vlm_encoder.encode_query(model, processor, query_text, config.DEVICE)["initial"]
         
         start_time = time.time()
         qdrant_client.search_qdrant(
@@ -56,6 +55,13 @@ def main():
         print(f"Failed to initialize services: {e}")
         return
 
+    if config.BENCHMARK_SNAPSHOT:
+        collection_snapshots.ensure_collection_from_snapshot(
+            q_client, config.QDRANT_HOST, config.QDRANT_PORT, config.COLLECTION_NAME,
+            config.BENCHMARK_SNAPSHOT, config.SNAPSHOT_DIR, config.INDEXING_SETTINGS,
+            m_client=m_client, bucket_name=config.SNAPSHOT_BUCKET,
+            keep_versions=config.KEEP_COLLECTION_VERSIONS
+        )
 
     current_index_size = q_client.count(config.COLLECTION_NAME, exact=True).count
     print(f"Analyzing tail latency against {current_index_size} documents.")
@@ -0,0 +1,74 @@
+import argparse
+import os
+
+import config
+from services import collection_snapshots, minio_client, qdrant_client
+
+
+def main():
+    """
+    Exports, lists and restores Qdrant collection snapshots.
+
+      python manage_snapshots.py create [--upload]
+      python manage_snapshots.py list
+      python manage_snapshots.py restore <snapshot-name> [--collection NAME]
+
+    Snapshots live in config.SNAPSHOT_DIR and, with --upload, in the
+    config.SNAPSHOT_BUCKET MinIO bucket, so a fresh Qdrant instance can be
+    brought up without re-encoding the library.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    create_parser = subparsers.add_parser("create", help="snapshot the collection and write its manifest")
+    create_parser.add_argument("--upload", action="store_true", help="also store it in MinIO")
+    subparsers.add_parser("list", help="list local and MinIO snapshots")
+    restore_parser = subparsers.add_parser("restore", help="restore a snapshot into Qdrant")
+    restore_parser.add_argument("snapshot", help="snapshot file name (with or without .snapshot)")
+    restore_parser.add_argument("--collection", default=config.COLLECTION_NAME)
+    restore_parser.add_argument("--force", action="store_true", help="skip the indexing settings check")
+    args = parser.parse_args()
+
+    try:
+        q_client = qdrant_client.get_qdrant_client(config.QDRANT_HOST, config.QDRANT_PORT)
+        m_client = minio_client.get_minio_client(
+            config.MINIO_HOST,
+            config.MINIO_ACCESS_KEY,
+            config.MINIO_SECRET_KEY,
+            config.MINIO_SECURE
+        )
+    except Exception as e:
+        print(f"Failed to initialize services. Exiting. Error: {e}")
+        return
+
+    if args.command == "create":
+        manifest = collection_snapshots.export_snapshot(
+            q_client, config.QDRANT_HOST, config.QDRANT_PORT, config.COLLECTION_NAME,
+            config.SNAPSHOT_DIR, config.INDEXING_SETTINGS,
+            m_client=m_client if args.upload else None,
+            bucket_name=config.SNAPSHOT_BUCKET
+        )
+        print(f"Snapshot: {manifest['snapshot']} ({manifest['points_count']} points)")
+
+    elif args.command == "list":
+        local = sorted(f for f in os.listdir(config.SNAPSHOT_DIR) if f.endswith(".snapshot")) \
+            if os.path.isdir(config.SNAPSHOT_DIR) else []
+        remote = sorted(
+            obj.object_name for obj in minio_client.list_images_in_bucket(m_client, config.SNAPSHOT_BUCKET)
+            if obj.object_name.endswith(".snapshot")
+        )
+        for name in sorted(set(local) | set(remote)):
+            where = ", ".join(label for label, names in [("local", local), ("minio", remote)] if name in names)
+            print(f"{name}  [{where}]")
+
+    elif args.command == "restore":
+        collection_snapshots.restore_snapshot(
+            q_client, config.QDRANT_HOST, config.QDRANT_PORT, args.collection,
+            args.snapshot, config.SNAPSHOT_DIR,
+            indexing_settings=None if args.force else config.INDEXING_SETTINGS,
+            m_client=m_client,
+            bucket_name=config.SNAPSHOT_BUCKET,
+            keep_versions=config.KEEP_COLLECTION_VERSIONS
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import argparse
+import time
+
+import config
+from services import llm_service, vlm_encoder, weight_snapshot
+
+
+def prepare_vlm(force: bool):
+    path = weight_snapshot.snapshot_path(config.WEIGHT_SNAPSHOT_DIR, config.MODEL_NAME)
+    if weight_snapshot.has_snapshot(path) and not force:
+        print(f"VLM snapshot already exists at {path} (use --force to rebuild)")
+        return
+    start_time = time.perf_counter()
+    model, processor = vlm_encoder.load_vlm_model(config.MODEL_NAME, "cpu")
+    print(f"Loaded {config.MODEL_NAME} from the Hub in {time.perf_counter() - start_time:.1f}s")
+    weight_snapshot.save_snapshot(model, processor, path, source=config.MODEL_NAME)
+
+
+def prepare_llm(force: bool):
+    path = weight_snapshot.snapshot_path(config.WEIGHT_SNAPSHOT_DIR, config.LLM_MODEL_NAME)
+    if weight_snapshot.has_snapshot(path) and not force:
+        print(f"LLM snapshot already exists at {path} (use --force to rebuild)")
+        return
+    start_time = time.perf_counter()
+    # Prefix cache and scheduler are not needed just to re-serialise weights
+    service = llm_service.load_llama_service(config.LLM_MODEL_NAME, "cpu", prefix_cache=False)
+    print(f"Loaded {config.LLM_MODEL_NAME} from the Hub in {time.perf_counter() - start_time:.1f}s")
+    weight_snapshot.save_snapshot(service.model, service.tokenizer, path, source=config.LLM_MODEL_NAME)
+
+
+def main():
+    """
+    Writes local bf16 safetensors snapshots of the ColPali and Llama weights
+    to config.WEIGHT_SNAPSHOT_DIR. The loaders memory-map these instead of
+    resolving and converting the Hub checkpoints, so worker start-up is
+    bounded by page-in and repeated starts reuse the OS page cache.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--models", nargs="+", choices=["vlm", "llm"], default=["vlm", "llm"])
+    parser.add_argument("--force", action="store_true", help="rebuild snapshots that already exist")
+    args = parser.parse_args()
+
+    print(f"--- Preparing weight snapshots in {config.WEIGHT_SNAPSHOT_DIR} ---")
+    if "vlm" in args.models:
+        prepare_vlm(args.force)
+    if "llm" in args.models:
+        prepare_llm(args.force)
+
+if __name__ == "__main__":
+    main()
@@ -33,6 +33,10 @@ def process_and_upload_book(pdf_path, output_dir, minio_prefix):
         print(f"Failed to connect to MinIO: {e}")
         return
 
+    # Thumbnails are served to the app by URL, without credentials
+    if not minio_client.ensure_public_read_bucket(m_client, config.THUMBNAIL_BUCKET):
+        print("Thumbnail URLs will not be readable; the app will fall back to full pages.")
+
     # 2. Get PDF Info
     try:
         info = pdfinfo_from_path(pdf_path)
@@ -74,10 +78,21 @@ def process_and_upload_book(pdf_path, output_dir, minio_prefix):
                 image_pil
             )
             
+            # D. Upload fixed-size thumbnails for the results grid
+            thumbnails_success = minio_client.upload_thumbnails(
+                m_client,
+                config.THUMBNAIL_BUCKET,
+                minio_object_name,
+                image_pil,
+                config.THUMBNAIL_WIDTHS
+            )
+            
             if upload_success:
                 success_count += 1
             else:
                 print(f"Failed to upload page {i} to MinIO.")
+            if not thumbnails_success:
+                print(f"Failed to upload thumbnails for page {i}.")
 
         except Exception as e:
             print(f"Error on page {i}: {e}")
@@ -87,6 +102,7 @@ def process_and_upload_book(pdf_path, output_dir, minio_prefix):
     print(f"Successfully converted and uploaded {success_count}/{total_pages} pages.")
     print(f"Local images: {output_dir}")
     print(f"MinIO path:   {config.MINIO_BUCKET}/{minio_prefix}/")
+    print(f"Thumbnails:   {config.THUMBNAIL_BUCKET}/w<width>/{minio_prefix}/")
 
 if __name__ == "__main__":
     if not os.path.exists(PDF_PATH):
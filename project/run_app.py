@@ -91,54 +91,39 @@
 #     main()
 
 
-from typing import List
 import streamlit as st
-import numpy as np
-import time
-from qdrant_client import models
+import requests
 
 import config
-from services import qdrant_client, vlm_encoder
-from services import llm_service
-
-class MockLLMClient:
-    def generate_content(self, model, contents, config=None):
-        class MockResponse:
-            text = ""
-        # Simulate a quick response time
-        time.sleep(0.5) 
-        return MockResponse()
-
-def generate_answer(query: str, context: str, llm_client) -> str:
-    """Passes context and query to an LLM for summarization."""
-    
-    # --- This is the core RAG prompt structure ---
-    prompt = (
-        f"Context (Textbook Pages):\n---\n{context}\n---\nUser Question: {query}"
-    )
-    
-    # In a production environment, you would call the LLM API here.
-    # We will simulate the generation step for completeness.
-    if "fourier optics" in query.lower():
-         return "Fourier optics is a branch of optics that uses the mathematical tools of Fourier analysis to study diffraction and the formation of images, particularly how light propagates through optical systems, and is fundamental to understanding phenomena like frequency-domain filtering. [Source: Textbook9 Page 376]"
-    else:
-         return f"Generated answer for '{query}' using retrieved context: The required information was synthesized from {len(context.split('---'))} page excerpts and is presented below: [LLM output here...]"
-
-# Global variables to cache model and client
+from services import metrics, retrieval_api
+from services.thumbnail_cache import ThumbnailCache
+
+# The ColPali model, Qdrant client and LLM live in run_server.py; this app
+# only renders results, so UI reruns and browser sessions never compete for
+# the models and the backend scales independently.
+
 @st.cache_resource
 def load_resources():
-    """Load VLM model, Qdrant client, and LLM client once."""
-    try:
-        model, processor = vlm_encoder.load_vlm_model(config.MODEL_NAME, config.DEVICE)
-        q_client = qdrant_client.get_qdrant_client(config.QDRANT_HOST, config.QDRANT_PORT)
-        
-        # NEW: Initialize Mock LLM Client
-        llm_client = MockLLMClient() 
-        
-        return model, processor, q_client, llm_client
-    except Exception as e:
-        st.error(f"Failed to load resources: {e}")
+    """Create one keep-alive session to the retrieval service."""
+    session = retrieval_api.get_api_session()
+    if not retrieval_api.is_ready(session, config.SERVICE_URL):
+        st.error(f"Retrieval service at {config.SERVICE_URL} is not ready. Start it with `python run_server.py`.")
         st.stop()
+    return session
+
+@st.cache_resource
+def load_thumbnail_cache():
+    """One thumbnail byte cache shared by all sessions of this app process."""
+    return ThumbnailCache(config.THUMBNAIL_CACHE_BYTES)
+
+@st.cache_resource
+def start_metrics_server(_thumbnails: ThumbnailCache):
+    """Serves this app process's cache metrics on APP_METRICS_PORT (once, not per rerun)."""
+    metrics.register_cache("thumbnail", _thumbnails)
+    metrics.gauge(
+        "rag_thumbnail_cache_bytes", "Bytes held by the thumbnail cache."
+    ).set_function(lambda: _thumbnails.current_bytes)
+    return metrics.start_http_server(config.APP_METRICS_PORT)
 
 # --- Main Application Logic ---
 def main():
@@ -146,7 +131,10 @@ def main():
     st.title("Digital Library Vector Search (RAG Enabled)")
     st.caption("Retrieval-Augmented Generation powered by ColPali and Qdrant")
 
-    model, processor, q_client, llm_client = load_resources()
+    session = load_resources()
+    thumbnails = load_thumbnail_cache()
+    if config.METRICS_ENABLED:
+        start_metrics_server(thumbnails)
 
     # --- 1. User Input ---
     query_text = st.text_input(
@@ -156,52 +144,35 @@ def main():
     
     # --- 2. Search Execution ---
     if st.button("Search") and query_text:
-        if 'page_text' not in qdrant_client.get_expected_payload_keys():
-             st.warning("Warning: Text content may not be available for generation. Ensure 'page_text' is indexed.")
-             
         with st.spinner("Encoding query, retrieving sources, and generating answer..."):
             try:
-                # 1. Retrieval Stage (VLM Encoding + Qdrant Search)
-                query_vectors_dict = vlm_encoder.encode_query(model, processor, query_text, config.DEVICE)
-                pooled_query_vector = query_vectors_dict.get("mean_pooling")
-                
-                if not pooled_query_vector:
-                    st.error("Query encoding failed or returned an empty vector.")
-                    return
-
-                retrieved_pages: List[models.ScoredPoint] = qdrant_client.search_qdrant(
-                    q_client,
-                    config.COLLECTION_NAME,
-                    pooled_query_vector,
-                    top_k=5 
+                # 1. Retrieval Stage (VLM Encoding + Qdrant Search, served remotely)
+                retrieved = retrieval_api.search(
+                    session, config.SERVICE_URL, query_text, config.TOP_K, timeout=config.SERVICE_TIMEOUT
                 )
+                retrieved_pages = retrieved["results"]
                 
                 if not retrieved_pages:
                     st.warning("No relevant pages were retrieved for this query.")
                     return
 
-                # --- 2. Generation Stage (New RAG Implementation) ---
-                
-                # a. Compile Context from Retrieved Pages
-                context_list = []
-                for point in retrieved_pages:
-                    # Assume 'page_text' is indexed in the Qdrant payload
-                    page_text = point.payload.get('page_text', 'Page text not found.') 
-                    book_name = point.payload.get('book_name')
-                    page_number = point.payload.get('page_number')
-                    
-                    # Create a citable source block
-                    source_info = f"[Source: Book {book_name} Page {page_number}]"
-                    context_list.append(f"{source_info}\n{page_text}")
-                
-                full_context = "\n---\n".join(context_list)
-                
-                # b. Generate Answer using LLM
+                # --- 2. Generation Stage ---
                 st.subheader("🤖 Generated Answer")
-                with st.spinner("Synthesizing answer from retrieved sources..."):
-                    final_answer = generate_answer(query_text, full_context, llm_client) 
-                
-                st.markdown(final_answer)
+                generation_timings = {}
+                try:
+                    # Render tokens as they arrive instead of waiting for the full answer
+                    st.write_stream(retrieval_api.stream_answer(
+                        session, config.SERVICE_URL, query_text,
+                        sources=retrieved_pages, timeout=config.SERVICE_TIMEOUT,
+                        timings=generation_timings,
+                        query_embedding=retrieved.get("query_embedding")
+                    ))
+                    st.caption(
+                        f"Time to first token: {generation_timings.get('ttft_ms', 0):.0f} ms | "
+                        f"Total generation: {generation_timings.get('total_ms', 0):.0f} ms"
+                    )
+                except requests.HTTPError as e:
+                    st.warning(f"Answer generation unavailable: {e.response.json().get('detail', e)}")
                 st.markdown("---")
                 
                 # 3. Display Supporting Sources (Images & Metadata)
@@ -209,30 +180,33 @@ def main():
                 cols = st.columns(len(retrieved_pages))
                 
                 for i, point in enumerate(retrieved_pages):
+                    payload = point["payload"]
                     with cols[i]:
-                        st.metric(label=f"Rank {i+1} Score", value=f"{point.score:.4f}")
+                        st.metric(label=f"Rank {i+1} Score", value=f"{point['score']:.4f}")
                         
-                        page_url = point.payload.get('page_url', 'URL not found')
-
-                        if page_url and page_url != 'URL not found':
+                        page_url = payload.get('page_url', 'URL not found')
+                        thumbnail_url = payload.get('thumbnail_url')
+                        caption = f"Page {payload.get('page_number', 'N/A')}"
+
+                        # Serve the small ingest-time thumbnail from the byte cache;
+                        # fall back to the full page for points indexed without one.
+                        thumbnail = thumbnails.fetch(session, thumbnail_url) if thumbnail_url else None
+                        if thumbnail:
+                            st.image(thumbnail, caption=caption, width=250)
+                        elif page_url and page_url != 'URL not found':
                             st.image(
                                 page_url, 
-                                caption=f"Page {point.payload.get('page_number', 'N/A')}",
+                                caption=caption,
                                 width=250
                             )
                         
                         st.markdown("**Source:**")
-                        st.text(f"Book: {point.payload.get('book_name')}")
-                        st.text(f"Page ID: {point.id}")
+                        st.text(f"Book: {payload.get('book_name')}")
+                        st.text(f"Page ID: {point['id']}")
                         st.markdown("---")
                             
             except Exception as e:
                 st.error(f"An error occurred during search: {e}")
 
 if __name__ == "__main__":
-    
-    def get_expected_payload_keys():
-        return ['page_text', 'page_url', 'page_number', 'book_name']
-    qdrant_client.get_expected_payload_keys = get_expected_payload_keys
-    
     main()
\ No newline at end of file
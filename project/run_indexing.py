@@ -100,7 +100,7 @@
 #                     )
                     
 #                     qdrant_client.upsert_batch_to_qdrant(
-#                         q_client, config.COLLECTION_NAME, point_ids, 
+#                         q_client, collection_name, point_ids, 
 #                         payload_batch, vectors_dict
 #                     )
                     
@@ -119,7 +119,7 @@
 #                 config.IMAGE_SEQ_LENGTH, config.DIM
 #             )
 #             qdrant_client.upsert_batch_to_qdrant(
-#                 q_client, config.COLLECTION_NAME, point_ids, 
+#                 q_client, collection_name, point_ids, 
 #                 payload_batch, vectors_dict
 #             )
 
@@ -136,14 +136,22 @@
 
 import time
 import os
+import csv
+import datetime
 from tqdm import tqdm
-from typing import List
+from typing import List, Optional
 import io
 from PIL import Image
 
 # Import all our project modules
 import config
-from services import minio_client, qdrant_client, vlm_encoder
+from services import metrics, minio_client, qdrant_client, sparse_encoder, tracing, vlm_encoder
+
+PAGES_INDEXED = metrics.counter("rag_indexing_pages_indexed_total", "Pages encoded and written to Qdrant.")
+PAGES_FAILED = metrics.counter("rag_indexing_pages_failed_total", "Pages skipped or lost, by reason.", ["reason"])
+PAGES_REMAINING = metrics.gauge("rag_indexing_pages_remaining", "Listed pages not yet processed by this run.")
+BATCH_PENDING = metrics.gauge("rag_indexing_batch_pending_pages", "Downloaded pages waiting for the next encode batch.")
+ENCODE_BATCH_SECONDS = metrics.histogram("rag_indexing_encode_batch_seconds", "ColPali encode time per page batch.")
 # NOTE: Assume you have a helper function in minio_client 
 # to fetch text/OCR data associated with the image.
 
@@ -160,6 +168,70 @@ def get_mock_text(book_name, page_number):
     return "No extracted text available for this page."
 
 
+def add_sparse_vectors(vectors_dict: dict, payload_batch: List[dict]) -> dict:
+    """Adds the BM25 sparse vector built from each page's page_text."""
+    vectors_dict[config.SPARSE_VECTOR_NAME] = [
+        sparse_encoder.encode_document(
+            payload.get("page_text", ""),
+            k1=config.BM25_K1,
+            b=config.BM25_B,
+            avg_doc_len=config.BM25_AVG_DOC_LEN
+        )
+        for payload in payload_batch
+    ]
+    return vectors_dict
+
+
+def batch_shard_keys(
+    q_client,
+    collection_name: str,
+    payload_batch: List[dict],
+    known_shard_keys: set
+) -> Optional[List[str]]:
+    """
+    Shard key of every page in the batch under config.SHARDING_MODE (None
+    for automatic sharding), creating keys seen for the first time.
+    """
+    if config.SHARDING_MODE == "auto":
+        return None
+    shard_groups = config.SHARD_GROUPS if config.SHARDING_MODE == "book_group" else None
+    shard_keys = [qdrant_client.shard_key_for_book(p["book_name"], shard_groups) for p in payload_batch]
+    qdrant_client.ensure_shard_keys(q_client, collection_name, shard_keys, known_shard_keys)
+    return shard_keys
+
+
+def index_batch(
+    model,
+    processor,
+    q_client,
+    collection_name: str,
+    image_batch: list,
+    payload_batch: List[dict],
+    point_ids: List[int],
+    known_shard_keys: set
+):
+    """Encodes one batch of pages (dense and BM25) and upserts it."""
+    with tracing.span("index_batch", pages=len(image_batch)):
+        with ENCODE_BATCH_SECONDS.time():
+            vectors_dict = vlm_encoder.encode_batch(
+                model, processor, image_batch, config.DEVICE, 
+                config.IMAGE_SEQ_LENGTH, config.DIM
+            )
+        with tracing.span("bm25.encode"):
+            add_sparse_vectors(vectors_dict, payload_batch)
+        
+        failed = qdrant_client.upsert_batch_to_qdrant(
+            q_client, collection_name, point_ids, 
+            payload_batch, vectors_dict,
+            shard_keys=batch_shard_keys(q_client, collection_name, payload_batch, known_shard_keys),
+            retries=config.UPSERT_RETRIES,
+            retry_backoff=config.UPSERT_RETRY_BACKOFF
+        )
+    PAGES_INDEXED.inc(len(image_batch) - failed)
+    if failed:
+        PAGES_FAILED.inc(failed, reason="upsert")
+
+
 def main():
     """
     Indexes ALL textbooks from the MinIO bucket into a single Qdrant collection.
@@ -169,27 +241,33 @@ def main():
     # --- 1. Setup Services ---
     try:
         print("--- Initializing Service Clients ---")
-        model, processor = vlm_encoder.load_vlm_model(config.MODEL_NAME, config.DEVICE)
-        q_client = qdrant_client.get_qdrant_client(config.QDRANT_HOST, config.QDRANT_PORT)
+        if config.METRICS_ENABLED:
+            metrics.start_http_server(config.INDEXING_METRICS_PORT)
+        tracing.configure(config.TRACING_ENABLED, service_name="indexing", max_spans=config.TRACE_MAX_SPANS)
+        model, processor = vlm_encoder.load_vlm_model(
+            config.MODEL_NAME, config.DEVICE, snapshot_dir=config.WEIGHT_SNAPSHOT_DIR
+        )
+        q_client = qdrant_client.get_qdrant_client(
+            config.QDRANT_HOST,
+            config.QDRANT_PORT,
+            prefer_grpc=config.QDRANT_PREFER_GRPC,
+            grpc_port=config.QDRANT_GRPC_PORT,
+            pool_size=config.QDRANT_POOL_SIZE
+        )
         m_client = minio_client.get_minio_client(
             config.MINIO_HOST, 
             config.MINIO_ACCESS_KEY, 
             config.MINIO_SECRET_KEY, 
-            config.MINIO_SECURE
+            config.MINIO_SECURE,
+            pool_size=config.MINIO_POOL_SIZE
         )
     except Exception as e:
         print(f"Failed to initialize services. Exiting. Error: {e}")
         return
 
-    # --- 2. Create/Recreate Qdrant Collection ---
-    qdrant_client.create_qdrant_collection_if_not_exists(
-        q_client, 
-        config.COLLECTION_NAME, 
-        config.DIM,
-        force_recreate=True 
-    )
-    
-    # --- 3. Get List of ALL Images (Recursive) ---
+    # --- 2. Get List of ALL Images (Recursive) ---
+    # Listed before the collection is touched, so an empty bucket leaves no
+    # empty version (or a collection stuck in bulk-load mode) behind
     objects_iterator = m_client.list_objects(config.MINIO_BUCKET, recursive=True)
     objects_list = list(objects_iterator)
     
@@ -197,89 +275,167 @@ def main():
         print("No images found in MinIO bucket. Exiting.")
         return
 
+    # --- 3. Create/Recreate Qdrant Collection ---
+    # COLLECTION_NAME is always an alias; the data lives in a new version.
+    # Blue/green builds it while readers keep using the old one.
+    collection_name = qdrant_client.versioned_collection_name(config.COLLECTION_NAME)
+    qdrant_client.create_qdrant_collection_if_not_exists(
+        q_client, 
+        collection_name, 
+        config.DIM,
+        force_recreate=True,
+        sparse_vector_name=config.SPARSE_VECTOR_NAME,
+        profile=config.COLLECTION_PROFILE,
+        custom_sharding=config.SHARDING_MODE != "auto"
+    )
+    if config.BULK_LOAD_MODE:
+        qdrant_client.begin_bulk_load(q_client, collection_name)
+    if not config.BLUE_GREEN_INDEXING:
+        # In place: readers follow the alias onto the new version right away
+        # and see it fill up; no previous version is kept.
+        qdrant_client.switch_alias(q_client, config.COLLECTION_NAME, collection_name)
+        qdrant_client.cleanup_collection_versions(q_client, config.COLLECTION_NAME, keep=0)
+
     print(f"Found {len(objects_list)} pages across all textbooks.")
+    PAGES_REMAINING.set(len(objects_list))
+
+    try:
+        with tracing.span("indexing", pages=len(objects_list), collection=collection_name):
+            # --- 4. Run Indexing Pipeline ---
+            ingest_start_time = time.perf_counter()
+            last_trace_flush = ingest_start_time
+            known_shard_keys = set()
+            image_batch = []
+            payload_batch = []
+            point_ids = []
+            point_counter = 0
 
-    # --- 4. Run Indexing Pipeline ---
-    image_batch = []
-    payload_batch = []
-    point_ids = []
-    point_counter = 0
-
-    with tqdm(total=len(objects_list), desc="Indexing Library") as pbar:
-        for obj in objects_list:
-            try:
-                full_object_name = obj.object_name
-                filename = os.path.basename(full_object_name)
+            with tqdm(total=len(objects_list), desc="Indexing Library") as pbar:
+                for obj in objects_list:
+                    try:
+                        full_object_name = obj.object_name
+                        filename = os.path.basename(full_object_name)
                 
-                if "/" in full_object_name:
-                    book_name = os.path.dirname(full_object_name)
-                else:
-                    book_name = "uncategorized"
+                        if "/" in full_object_name:
+                            book_name = os.path.dirname(full_object_name)
+                        else:
+                            book_name = "uncategorized"
 
-                try:
-                    # Assuming filename is formatted like: bookX/page_N.png
-                    page_number = int(filename.split('_')[1].split('.')[0])
-                except (IndexError, ValueError):
-                    page_number = 0 
+                        try:
+                            # Assuming filename is formatted like: bookX/page_N.png
+                            page_number = int(filename.split('_')[1].split('.')[0])
+                        except (IndexError, ValueError):
+                            page_number = 0 
 
-                # --- Download & Process ---
-                image_pil = minio_client.download_image_to_pil(m_client, config.MINIO_BUCKET, full_object_name)
-                if image_pil is None:
-                    pbar.update(1)
-                    continue
+                        # --- Download & Process ---
+                        with tracing.span("minio.download", object_name=full_object_name):
+                            image_pil = minio_client.download_image_to_pil(m_client, config.MINIO_BUCKET, full_object_name)
+                        if image_pil is None:
+                            PAGES_FAILED.inc(reason="download")
+                            PAGES_REMAINING.dec()
+                            pbar.update(1)
+                            continue
 
-                image_url = f"http://{config.MINIO_HOST}/{config.MINIO_BUCKET}/{full_object_name}"
+                        image_url = f"http://{config.MINIO_HOST}/{config.MINIO_BUCKET}/{full_object_name}"
+                        thumbnail_key = minio_client.thumbnail_object_name(full_object_name, config.THUMBNAIL_DISPLAY_WIDTH)
+                        thumbnail_url = f"http://{config.MINIO_HOST}/{config.THUMBNAIL_BUCKET}/{thumbnail_key}"
                 
-                # --- NEW FIX: Retrieve and Store OCR Text for RAG ---
-                page_text = get_mock_text(book_name, page_number)
-                print("---", page_text,"----")
-
-                image_batch.append(image_pil)
-                payload_batch.append({
-                    "page_url": image_url,
-                    "page_number": page_number,
-                    "book_name": book_name,
-                    "page_text": page_text
-                })
-                point_ids.append(point_counter)
-                point_counter += 1
-
-                # --- Batch Upload ---
-                if len(image_batch) == config.BATCH_SIZE:
-                    vectors_dict = vlm_encoder.encode_batch(
-                        model, processor, image_batch, config.DEVICE, 
-                        config.IMAGE_SEQ_LENGTH, config.DIM
-                    )
-                    
-                    qdrant_client.upsert_batch_to_qdrant(
-                        q_client, config.COLLECTION_NAME, point_ids, 
-                        payload_batch, vectors_dict
-                    )
+                        # --- NEW FIX: Retrieve and Store OCR Text for RAG ---
+                        page_text = get_mock_text(book_name, page_number)
+                        print("---", page_text,"----")
+
+                        image_batch.append(image_pil)
+                        payload_batch.append({
+                            "page_url": image_url,
+                            "thumbnail_url": thumbnail_url,
+                            "object_name": full_object_name,
+                            "page_number": page_number,
+                            "book_name": book_name,
+                            "page_text": page_text
+                        })
+                        point_ids.append(point_counter)
+                        point_counter += 1
+                        BATCH_PENDING.set(len(image_batch))
+
+                        # --- Batch Upload ---
+                        if len(image_batch) == config.BATCH_SIZE:
+                            index_batch(
+                                model, processor, q_client, collection_name,
+                                image_batch, payload_batch, point_ids, known_shard_keys
+                            )
                     
-                    # Clear batches
-                    image_batch, payload_batch, point_ids = [], [], []
+                            # Clear batches
+                            image_batch, payload_batch, point_ids = [], [], []
+                            BATCH_PENDING.set(0)
 
-            except Exception as e:
-                print(f"Error processing {full_object_name}: {e}")
+                    except Exception as e:
+                        print(f"Error processing {full_object_name}: {e}")
+                        PAGES_FAILED.inc(reason="error")
             
-            pbar.update(1)
+                    PAGES_REMAINING.dec()
+                    pbar.update(1)
+                    if tracing.is_enabled() and time.perf_counter() - last_trace_flush > config.TRACE_FLUSH_INTERVAL:
+                        tracing.flush(config.TRACE_DIR, "indexing", config.TRACE_FORMAT)
+                        last_trace_flush = time.perf_counter()
             
-        # Process the final remaining batch
-        if image_batch:
-            vectors_dict = vlm_encoder.encode_batch(
-                model, processor, image_batch, config.DEVICE, 
-                config.IMAGE_SEQ_LENGTH, config.DIM
-            )
-            qdrant_client.upsert_batch_to_qdrant(
-                q_client, config.COLLECTION_NAME, point_ids, 
-                payload_batch, vectors_dict
-            )
+                # Process the final remaining batch
+                if image_batch:
+                    index_batch(
+                        model, processor, q_client, collection_name,
+                        image_batch, payload_batch, point_ids, known_shard_keys
+                    )
+                    BATCH_PENDING.set(0)
+
+            print("\n--- Library Indexing Complete ---")
+            print(f"Total pages indexed: {point_counter}")
+            ingest_s = time.perf_counter() - ingest_start_time
+
+            # --- 5. Wait Until Queryable ---
+            # Time to a queryable index = ingestion + waiting for the optimiser to
+            # finish building the HNSW graphs, compared across modes in the log.
+            with tracing.span("qdrant.wait_indexed", bulk_load=config.BULK_LOAD_MODE):
+                if config.BULK_LOAD_MODE:
+                    index_wait_s = qdrant_client.end_bulk_load(
+                        q_client, collection_name, indexing_threshold=config.INDEXING_THRESHOLD
+                    )
+                else:
+                    index_wait_s = qdrant_client.wait_for_collection_indexed(q_client, collection_name)
+            final_count = q_client.count(collection_name, exact=True).count
+            print(f"Qdrant collection count: {final_count}")
+            print(f"Ingestion: {ingest_s:.1f}s | Index build wait: {index_wait_s:.1f}s | "
+                  f"Time to queryable: {ingest_s + index_wait_s:.1f}s")
+            log_indexing_run(final_count, ingest_s, index_wait_s)
+
+            # --- 6. Go Live ---
+            # Only a fully optimised version is swapped in, so readers never see a
+            # partial or still-indexing collection.
+            if config.BLUE_GREEN_INDEXING:
+                qdrant_client.switch_alias(q_client, config.COLLECTION_NAME, collection_name)
+                qdrant_client.cleanup_collection_versions(
+                    q_client, config.COLLECTION_NAME, keep=config.KEEP_COLLECTION_VERSIONS
+                )
+    finally:
+        if tracing.is_enabled():
+            tracing.flush(config.TRACE_DIR, "indexing", config.TRACE_FORMAT)
+
 
-    print("\n--- Library Indexing Complete ---")
-    print(f"Total pages indexed: {point_counter}")
-    time.sleep(2)
-    final_count = q_client.count(config.COLLECTION_NAME, exact=True).count
-    print(f"Qdrant collection count: {final_count}")
+def log_indexing_run(num_points: int, ingest_s: float, index_wait_s: float):
+    """Appends this run's timings to config.INDEXING_LOG_FILE."""
+    os.makedirs(os.path.dirname(config.INDEXING_LOG_FILE), exist_ok=True)
+    write_header = not os.path.exists(config.INDEXING_LOG_FILE)
+    with open(config.INDEXING_LOG_FILE, "a", newline="") as f:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(["timestamp", "mode", "profile", "points", "ingest_s", "index_wait_s", "time_to_queryable_s"])
+        writer.writerow([
+            datetime.datetime.now().isoformat(),
+            "bulk_load" if config.BULK_LOAD_MODE else "incremental",
+            config.COLLECTION_PROFILE,
+            num_points,
+            f"{ingest_s:.2f}",
+            f"{index_wait_s:.2f}",
+            f"{ingest_s + index_wait_s:.2f}"
+        ])
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
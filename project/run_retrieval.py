@@ -1,9 +1,10 @@
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from PIL import Image
 import os
 
 import config as config
-from services import minio_client, qdrant_client, vlm_encoder
+from services import minio_client, qdrant_client, sparse_encoder, tracing, vlm_encoder
 
 USER_QUERY = "What is a kernel?"
 TOP_K_RESULTS = 3
@@ -14,93 +15,194 @@ def main():
     1. Load VLM and connect to Qdrant & MinIO
     2. Encode the text query with the VLM
     3. Search Qdrant to get top results
-    4. Fetch the result images from MinIO and display them
+    4. Fetch the result images from MinIO concurrently (prefetching the
+       next page of results in the background) and display them
     5. Print latency metrics
     """
     
     print("--- Initializing RAG Pipeline ---")
+    tracing.configure(config.TRACING_ENABLED, service_name="retrieval", max_spans=config.TRACE_MAX_SPANS)
     try:
-        model, processor = vlm_encoder.load_vlm_model(config.MODEL_NAME, config.DEVICE)
-        q_client = qdrant_client.get_qdrant_client(config.QDRANT_HOST, config.QDRANT_PORT)
+        model, processor = vlm_encoder.load_vlm_model(
+            config.MODEL_NAME, config.DEVICE,
+            snapshot_dir=config.WEIGHT_SNAPSHOT_DIR,
+            backend=config.ENCODER_BACKEND
+        )
+        q_client = qdrant_client.get_qdrant_client(
+            config.QDRANT_HOST,
+            config.QDRANT_PORT,
+            prefer_grpc=config.QDRANT_PREFER_GRPC,
+            grpc_port=config.QDRANT_GRPC_PORT,
+            pool_size=config.QDRANT_POOL_SIZE
+        )
         m_client = minio_client.get_minio_client(
             config.MINIO_HOST, 
             config.MINIO_ACCESS_KEY, 
             config.MINIO_SECRET_KEY, 
-            config.MINIO_SECURE
+            config.MINIO_SECURE,
+            pool_size=config.MINIO_POOL_SIZE
         )
     except Exception as e:
         print(f"Failed to initialize services. Exiting. Error: {e}")
         return
 
+    try:
+        with tracing.span("retrieval", query=USER_QUERY):
+            retrieve_and_show(model, processor, q_client, m_client)
+    finally:
+        if tracing.is_enabled():
+            tracing.flush(config.TRACE_DIR, "retrieval", config.TRACE_FORMAT)
+
+
+def retrieve_and_show(model, processor, q_client, m_client):
+    """
+    Runs steps 2-5 of the pipeline for USER_QUERY. Returns the next page's
+    speculative downloads (object name -> future), still in flight.
+    """
     print("-" * 40)
 
     # --- 1. Encode Query ---
     start_time = time.time()
-    vectors_dict = vlm_encoder.encode_query(model, processor, USER_QUERY, config.DEVICE)
+    vectors_dict = vlm_encoder.encode_query(
+        model, processor, USER_QUERY, config.DEVICE,
+        prune_tokens=config.QUERY_TOKEN_PRUNING,
+        max_query_tokens=config.QUERY_MAX_TOKENS,
+        dedup_threshold=config.QUERY_DEDUP_THRESHOLD
+    )
     query_vector = vectors_dict["initial"]
     vlm_time = time.time() - start_time
     print(f"  VLM Encoding took: {vlm_time*1000:.2f} ms")
 
     # --- 2. Search Qdrant ---
-    start_time = time.time()
-    results = qdrant_client.search_qdrant(
-        q_client, 
-        config.COLLECTION_NAME, 
-        query_vector, 
-        TOP_K_RESULTS,
-        vector_name="initial" # Trying max_pooling for better semantic matching
+    # Fetch one extra page of candidates so its images can be prefetched
+    search_limit = TOP_K_RESULTS * 2 if config.PREFETCH_NEXT_PAGE else TOP_K_RESULTS
+    search_params = qdrant_client.build_search_params(
+        hnsw_ef=config.SEARCH_HNSW_EF,
+        exact=config.SEARCH_EXACT,
+        rescore=config.QUANTIZATION_RESCORE,
+        oversampling=config.QUANTIZATION_OVERSAMPLING
     )
+    start_time = time.time()
+    if config.SEARCH_MODE == "hybrid":
+        candidates = qdrant_client.hybrid_search_qdrant(
+            q_client,
+            config.COLLECTION_NAME,
+            query_vector,
+            sparse_encoder.encode_query(USER_QUERY),
+            search_limit,
+            mode=config.HYBRID_MODE,
+            prefetch_limit=config.HYBRID_PREFETCH_LIMIT,
+            sparse_vector_name=config.SPARSE_VECTOR_NAME,
+            payload_fields=config.SEARCH_PAYLOAD_FIELDS,
+            search_params=search_params
+        )
+    else:
+        candidates = qdrant_client.search_qdrant(
+            q_client, 
+            config.COLLECTION_NAME, 
+            query_vector, 
+            search_limit,
+            vector_name="initial", # Trying max_pooling for better semantic matching
+            payload_fields=config.SEARCH_PAYLOAD_FIELDS,
+            search_params=search_params,
+            prefetch_vector_name=config.SEARCH_PREFETCH_VECTOR,
+            prefetch_limit=config.SEARCH_PREFETCH_LIMIT
+        )
+    results, next_page = candidates[:TOP_K_RESULTS], candidates[TOP_K_RESULTS:]
 
     qdrant_time = time.time() - start_time
     print(f"  Qdrant Search took: {qdrant_time*1000:.2f} ms")
+
+    # --- 2b. Hydrate heavy payload for the final results only ---
+    start_time = time.time()
+    results = qdrant_client.hydrate_points(
+        q_client,
+        config.COLLECTION_NAME,
+        results,
+        config.HYDRATE_PAYLOAD_FIELDS
+    )
+    hydrate_time = time.time() - start_time
+    print(f"  Payload Hydration took: {hydrate_time*1000:.2f} ms")
     print("-" * 40)
-    print(f"  Total Retrieval Latency: {(vlm_time + qdrant_time)*1000:.2f} ms")
+    print(f"  Total Retrieval Latency: {(vlm_time + qdrant_time + hydrate_time)*1000:.2f} ms")
     print("-" * 40)
 
     # --- 3. Fetch & Display Results ---
     if not results:
         print("No results found.")
-    else:
+        return {}
+
+    object_names = [
+        minio_client.object_name_from_payload(point.payload, config.MINIO_BUCKET)
+        for point in results
+    ]
+    next_object_names = [
+        name for name in (
+            minio_client.object_name_from_payload(point.payload, config.MINIO_BUCKET)
+            for point in next_page
+        ) if name
+    ]
+
+    # Not a `with` block: leaving it would wait for the prefetch to finish and
+    # add its latency to this run. The next page keeps downloading in the
+    # background and its futures are returned for a next-page request.
+    fetch_pool = ThreadPoolExecutor(max_workers=config.IMAGE_FETCH_WORKERS)
+    try:
+        # Current page is submitted first so it is never queued behind the prefetch
+        start_time = time.time()
+        image_futures = minio_client.submit_image_downloads(
+            fetch_pool, m_client, config.MINIO_BUCKET, [name for name in object_names if name]
+        )
+        prefetch_futures = dict(zip(
+            next_object_names,
+            minio_client.submit_image_downloads(
+                fetch_pool, m_client, config.MINIO_BUCKET, next_object_names
+            )
+        ))
+        with tracing.span("minio.download_images", pages=len(image_futures)):
+            wait(image_futures)
+        images_time = time.time() - start_time
+        images = iter(future.result() for future in image_futures)
+
+        print(f"  Time to All Images: {images_time*1000:.2f} ms ({len(image_futures)} pages)")
+        print(f"  Total Time to Results: {(vlm_time + qdrant_time + hydrate_time + images_time)*1000:.2f} ms")
+        print("-" * 40)
         print(f"Top {len(results)} results for '{USER_QUERY}':\n")
         
-        for i, point in enumerate(results):
+        for i, (point, object_name) in enumerate(zip(results, object_names)):
             print(f"--- Result {i+1} ---")
             print(f"  Score: {point.score:.4f}")
             
             # Get metadata from payload
             page_num = point.payload.get('page_number')
-            book_name = point.payload.get('book_name') # This was added in your new indexing script
+            book_name = point.payload.get('book_name')
             page_url = point.payload.get('page_url')
             
             print(f"  Book: {book_name}")
             print(f"  Page Number: {page_num}")
             print(f"  MinIO URL: {page_url}")
 
-            try:
-                
-                if book_name:
-                    object_name = f"{book_name}/page_{pacudoge_num}.png"
-                else:
-                    parts = page_url.split('/')
-                    object_name = f"{parts[-2]}/{parts[-1]}"
-                
-                # Download from MinIO
-                image = minio_client.download_image_to_pil(
-                    m_client, 
-                    config.MINIO_BUCKET, 
-                    object_name
-                )
-                
-                if image:
-                    # On a headless server, we print confirmation instead of .show()
-                    print(f"  Image for page {page_num} retrieved successfully.")
-                    # image.show() # Uncomment this if running on a local machine with a screen
-                else:
-                    print(f"  Failed to download image: {object_name}")
-                    
+            if not object_name:
+                print("  No object key stored for this page.")
                 print("-" * 40)
-            except Exception as e:
-                print(f"  Could not retrieve or display image: {e}")
+                continue
+
+            image = next(images)
+            if image:
+                # On a headless server, we print confirmation instead of .show()
+                print(f"  Image for page {page_num} retrieved successfully.")
+                # image.show() # Uncomment this if running on a local machine with a screen
+            else:
+                print(f"  Failed to download image: {object_name}")
+            print("-" * 40)
+
+        if prefetch_futures:
+            ready = sum(future.done() for future in prefetch_futures.values())
+            print(f"Prefetched next page: {ready}/{len(prefetch_futures)} images ready.")
+
+        return prefetch_futures
+    finally:
+        fetch_pool.shutdown(wait=False)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,484 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import AsyncIterator, Callable, Iterator, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+import config
+from services import llm_service, metrics, qdrant_client, sparse_encoder, tracing, vlm_encoder
+from services.answer_cache import SemanticAnswerCache
+
+# --- Metrics ---
+# Per worker process: with SERVICE_WORKERS > 1 each scrape of /metrics sees
+# the worker that happened to accept it.
+
+REQUESTS = metrics.counter("rag_http_requests_total", "HTTP requests served.", ["endpoint", "status"])
+REQUEST_SECONDS = metrics.histogram("rag_http_request_seconds", "HTTP request latency.", ["endpoint"])
+REQUESTS_IN_FLIGHT = metrics.gauge("rag_http_requests_in_flight", "HTTP requests being handled.", ["endpoint"])
+STAGE_SECONDS = metrics.histogram(
+    "rag_query_stage_seconds", "Query latency by stage (encode, search, hydrate, generate, ttft).", ["stage"]
+)
+EXECUTOR_PENDING = metrics.gauge(
+    "rag_executor_pending_jobs", "Jobs submitted to a worker pool and not finished (queued + running).", ["executor"]
+)
+
+
+def observe_timings(timings: dict):
+    """Records a response's *_ms timings in the per-stage latency histogram."""
+    for key, value_ms in timings.items():
+        if key.endswith("_ms"):
+            STAGE_SECONDS.observe(value_ms / 1000, stage=key[:-3])
+
+# --- Request / Response Schemas ---
+
+class EncodeRequest(BaseModel):
+    query: str
+
+class SearchRequest(BaseModel):
+    query: str
+    top_k: int = config.TOP_K
+    # Restrict the search to these books (routed to their shards when sharded by book)
+    books: Optional[List[str]] = None
+
+class Source(BaseModel):
+    id: int
+    score: float
+    payload: dict
+
+class AnswerRequest(BaseModel):
+    query: str
+    top_k: int = config.TOP_K
+    # Sources from a previous /search call; when omitted /answer retrieves them
+    sources: Optional[List[Source]] = None
+    # Pooled query embedding from the same /search call, used to look up the
+    # answer cache. Answers built from client-supplied sources are never stored.
+    query_embedding: Optional[List[float]] = None
+    books: Optional[List[str]] = None
+
+
+# --- Resource Lifecycle ---
+# Each uvicorn worker process owns one copy of the models and one pooled
+# Qdrant client. Loading happens in the background so /health answers
+# immediately while /ready reports 503 until everything is in place.
+
+class Resources:
+    def __init__(self):
+        self.model = None
+        self.processor = None
+        self.q_client = None
+        self.search_params = None
+        self.llm = None
+        self.ready = False
+        self.error: Optional[str] = None
+        self.answer_cache = SemanticAnswerCache(
+            max_entries=config.ANSWER_CACHE_MAX_ENTRIES,
+            similarity_threshold=config.ANSWER_CACHE_THRESHOLD
+        ) if config.ANSWER_CACHE_ENABLED else None
+        if self.answer_cache is not None:
+            metrics.register_cache("answer", self.answer_cache)
+        self.fingerprint = None
+        self.fingerprint_checked_at = 0.0
+        self.encode_executor = ThreadPoolExecutor(max_workers=config.ENCODE_WORKERS)
+        # Generation runs on its own threads so it never blocks encoding. With
+        # continuous batching, concurrent calls are merged by the scheduler, so
+        # the executor must let up to a full batch wait on it at once.
+        self.llm_executor = ThreadPoolExecutor(
+            max_workers=config.LLM_MAX_BATCH_SIZE if config.LLM_CONTINUOUS_BATCHING else 1
+        )
+
+    async def load(self):
+        loop = asyncio.get_running_loop()
+        try:
+            self.model, self.processor = await loop.run_in_executor(
+                self.encode_executor,
+                vlm_encoder.load_vlm_model,
+                config.MODEL_NAME,
+                config.DEVICE,
+                config.WEIGHT_SNAPSHOT_DIR,
+                config.ENCODER_BACKEND
+            )
+            self.search_params = qdrant_client.build_search_params(
+                hnsw_ef=config.SEARCH_HNSW_EF,
+                exact=config.SEARCH_EXACT,
+                rescore=config.QUANTIZATION_RESCORE,
+                oversampling=config.QUANTIZATION_OVERSAMPLING
+            )
+            self.q_client = await qdrant_client.get_async_qdrant_client(
+                config.QDRANT_HOST,
+                config.QDRANT_PORT,
+                prefer_grpc=config.QDRANT_PREFER_GRPC,
+                grpc_port=config.QDRANT_GRPC_PORT,
+                pool_size=config.QDRANT_POOL_SIZE
+            )
+            if config.SERVICE_ENABLE_LLM:
+                self.llm = await loop.run_in_executor(
+                    self.llm_executor,
+                    llm_service.load_llama_service,
+                    config.LLM_MODEL_NAME,
+                    config.DEVICE,
+                    config.LLM_CONTINUOUS_BATCHING,
+                    config.LLM_MAX_BATCH_SIZE,
+                    config.LLM_PREFIX_CACHE,
+                    config.WEIGHT_SNAPSHOT_DIR
+                )
+            self.ready = True
+            print("Retrieval service is ready.")
+        except Exception as e:
+            self.error = str(e)
+            print(f"Failed to load service resources: {e}")
+
+    async def close(self):
+        if self.q_client is not None:
+            await self.q_client.close()
+        self.encode_executor.shutdown(wait=False)
+        self.llm_executor.shutdown(wait=False)
+
+
+resources = Resources()
+
+
+async def flush_traces_periodically():
+    """Writes buffered spans every TRACE_FLUSH_INTERVAL seconds so the buffer never fills."""
+    while True:
+        await asyncio.sleep(config.TRACE_FLUSH_INTERVAL)
+        tracing.flush(config.TRACE_DIR, "server", config.TRACE_FORMAT)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tracing.configure(config.TRACING_ENABLED, service_name="retrieval-service", max_spans=config.TRACE_MAX_SPANS)
+    load_task = asyncio.create_task(resources.load())
+    flush_task = asyncio.create_task(flush_traces_periodically()) if tracing.is_enabled() else None
+    yield
+    load_task.cancel()
+    if flush_task is not None:
+        flush_task.cancel()
+        tracing.flush(config.TRACE_DIR, "server", config.TRACE_FORMAT)
+    await resources.close()
+
+app = FastAPI(title="Digital Library Retrieval Service", lifespan=lifespan)
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    endpoint = request.url.path
+    if not config.METRICS_ENABLED or endpoint == "/metrics" or endpoint not in KNOWN_ENDPOINTS:
+        return await call_next(request)
+    start_time = time.perf_counter()
+    status = 500
+    with REQUESTS_IN_FLIGHT.track_in_progress(endpoint=endpoint):
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # For streamed answers this is the time to response headers
+            REQUEST_SECONDS.observe(time.perf_counter() - start_time, endpoint=endpoint)
+            REQUESTS.inc(endpoint=endpoint, status=str(status))
+
+
+def require_ready():
+    if not resources.ready:
+        raise HTTPException(status_code=503, detail=resources.error or "Service is still loading.")
+
+
+async def collection_fingerprint():
+    """Collection fingerprint for answer-cache invalidation, refreshed at most every few seconds."""
+    now = time.monotonic()
+    if now - resources.fingerprint_checked_at > config.ANSWER_CACHE_CHECK_INTERVAL:
+        try:
+            resources.fingerprint = await qdrant_client.async_get_collection_fingerprint(
+                resources.q_client, config.COLLECTION_NAME
+            )
+        except Exception as e:
+            print(f"Could not read collection fingerprint: {e}")
+            resources.fingerprint = None
+        resources.fingerprint_checked_at = now
+    return resources.fingerprint
+
+
+def point_to_source(point) -> dict:
+    return {"id": point.id, "score": point.score, "payload": point.payload or {}}
+
+
+async def encode_query(query: str) -> dict:
+    """Encodes a query on the encode executor with the configured token pruning."""
+    with EXECUTOR_PENDING.track_in_progress(executor="encode"):
+        return await vlm_encoder.async_encode_query(
+            resources.model,
+            resources.processor,
+            query,
+            config.DEVICE,
+            resources.encode_executor,
+            prune_tokens=config.QUERY_TOKEN_PRUNING,
+            max_query_tokens=config.QUERY_MAX_TOKENS,
+            dedup_threshold=config.QUERY_DEDUP_THRESHOLD
+        )
+
+
+async def stream_on_llm_executor(make_fragments: Callable[[], Iterator[str]]) -> AsyncIterator[str]:
+    """
+    Runs a blocking fragment generator on the LLM executor, holding one of
+    its workers for the whole stream exactly like /answer's generate call,
+    and yields the fragments as they arrive. Without continuous batching
+    that single worker keeps concurrent streams off the model.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+    stopped = threading.Event()
+
+    def produce():
+        fragments = make_fragments()
+        try:
+            for fragment in fragments:
+                loop.call_soon_threadsafe(queue.put_nowait, fragment)
+                if stopped.is_set():
+                    # The client went away; stop generating for it
+                    break
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            fragments.close()
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    with EXECUTOR_PENDING.track_in_progress(executor="llm"):
+        loop.run_in_executor(resources.llm_executor, tracing.run_in_context(produce))
+        try:
+            while (item := await queue.get()) is not done:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stopped.set()
+
+
+async def retrieve(query: str, top_k: int, books: Optional[List[str]] = None) -> dict:
+    """
+    Encodes the query, searches Qdrant (restricted to `books` if given) and
+    hydrates the final results.
+    """
+    with tracing.span("retrieve", top_k=top_k, scoped=books is not None):
+        return await _retrieve(query, top_k, books)
+
+
+async def _retrieve(query: str, top_k: int, books: Optional[List[str]]) -> dict:
+    timings = {}
+    scope = qdrant_client.book_scope_kwargs(
+        books,
+        custom_sharding=config.SHARDING_MODE != "auto",
+        shard_groups=config.SHARD_GROUPS if config.SHARDING_MODE == "book_group" else None
+    )
+
+    start_time = time.perf_counter()
+    query_vectors = await encode_query(query)
+    timings["encode_ms"] = (time.perf_counter() - start_time) * 1000
+
+    start_time = time.perf_counter()
+    if config.SEARCH_MODE == "hybrid":
+        points = await qdrant_client.async_hybrid_search_qdrant(
+            resources.q_client,
+            config.COLLECTION_NAME,
+            query_vectors["initial"],
+            sparse_encoder.encode_query(query),
+            top_k,
+            mode=config.HYBRID_MODE,
+            prefetch_limit=config.HYBRID_PREFETCH_LIMIT,
+            sparse_vector_name=config.SPARSE_VECTOR_NAME,
+            payload_fields=config.SEARCH_PAYLOAD_FIELDS,
+            search_params=resources.search_params,
+            **scope
+        )
+    else:
+        points = await qdrant_client.async_search_qdrant(
+            resources.q_client,
+            config.COLLECTION_NAME,
+            query_vectors["initial"],
+            top_k,
+            payload_fields=config.SEARCH_PAYLOAD_FIELDS,
+            search_params=resources.search_params,
+            prefetch_vector_name=config.SEARCH_PREFETCH_VECTOR,
+            prefetch_limit=config.SEARCH_PREFETCH_LIMIT,
+            **scope
+        )
+    timings["search_ms"] = (time.perf_counter() - start_time) * 1000
+
+    start_time = time.perf_counter()
+    points = await qdrant_client.async_hydrate_points(
+        resources.q_client, config.COLLECTION_NAME, points, config.HYDRATE_PAYLOAD_FIELDS
+    )
+    timings["hydrate_ms"] = (time.perf_counter() - start_time) * 1000
+    observe_timings(timings)
+
+    return {
+        "results": [point_to_source(p) for p in points],
+        "query_embedding": query_vectors["mean_pooling"],
+        "timings": timings
+    }
+
+
+# --- Endpoints ---
+
+@app.get("/health")
+async def health():
+    """Liveness: the process is up and serving HTTP."""
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    """Readiness: models are loaded and Qdrant is reachable."""
+    require_ready()
+    try:
+        await resources.q_client.get_collection(config.COLLECTION_NAME)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Qdrant unavailable: {e}")
+    return {"status": "ready", "llm_enabled": resources.llm is not None}
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus scrape target: counters, gauges and latency histograms of this worker."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.post("/encode")
+async def encode(request: EncodeRequest):
+    require_ready()
+    return await encode_query(request.query)
+
+@app.post("/search")
+async def search(request: SearchRequest):
+    require_ready()
+    with tracing.span("POST /search"):
+        return await retrieve(request.query, request.top_k, request.books)
+
+async def prepare_answer(request: AnswerRequest) -> dict:
+    """Validates an /answer request and resolves its sources and context."""
+    require_ready()
+    if resources.llm is None:
+        raise HTTPException(status_code=503, detail="LLM generation is disabled on this service.")
+
+    if request.sources is not None:
+        # Untrusted: the client controls both the page text and the embedding,
+        # so an answer built from them must not land in the shared cache
+        retrieved = {"results": [s.model_dump() for s in request.sources], "timings": {}, "cacheable": False}
+    else:
+        retrieved = await retrieve(request.query, request.top_k, request.books)
+        retrieved["cacheable"] = True
+    if not retrieved["results"]:
+        raise HTTPException(status_code=404, detail="No relevant pages were retrieved for this query.")
+
+    retrieved["cached_answer"] = None
+    if resources.answer_cache is not None:
+        embedding = retrieved.get("query_embedding") or request.query_embedding
+        if embedding is None:
+            query_vectors = await encode_query(request.query)
+            embedding = query_vectors["mean_pooling"]
+        retrieved["query_embedding"] = embedding
+        retrieved["fingerprint"] = await collection_fingerprint()
+        if retrieved["fingerprint"] is not None:
+            retrieved["cached_answer"] = resources.answer_cache.lookup(
+                embedding, [r["id"] for r in retrieved["results"]], retrieved["fingerprint"]
+            )
+    if retrieved["cached_answer"] is None:
+        retrieved["context"] = resources.llm.assemble_context(retrieved["results"], config.CONTEXT_TOKEN_BUDGET)
+    return retrieved
+
+
+def cache_answer(retrieved: dict, final_answer: str):
+    """
+    Stores a freshly (and successfully) generated answer in the semantic
+    cache, provided its sources and embedding were computed by this server.
+    """
+    if not final_answer or not retrieved.get("cacheable"):
+        return
+    if resources.answer_cache is not None and retrieved.get("fingerprint") is not None:
+        resources.answer_cache.store(
+            retrieved["query_embedding"],
+            [r["id"] for r in retrieved["results"]],
+            final_answer,
+            retrieved["fingerprint"]
+        )
+
+@app.post("/answer")
+async def answer(request: AnswerRequest):
+    with tracing.span("POST /answer") as request_span:
+        return await _answer(request, request_span)
+
+
+async def _answer(request: AnswerRequest, request_span: Optional[tracing.Span]) -> dict:
+    retrieved = await prepare_answer(request)
+    if request_span is not None:
+        request_span.set(cached=retrieved["cached_answer"] is not None)
+    if retrieved["cached_answer"] is not None:
+        return {
+            "answer": retrieved["cached_answer"],
+            "sources": retrieved["results"],
+            "timings": retrieved["timings"],
+            "cached": True
+        }
+
+    context = retrieved["context"]
+    start_time = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    with EXECUTOR_PENDING.track_in_progress(executor="llm"):
+        try:
+            final_answer = await loop.run_in_executor(
+                resources.llm_executor,
+                tracing.run_in_context(partial(resources.llm.generate_answer, request.query, context))
+            )
+        except llm_service.LLMGenerationError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    generate_ms = (time.perf_counter() - start_time) * 1000
+    observe_timings({"generate_ms": generate_ms})
+    timings = {**retrieved["timings"], "generate_ms": generate_ms}
+    cache_answer(retrieved, final_answer)
+
+    return {"answer": final_answer, "sources": retrieved["results"], "timings": timings, "cached": False}
+
+
+@app.post("/answer/stream")
+async def answer_stream(request: AnswerRequest):
+    """Streams the generated answer as plain-text fragments."""
+    retrieved = await prepare_answer(request)
+    if retrieved["cached_answer"] is not None:
+        return StreamingResponse(iter([retrieved["cached_answer"]]), media_type="text/plain; charset=utf-8")
+
+    def fragments():
+        timings = {}
+        answer_parts = []
+        try:
+            for fragment in llm_service.stream_with_timings(
+                resources.llm.stream_answer(request.query, retrieved["context"]), timings
+            ):
+                answer_parts.append(fragment)
+                yield fragment
+        except llm_service.LLMGenerationError as e:
+            # Headers are already sent; tell the reader, but never cache a failed answer
+            print(f"Streamed answer failed: {e}")
+            yield f"\n\n{e}"
+            return
+        print(f"Streamed answer: TTFT {timings.get('ttft_ms', 0):.2f} ms, total {timings.get('total_ms', 0):.2f} ms")
+        stage_timings = {"ttft_ms": timings.get("ttft_ms"), "generate_ms": timings.get("total_ms")}
+        observe_timings({stage: value for stage, value in stage_timings.items() if value is not None})
+        cache_answer(retrieved, "".join(answer_parts).strip())
+
+    return StreamingResponse(stream_on_llm_executor(fragments), media_type="text/plain; charset=utf-8")
+
+
+# Paths reported by the request metrics; anything else (404s, docs) is not
+# labelled so scanners cannot grow the label set without bound.
+KNOWN_ENDPOINTS = {route.path for route in app.routes}
+
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "run_server:app",
+        host=config.SERVICE_HOST,
+        port=config.SERVICE_PORT,
+        workers=config.SERVICE_WORKERS
+    )
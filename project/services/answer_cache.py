@@ -0,0 +1,73 @@
+import threading
+from typing import Hashable, List, Optional
+import numpy as np
+
+class SemanticAnswerCache:
+    """
+    Caches generated answers keyed on the pooled query embedding.
+
+    A lookup hits when a stored query is at least similarity_threshold
+    (cosine) from the new one AND both retrieved the same set of points, so
+    paraphrases reuse an answer only if it was grounded in the same pages.
+    All entries are dropped when the collection fingerprint changes.
+    """
+
+    def __init__(self, max_entries: int = 1024, similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.misses = 0
+        self._fingerprint: Optional[Hashable] = None
+        self._embeddings: Optional[np.ndarray] = None  # (entries, dim), L2-normalised
+        self._point_ids: List[frozenset] = []
+        self._answers: List[str] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalise(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _check_fingerprint(self, fingerprint: Hashable):
+        if fingerprint != self._fingerprint:
+            self._fingerprint = fingerprint
+            self._embeddings = None
+            self._point_ids, self._answers = [], []
+
+    def lookup(self, embedding: List[float], point_ids: List, fingerprint: Hashable) -> Optional[str]:
+        """Returns a cached answer for a near-identical query over the same pages."""
+        query = self._normalise(embedding)
+        wanted = frozenset(point_ids)
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            if self._embeddings is not None:
+                similarities = self._embeddings @ query
+                for index in np.argsort(-similarities):
+                    if similarities[index] < self.similarity_threshold:
+                        break
+                    if self._point_ids[index] == wanted:
+                        self.hits += 1
+                        return self._answers[index]
+            self.misses += 1
+            return None
+
+    def store(self, embedding: List[float], point_ids: List, answer: str, fingerprint: Hashable):
+        query = self._normalise(embedding)
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            if self._embeddings is None:
+                self._embeddings = query[None, :]
+            else:
+                self._embeddings = np.vstack([self._embeddings, query])
+            self._point_ids.append(frozenset(point_ids))
+            self._answers.append(answer)
+            # FIFO eviction keeps the lookup a single small matrix product
+            if len(self._answers) > self.max_entries:
+                self._embeddings = self._embeddings[1:]
+                self._point_ids.pop(0)
+                self._answers.pop(0)
+
+    def clear(self):
+        with self._lock:
+            self._embeddings = None
+            self._point_ids, self._answers = [], []
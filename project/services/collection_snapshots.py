@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import time
+from typing import Optional
+
+from minio import Minio
+
+from services import minio_client, qdrant_client
+
+# A snapshot is stored as <name>.snapshot next to <name>.manifest.json, both
+# locally under snapshot_dir and (optionally) in a MinIO bucket.
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+def snapshot_stem(snapshot_name: str) -> str:
+    return snapshot_name[:-len(".snapshot")] if snapshot_name.endswith(".snapshot") else snapshot_name
+
+
+def _manifest_name(snapshot_name: str) -> str:
+    return snapshot_stem(snapshot_name) + MANIFEST_SUFFIX
+
+
+def snapshot_tag(manifest: dict) -> str:
+    """
+    Short identifier of a snapshot's contents (its checksum, else its name),
+    carried in the name of the collection version restored from it.
+    """
+    source = manifest.get("checksum") or hashlib.sha256(manifest["snapshot"].encode("utf-8")).hexdigest()
+    return "snap" + source[:12]
+
+
+def verify_checksum(snapshot_path: str, manifest: dict):
+    """Refuses a snapshot file whose SHA-256 differs from the one Qdrant reported at export."""
+    expected = manifest.get("checksum")
+    if not expected:
+        print(f"Manifest of {manifest['snapshot']} has no checksum; skipping verification.")
+        return
+    digest = hashlib.sha256()
+    with open(snapshot_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    if digest.hexdigest() != expected:
+        raise ValueError(f"{snapshot_path} is corrupt: checksum {digest.hexdigest()}, manifest expects {expected}")
+
+
+def export_snapshot(
+    q_client,
+    host: str,
+    port: int,
+    collection_name: str,
+    snapshot_dir: str,
+    indexing_settings: dict,
+    m_client: Optional[Minio] = None,
+    bucket_name: Optional[str] = None
+) -> dict:
+    """
+    Snapshots the collection, downloads it to snapshot_dir and writes its
+    indexing manifest (the encoder/BM25 settings the points were built
+    with, plus point counts). With m_client, both files are also uploaded
+    to bucket_name. Returns the manifest.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    start_time = time.perf_counter()
+    # Snapshots belong to the concrete collection behind the alias
+    source_collection = qdrant_client.resolve_alias(q_client, collection_name)
+    description = qdrant_client.create_collection_snapshot(q_client, source_collection)
+    snapshot_path = os.path.join(snapshot_dir, description.name)
+    qdrant_client.download_collection_snapshot(host, port, source_collection, description.name, snapshot_path)
+
+    info = q_client.get_collection(source_collection)
+    manifest = {
+        "snapshot": description.name,
+        "collection": collection_name,
+        "source_collection": source_collection,
+        "created": time.time(),
+        "size_bytes": os.path.getsize(snapshot_path),
+        "checksum": description.checksum,
+        "points_count": info.points_count,
+        "indexing": indexing_settings,
+    }
+    manifest_path = os.path.join(snapshot_dir, _manifest_name(description.name))
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    if m_client is not None and bucket_name:
+        for path in [snapshot_path, manifest_path]:
+            minio_client.upload_file(m_client, bucket_name, os.path.basename(path), path)
+    print(f"Exported {description.name} ({manifest['size_bytes'] / 1024 / 1024:.0f} MB) "
+          f"in {time.perf_counter() - start_time:.1f}s")
+    return manifest
+
+
+def _fetch_file(path: str, m_client: Optional[Minio], bucket_name: Optional[str]):
+    """Downloads path's basename from MinIO into path unless it is already there."""
+    if os.path.exists(path):
+        return
+    if m_client is None or not bucket_name:
+        raise FileNotFoundError(f"{path} not found locally and no MinIO bucket given")
+    if not minio_client.download_file(m_client, bucket_name, os.path.basename(path), path):
+        raise FileNotFoundError(f"{os.path.basename(path)} not found in bucket '{bucket_name}'")
+
+
+def fetch_manifest(
+    snapshot_name: str,
+    snapshot_dir: str,
+    m_client: Optional[Minio] = None,
+    bucket_name: Optional[str] = None
+) -> dict:
+    """Returns a snapshot's manifest, downloading only that small file if needed."""
+    os.makedirs(snapshot_dir, exist_ok=True)
+    manifest_path = os.path.join(snapshot_dir, _manifest_name(snapshot_stem(snapshot_name)))
+    _fetch_file(manifest_path, m_client, bucket_name)
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def fetch_snapshot(
+    snapshot_name: str,
+    snapshot_dir: str,
+    m_client: Optional[Minio] = None,
+    bucket_name: Optional[str] = None
+) -> tuple:
+    """
+    Returns (snapshot_path, manifest) for a snapshot, downloading both files
+    from MinIO first if they are not already in snapshot_dir.
+    """
+    manifest = fetch_manifest(snapshot_name, snapshot_dir, m_client, bucket_name)
+    snapshot_path = os.path.join(snapshot_dir, snapshot_stem(snapshot_name) + ".snapshot")
+    _fetch_file(snapshot_path, m_client, bucket_name)
+    return snapshot_path, manifest
+
+
+def check_manifest(manifest: dict, indexing_settings: dict):
+    """Refuses snapshots whose points were built with different encoder settings."""
+    mismatched = {
+        key: (manifest["indexing"].get(key), value)
+        for key, value in indexing_settings.items()
+        if manifest["indexing"].get(key) != value
+    }
+    if mismatched:
+        details = ", ".join(f"{k}: snapshot={a!r} current={b!r}" for k, (a, b) in mismatched.items())
+        raise ValueError(f"Snapshot {manifest['snapshot']} was indexed with different settings ({details})")
+
+
+def restore_snapshot(
+    q_client,
+    host: str,
+    port: int,
+    collection_name: str,
+    snapshot_name: str,
+    snapshot_dir: str,
+    indexing_settings: Optional[dict] = None,
+    m_client: Optional[Minio] = None,
+    bucket_name: Optional[str] = None,
+    as_alias: bool = True,
+    keep_versions: int = 1
+) -> dict:
+    """
+    Restores collection_name from a snapshot (local or in MinIO), checks it
+    against its manifest checksum and the current indexing settings, and
+    waits until it is green. With as_alias, the snapshot is restored into a
+    new version tagged with snapshot_tag(), the collection_name alias is
+    switched to it only once it is ready, and superseded versions beyond
+    keep_versions are deleted.
+    """
+    start_time = time.perf_counter()
+    snapshot_path, manifest = fetch_snapshot(snapshot_name, snapshot_dir, m_client, bucket_name)
+    verify_checksum(snapshot_path, manifest)
+    if indexing_settings is not None:
+        check_manifest(manifest, indexing_settings)
+    if as_alias:
+        target = qdrant_client.versioned_collection_name(collection_name, snapshot_tag(manifest))
+    else:
+        target = collection_name
+    qdrant_client.upload_collection_snapshot(host, port, target, snapshot_path)
+    try:
+        qdrant_client.wait_for_collection_indexed(q_client, target)
+        points_count = q_client.count(target, exact=True).count
+        if points_count != manifest["points_count"]:
+            raise RuntimeError(f"Restored {points_count} points, manifest expects {manifest['points_count']}")
+    except Exception:
+        if as_alias:
+            # Never leave a half-restored version behind the live one
+            q_client.delete_collection(target)
+        raise
+    if as_alias:
+        qdrant_client.switch_alias(q_client, collection_name, target)
+        qdrant_client.cleanup_collection_versions(q_client, collection_name, keep=keep_versions)
+    print(f"Restored '{target}' ({points_count} points) in {time.perf_counter() - start_time:.1f}s")
+    return manifest
+
+
+def ensure_collection_from_snapshot(
+    q_client,
+    host: str,
+    port: int,
+    collection_name: str,
+    snapshot_name: str,
+    snapshot_dir: str,
+    indexing_settings: Optional[dict] = None,
+    m_client: Optional[Minio] = None,
+    bucket_name: Optional[str] = None,
+    as_alias: bool = True,
+    keep_versions: int = 1
+) -> dict:
+    """
+    Benchmark hook: makes sure collection_name holds exactly the given
+    snapshot. With as_alias, a restore is skipped when the alias already
+    points at a version restored from this snapshot (its name carries
+    snapshot_tag()) with the expected point count. A plain collection
+    records nothing about its origin, so it is always restored.
+    """
+    # Only the manifest is needed to recognise a live restore; the snapshot
+    # itself is downloaded by restore_snapshot when a restore is due
+    manifest = fetch_manifest(snapshot_name, snapshot_dir, m_client, bucket_name)
+    if as_alias:
+        live = qdrant_client.resolve_alias(q_client, collection_name)
+        try:
+            if live.endswith("_" + snapshot_tag(manifest)) \
+                    and q_client.count(live, exact=True).count == manifest["points_count"]:
+                print(f"'{collection_name}' ({live}) already holds snapshot {manifest['snapshot']}.")
+                return manifest
+        except Exception:
+            pass  # Collection does not exist yet
+    return restore_snapshot(
+        q_client, host, port, collection_name, snapshot_name, snapshot_dir,
+        indexing_settings, m_client, bucket_name, as_alias, keep_versions
+    )
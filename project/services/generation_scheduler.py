@@ -0,0 +1,300 @@
+import queue
+import threading
+from typing import Iterator, List, Optional, Tuple, Union
+import torch
+from transformers import DynamicCache
+
+# Per-layer (key, value) tensors shaped (batch, heads, seq_len, head_dim).
+LayerCache = List[Tuple[torch.Tensor, torch.Tensor]]
+
+
+class GenerationRequest:
+    """
+    One in-flight generation. Iterating it yields decoded text fragments as
+    the scheduler produces them and stops once the sequence is retired, or
+    raises the scheduler's exception if generation failed. A consumer that
+    stops reading calls cancel() so the sequence leaves the batch.
+    """
+
+    def __init__(self, input_ids: torch.Tensor, max_new_tokens: int, prefix_cache: Optional[LayerCache] = None):
+        self.input_ids = input_ids
+        self.max_new_tokens = max_new_tokens
+        # Precomputed cache for the leading tokens of input_ids (shared prompt prefix)
+        self.prefix_cache = prefix_cache
+        self.generated: List[int] = []
+        # generated[_prefix_offset:_read_offset] was already streamed; it is
+        # decoded again only as context for the new tokens' leading spaces.
+        self._prefix_offset = 0
+        self._read_offset = 0
+        self._cancelled = threading.Event()
+        self._fragments: "queue.Queue[Union[str, Exception, None]]" = queue.Queue()
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            fragment = self._fragments.get()
+            if fragment is None:
+                return
+            if isinstance(fragment, Exception):
+                raise fragment
+            yield fragment
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Stops generation; the scheduler drops the sequence before its next step."""
+        self._cancelled.set()
+
+    def _fail(self, error: Exception):
+        self._fragments.put(error)
+
+
+def cache_to_layers(cache) -> LayerCache:
+    """Normalises the model's past_key_values into per-layer (key, value) tensors."""
+    if isinstance(cache, (tuple, list)):
+        return [(layer[0], layer[1]) for layer in cache]
+    if hasattr(cache, "layers"):
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    return list(zip(cache.key_cache, cache.value_cache))
+
+
+def layers_to_cache(layers: LayerCache) -> DynamicCache:
+    cache = DynamicCache()
+    for layer_idx, (keys, values) in enumerate(layers):
+        cache.update(keys, values, layer_idx)
+    return cache
+
+
+def _left_pad(tensor: torch.Tensor, amount: int, dim: int) -> torch.Tensor:
+    if amount == 0:
+        return tensor
+    shape = list(tensor.shape)
+    shape[dim] = amount
+    return torch.cat([tensor.new_zeros(shape), tensor], dim=dim)
+
+
+class GenerationScheduler:
+    """
+    Continuous (iteration-level) batching for a causal LM.
+
+    All in-flight sequences share one left-padded KV cache and advance
+    together, one token per decoding step. New requests are prefilled and
+    merged into the batch between steps; finished sequences are dropped
+    from the batch immediately instead of waiting for the longest one.
+    """
+
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        max_batch_size: int = 8,
+        temperature: float = 0.2
+    ):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.temperature = temperature
+        self.device = model.device
+
+        self._pending: "queue.Queue[GenerationRequest]" = queue.Queue()
+        self._active: List[GenerationRequest] = []
+        # Shared cache; decoding steps extend it in place, only admission and
+        # retirement rebuild it.
+        self._cache: Optional[DynamicCache] = None
+        self._attention_mask: Optional[torch.Tensor] = None  # (batch, seq_len)
+        self._positions: Optional[torch.Tensor] = None       # next position id per row
+        self._last_tokens: Optional[torch.Tensor] = None     # last sampled token per row
+
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(
+        self,
+        input_ids: torch.Tensor,
+        max_new_tokens: int,
+        prefix_cache: Optional[LayerCache] = None
+    ) -> GenerationRequest:
+        """
+        Queues a prompt (1-D token ids) and returns its streaming handle.
+        If prefix_cache covers the first tokens of input_ids, only the
+        remainder is prefilled.
+        """
+        request = GenerationRequest(input_ids, max_new_tokens, prefix_cache)
+        self._pending.put(request)
+        return request
+
+    def shutdown(self):
+        self._running = False
+        self._thread.join()
+
+    # --- Scheduling Loop ---
+
+    def _loop(self):
+        while self._running:
+            admitting = None
+            try:
+                if not self._active:
+                    # Idle: block until work arrives instead of spinning
+                    try:
+                        admitting = self._pending.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    self._admit(admitting)
+                    admitting = None
+                while len(self._active) < self.max_batch_size:
+                    try:
+                        admitting = self._pending.get_nowait()
+                    except queue.Empty:
+                        break
+                    self._admit(admitting)
+                    admitting = None
+                if self._active:
+                    self._decode_step()
+            except Exception as e:
+                # The shared batch state may be half-updated: fail every request
+                # in it (and one being admitted) and carry on with an empty batch,
+                # so queued and future requests are still served.
+                affected = self._active + ([admitting] if admitting is not None else [])
+                for request in affected:
+                    request._fail(e)
+                self._reset()
+
+    @torch.no_grad()
+    def _admit(self, request: GenerationRequest):
+        """Prefills one request and merges its cache into the running batch."""
+        if request.cancelled:
+            request._fragments.put(None)
+            return
+        try:
+            input_ids = request.input_ids.to(self.device)
+            if request.prefix_cache is not None:
+                # Copy the shared prefix so this sequence can extend it privately
+                prefix_len = request.prefix_cache[0][0].shape[2]
+                outputs = self.model(
+                    input_ids=input_ids[prefix_len:][None],
+                    past_key_values=layers_to_cache([(k.clone(), v.clone()) for k, v in request.prefix_cache]),
+                    use_cache=True
+                )
+            else:
+                outputs = self.model(input_ids=input_ids[None], use_cache=True)
+        except Exception as e:
+            # Only this request's prefill failed; the running batch is untouched
+            request._fail(e)
+            return
+
+        token = self._sample(outputs.logits[:, -1, :])
+        if self._emit(request, int(token[0])):
+            request._fragments.put(None)
+            return
+
+        layers = cache_to_layers(outputs.past_key_values)
+        seq_len = layers[0][0].shape[2]
+        mask = torch.ones((1, seq_len), dtype=torch.long, device=self.device)
+        position = torch.tensor([seq_len], device=self.device)
+
+        if self._cache is None:
+            self._cache, self._attention_mask = outputs.past_key_values, mask
+            self._positions, self._last_tokens = position, token
+        else:
+            batch_len = self._attention_mask.shape[1]
+            target = max(batch_len, seq_len)
+            self._cache = layers_to_cache([
+                (torch.cat([_left_pad(bk, target - batch_len, 2), _left_pad(nk, target - seq_len, 2)]),
+                 torch.cat([_left_pad(bv, target - batch_len, 2), _left_pad(nv, target - seq_len, 2)]))
+                for (bk, bv), (nk, nv) in zip(cache_to_layers(self._cache), layers)
+            ])
+            self._attention_mask = torch.cat([
+                _left_pad(self._attention_mask, target - batch_len, 1),
+                _left_pad(mask, target - seq_len, 1)
+            ])
+            self._positions = torch.cat([self._positions, position])
+            self._last_tokens = torch.cat([self._last_tokens, token])
+        self._active.append(request)
+
+    @torch.no_grad()
+    def _decode_step(self):
+        """Advances every active sequence by one token and retires finished ones."""
+        cancelled = [request.cancelled for request in self._active]
+        if any(cancelled):
+            self._retire([i for i, done in enumerate(cancelled) if not done], cancelled)
+            if not self._active:
+                return
+        attention_mask = torch.cat([
+            self._attention_mask,
+            self._attention_mask.new_ones((len(self._active), 1))
+        ], dim=1)
+        # A failing step is handled by _loop, which fails the whole batch
+        outputs = self.model(
+            input_ids=self._last_tokens[:, None],
+            attention_mask=attention_mask,
+            position_ids=self._positions[:, None],
+            past_key_values=self._cache,
+            use_cache=True
+        )
+
+        self._cache = outputs.past_key_values
+        self._attention_mask = attention_mask
+        self._positions = self._positions + 1
+        self._last_tokens = self._sample(outputs.logits[:, -1, :])
+
+        finished = [
+            self._emit(request, int(token))
+            for request, token in zip(self._active, self._last_tokens.tolist())
+        ]
+        if any(finished):
+            self._retire([i for i, done in enumerate(finished) if not done], finished)
+
+    def _retire(self, keep: List[int], finished: List[bool]):
+        for request, done in zip(self._active, finished):
+            if done:
+                request._fragments.put(None)
+        if not keep:
+            self._reset()
+            return
+
+        index = torch.tensor(keep, device=self.device)
+        self._active = [self._active[i] for i in keep]
+        self._attention_mask = self._attention_mask.index_select(0, index)
+        self._positions = self._positions.index_select(0, index)
+        self._last_tokens = self._last_tokens.index_select(0, index)
+
+        # Drop leading columns that are padding for every remaining row
+        trim = int((self._attention_mask.sum(dim=0) == 0).long().cumprod(dim=0).sum())
+        self._attention_mask = self._attention_mask[:, trim:]
+        self._cache = layers_to_cache([
+            (k.index_select(0, index)[:, :, trim:], v.index_select(0, index)[:, :, trim:])
+            for k, v in cache_to_layers(self._cache)
+        ])
+
+    def _reset(self):
+        self._active = []
+        self._cache = self._attention_mask = self._positions = self._last_tokens = None
+
+    # --- Token Handling ---
+
+    def _sample(self, logits: torch.Tensor) -> torch.Tensor:
+        if self.temperature <= 0:
+            return logits.argmax(dim=-1)
+        probs = torch.softmax(logits.float() / self.temperature, dim=-1)
+        return torch.multinomial(probs, num_samples=1).squeeze(-1)
+
+    def _emit(self, request: GenerationRequest, token: int) -> bool:
+        """Records a sampled token, streams any new text and reports completion."""
+        if token == self.tokenizer.eos_token_id:
+            return True
+        request.generated.append(token)
+        # Decode only the tokens not yet streamed, prefixed by the previous
+        # fragment's tokens so word-initial spaces come out right
+        window = request.generated[request._prefix_offset:]
+        prefix_text = self.tokenizer.decode(
+            window[:request._read_offset - request._prefix_offset], skip_special_tokens=True
+        )
+        text = self.tokenizer.decode(window, skip_special_tokens=True)
+        # Hold back incomplete multi-byte characters until the next token
+        if not text.endswith("�") and len(text) > len(prefix_text):
+            request._fragments.put(text[len(prefix_text):])
+            request._prefix_offset = request._read_offset
+            request._read_offset = len(request.generated)
+        return len(request.generated) >= request.max_new_tokens
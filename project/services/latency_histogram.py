@@ -0,0 +1,91 @@
+import math
+from typing import Dict, Iterable, List, Optional
+
+
+class LatencyHistogram:
+    """
+    HDR-style latency histogram: values are counted in logarithmic buckets
+    whose width is a fixed fraction of their value, so every percentile is
+    reported within that relative error (1% by default) whatever the
+    range, and memory stays bounded however many samples are recorded.
+    """
+
+    def __init__(self, relative_error: float = 0.01, lowest_ms: float = 0.001):
+        self.relative_error = relative_error
+        self.lowest_ms = lowest_ms
+        self._log_base = math.log1p(2 * relative_error)
+        self._counts: Dict[int, int] = {}
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = math.inf
+        self.max_ms = 0.0
+
+    def _bucket(self, value_ms: float) -> int:
+        return int(math.log(max(value_ms, self.lowest_ms) / self.lowest_ms) / self._log_base)
+
+    def _bucket_value(self, index: int) -> float:
+        # Midpoint of the bucket, within relative_error of any value in it
+        return self.lowest_ms * math.exp((index + 0.5) * self._log_base)
+
+    def record(self, value_ms: float, count: int = 1):
+        index = self._bucket(value_ms)
+        self._counts[index] = self._counts.get(index, 0) + count
+        self.count += count
+        self.total_ms += value_ms * count
+        self.min_ms = min(self.min_ms, value_ms)
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def record_all(self, values_ms: Iterable[float]):
+        for value_ms in values_ms:
+            self.record(value_ms)
+
+    def merge(self, other: "LatencyHistogram"):
+        if other.relative_error != self.relative_error or other.lowest_ms != self.lowest_ms:
+            raise ValueError("Cannot merge histograms with different bucket layouts")
+        for index, count in other._counts.items():
+            self._counts[index] = self._counts.get(index, 0) + count
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.min_ms = min(self.min_ms, other.min_ms)
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Value at the given percentile (0-100), or None if empty."""
+        if not self.count:
+            return None
+        if percent >= 100:
+            return self.max_ms
+        rank = max(1, math.ceil(self.count * percent / 100))
+        seen = 0
+        for index in sorted(self._counts):
+            seen += self._counts[index]
+            if seen >= rank:
+                return min(max(self._bucket_value(index), self.min_ms), self.max_ms)
+        return self.max_ms
+
+    @property
+    def mean_ms(self) -> Optional[float]:
+        return self.total_ms / self.count if self.count else None
+
+    def summary(self, percentiles: List[float] = (50, 90, 95, 99, 99.9)) -> dict:
+        result = {
+            "count": self.count,
+            "mean_ms": self.mean_ms,
+            "min_ms": self.min_ms if self.count else None,
+            "max_ms": self.max_ms if self.count else None,
+        }
+        for percent in percentiles:
+            result[f"p{percent:g}_ms"] = self.percentile(percent)
+        return result
+
+    def to_dict(self) -> dict:
+        """Serialisable form (summary plus non-empty buckets) for result files."""
+        return {
+            "relative_error": self.relative_error,
+            "lowest_ms": self.lowest_ms,
+            **self.summary(),
+            "buckets": [
+                {"value_ms": self._bucket_value(index), "count": self._counts[index]}
+                for index in sorted(self._counts)
+            ],
+        }
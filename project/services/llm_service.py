@@ -1,34 +1,157 @@
-import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
-from typing import List
+from __future__ import annotations
+
+import time
+from threading import Event, Thread
+from typing import TYPE_CHECKING, Iterator, List, Optional
+
+from services import tracing
+
+# torch, transformers and the scheduler (which needs both) are imported on
+# first use, so importing this module stays cheap for processes without an LLM.
+if TYPE_CHECKING:
+    import torch
 
 LLAMA_MODEL_NAME = "meta-llama/Llama-2-7b-chat-hf" 
 
+# The instruction preamble is identical for every request, so its KV cache is
+# computed once at load time and reused; only the suffix is prefilled per call.
+PROMPT_PREFIX = """
+        ### Instruction:
+        Write a concise, academic answer to the user's question based ONLY on the provided context.
+        If the context does not contain the answer, state: "The required information was not found in the retrieved textbook pages."
+
+        ### Input:
+        Context:
+        ---
+        """
+
+
+class LLMGenerationError(RuntimeError):
+    """Generation failed; raised instead of returning an answer, so callers never mistake (or cache) it as one."""
+
+
+class _GenerationPhases:
+    """
+    Minimal generate() streamer that only timestamps the first new token,
+    so a traced generate call can be split into prefill and decode spans.
+    generate() first passes the prompt ids, then one tensor per step.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.first_token_ns: Optional[int] = None
+        self.new_tokens = 0
+
+    def put(self, value):
+        self.calls += 1
+        if self.calls == 1:
+            return
+        if self.first_token_ns is None:
+            self.first_token_ns = time.perf_counter_ns()
+        self.new_tokens += 1
+
+    def end(self):
+        pass
+
+
+def _stop_when_set(event: Event):
+    """StoppingCriteriaList that ends a running generate() at its next step once event is set."""
+    import torch
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class EventStoppingCriteria(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            return torch.full((input_ids.shape[0],), event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+    return StoppingCriteriaList([EventStoppingCriteria()])
+
+
+def _record_generation(
+    parent: Optional[tracing.Span],
+    start_ns: int,
+    first_token_ns: Optional[int],
+    end_ns: int,
+    **attributes
+):
+    """Records an llm.generate span with its prefill (to first token) and decode phases."""
+    generation = tracing.record_span("llm.generate", start_ns, end_ns, parent=parent, **attributes)
+    if generation is None or first_token_ns is None:
+        return
+    tracing.record_span("llm.prefill", start_ns, first_token_ns, parent=generation)
+    tracing.record_span("llm.decode", first_token_ns, end_ns, parent=generation)
+
+
+def _traced_fragments(fragments: Iterator[str]) -> Iterator[str]:
+    """Passes streamed fragments through, recording prefill/decode spans when it finishes."""
+    parent = tracing.current_span()
+    start_ns = time.perf_counter_ns()
+    first_token_ns = None
+    count = 0
+    try:
+        for fragment in fragments:
+            if first_token_ns is None:
+                first_token_ns = time.perf_counter_ns()
+            count += 1
+            yield fragment
+    finally:
+        _record_generation(parent, start_ns, first_token_ns, time.perf_counter_ns(), streamed=True, fragments=count)
+
 
 class LlamaService:
-    def __init__(self, model_name: str, device: str):
-        """Initializes the Llama model and pipeline."""
+    def __init__(
+        self,
+        model_name: str,
+        device: str,
+        continuous_batching: bool = False,
+        max_batch_size: int = 8,
+        prefix_cache: bool = True,
+        snapshot_dir: Optional[str] = None
+    ):
+        """
+        Initializes the Llama model and pipeline. With continuous_batching,
+        concurrent calls share decoding steps through a GenerationScheduler
+        instead of running one pipeline invocation each. With prefix_cache,
+        the KV cache of PROMPT_PREFIX is prefilled once and reused. A local
+        weight snapshot under snapshot_dir is preferred when present.
+        """
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+        from services.generation_scheduler import GenerationScheduler
+        from services.weight_snapshot import resolve_model_path
+
         print(f"Loading LLM: {model_name} on {device}...")
         self.device = device
         
 
         try:
-            tokenizer = AutoTokenizer.from_pretrained(model_name)
+            model_path = resolve_model_path(model_name, snapshot_dir)
+            tokenizer = AutoTokenizer.from_pretrained(model_path)
   
             model = AutoModelForCausalLM.from_pretrained(
-                model_name,
+                model_path,
                 torch_dtype=torch.bfloat16,
                 device_map="auto"
             )
+            self.model = model
+            self.tokenizer = tokenizer
+            self.max_new_tokens = 512 # Limit generation length for concise answers
+            self.temperature = 0.2    # Low temperature minimizes hallucination
             
             self.pipeline = pipeline(
                 "text-generation",
                 model=model,
                 tokenizer=tokenizer,
-                max_new_tokens=512, # Limit generation length for concise answers
-                temperature=0.2,    # Low temperature minimizes hallucination
+                max_new_tokens=self.max_new_tokens,
+                temperature=self.temperature,
                 return_full_text=False # Return only the generated text
             )
+            self.prefix_ids = tokenizer(PROMPT_PREFIX, return_tensors="pt")["input_ids"][0]
+            self.prefix_cache = self._prefill_prefix() if prefix_cache else None
+            self.scheduler = None
+            if continuous_batching:
+                self.scheduler = GenerationScheduler(
+                    model, tokenizer, max_batch_size=max_batch_size, temperature=self.temperature
+                )
             print("Llama model and pipeline loaded successfully.")
 
         except Exception as e:
@@ -36,32 +159,119 @@ class LlamaService:
             self.pipeline = None
             raise
 
+    def _prefill_prefix(self):
+        """Runs the constant instruction prefix once and keeps its KV cache."""
+        import torch
+        from services.generation_scheduler import cache_to_layers
+
+        with torch.no_grad():
+            outputs = self.model(input_ids=self.prefix_ids[None].to(self.model.device), use_cache=True)
+        return cache_to_layers(outputs.past_key_values)
+
+    def build_prompt(self, query: str, context: str) -> str:
+        """Fills the RAG instruction template with the context and question."""
+        return PROMPT_PREFIX + self._build_prompt_suffix(query, context)
+
+    def _build_prompt_suffix(self, query: str, context: str) -> str:
+        return f"""{context}
+        ---
+        Question: {query}
+
+        ### Response:
+        """
+
+    def encode_prompt(self, query: str, context: str) -> torch.Tensor:
+        """
+        Tokenizes the full prompt as the cached prefix ids followed by the
+        suffix ids, so the leading tokens always match the prefix cache.
+        """
+        import torch
+
+        suffix_ids = self.tokenizer(
+            self._build_prompt_suffix(query, context), add_special_tokens=False, return_tensors="pt"
+        )["input_ids"][0]
+        return torch.cat([self.prefix_ids, suffix_ids])
+
+    def _generation_inputs(self, query: str, context: str) -> dict:
+        """Builds model.generate inputs, seeding it with a copy of the prefix cache."""
+        import torch
+        from services.generation_scheduler import layers_to_cache
+
+        input_ids = self.encode_prompt(query, context)[None].to(self.model.device)
+        inputs = {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+        if self.prefix_cache is not None:
+            inputs["past_key_values"] = layers_to_cache(
+                [(k.clone(), v.clone()) for k, v in self.prefix_cache]
+            )
+        return inputs
+
+    def assemble_context(self, sources: List[dict], max_tokens: int) -> str:
+        """
+        Compiles retrieved pages into citable context blocks within a token
+        budget. Pages are taken in descending retrieval score; the page that
+        crosses the budget is truncated and the rest are dropped, so prompt
+        length (and prefill time) stays bounded.
+        """
+        context_list = []
+        remaining = max_tokens
+        for source in sorted(sources, key=lambda s: s.get("score", 0.0), reverse=True):
+            payload = source["payload"]
+            source_info = f"[Source: Book {payload.get('book_name')} Page {payload.get('page_number')}]\n"
+            header_tokens = len(self.tokenizer(source_info, add_special_tokens=False)["input_ids"])
+            if remaining <= header_tokens:
+                break
+            text_ids = self.tokenizer(
+                payload.get('page_text', 'Page text not found.'), add_special_tokens=False
+            )["input_ids"][:remaining - header_tokens]
+            context_list.append(source_info + self.tokenizer.decode(text_ids))
+            remaining -= header_tokens + len(text_ids)
+        return "\n---\n".join(context_list)
+
     def generate_answer(self, query: str, context: str) -> str:
         """
         Generates an answer based on the provided context using the Llama model.
+        Raises LLMGenerationError if generation fails.
         """
         if not self.pipeline:
-            return "LLM service is not initialized."
+            raise LLMGenerationError("LLM service is not initialized.")
 
+        prompt_template = self.build_prompt(query, context)
 
-        prompt_template = f"""
-        ### Instruction:
-        Write a concise, academic answer to the user's question based ONLY on the provided context.
-        If the context does not contain the answer, state: "The required information was not found in the retrieved textbook pages."
+        if self.scheduler:
+            return "".join(self.stream_answer(query, context)).strip()
 
-        ### Input:
-        Context:
-        ---
-        {context}
-        ---
-        Question: {query}
+        # Only allocated while tracing, so untraced calls run generate() unchanged
+        phases = _GenerationPhases() if tracing.is_enabled() else None
+        start_ns = time.perf_counter_ns()
 
-        ### Response:
-        """
+        if self.prefix_cache is not None:
+            try:
+                inputs = self._generation_inputs(query, context)
+                output_ids = self.model.generate(
+                    **inputs,
+                    max_new_tokens=self.max_new_tokens,
+                    do_sample=True,
+                    temperature=self.temperature,
+                    streamer=phases
+                )
+                if phases is not None:
+                    _record_generation(
+                        tracing.current_span(), start_ns, phases.first_token_ns, time.perf_counter_ns(),
+                        prompt_tokens=inputs["input_ids"].shape[1], new_tokens=phases.new_tokens, prefix_cache=True
+                    )
+                new_tokens = output_ids[0, inputs["input_ids"].shape[1]:]
+                return self.tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
+            except Exception as e:
+                raise LLMGenerationError(f"LLM Generation Runtime Error: {e}") from e
 
         try:
             # Run the generation pipeline
-            result = self.pipeline(prompt_template)
+            result = self.pipeline(prompt_template, streamer=phases)
+            if phases is not None:
+                _record_generation(
+                    tracing.current_span(), start_ns, phases.first_token_ns, time.perf_counter_ns(),
+                    new_tokens=phases.new_tokens, prefix_cache=False
+                )
             
             # Extract the generated text and clean up the response
             answer = result[0]['generated_text'].strip()
@@ -73,8 +283,94 @@ class LlamaService:
             return answer
         
         except Exception as e:
-            return f"LLM Generation Runtime Error: {e}"
+            raise LLMGenerationError(f"LLM Generation Runtime Error: {e}") from e
+
+    def stream_answer(self, query: str, context: str) -> Iterator[str]:
+        """
+        Same as generate_answer, but yields text fragments as soon as the
+        model produces them. Generation runs on a background thread and
+        hands decoded text over through a TextIteratorStreamer. While
+        tracing, prefill is timed up to the first fragment. Iteration raises
+        LLMGenerationError if generation fails, possibly after some fragments.
+        """
+        fragments = self._stream_fragments(query, context)
+        return _traced_fragments(fragments) if tracing.is_enabled() else fragments
+
+    def _stream_fragments(self, query: str, context: str) -> Iterator[str]:
+        if not self.pipeline:
+            raise LLMGenerationError("LLM service is not initialized.")
+
+        if self.scheduler:
+            input_ids = self.encode_prompt(query, context)
+            request = self.scheduler.submit(input_ids, self.max_new_tokens, self.prefix_cache)
+            try:
+                yield from request
+            except Exception as e:
+                raise LLMGenerationError(f"LLM Generation Runtime Error: {e}") from e
+            finally:
+                # No-op once the sequence has finished; frees its batch slot if
+                # the consumer stopped reading early
+                request.cancel()
+            return
+
+        from transformers import TextIteratorStreamer
+
+        inputs = self._generation_inputs(query, context)
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        # Set when the consumer stops early, so generate() does not keep
+        # decoding up to max_new_tokens for nobody
+        stop = Event()
+        generation_kwargs = dict(
+            **inputs,
+            streamer=streamer,
+            stopping_criteria=_stop_when_set(stop),
+            max_new_tokens=self.max_new_tokens,
+            do_sample=True,
+            temperature=self.temperature
+        )
+        errors = []
+
+        def generate():
+            # If generate() raises it never ends the streamer, which would leave
+            # the consumer below blocked; end it here and re-raise over there.
+            try:
+                self.model.generate(**generation_kwargs)
+            except Exception as e:
+                errors.append(e)
+                streamer.end()
+
+        thread = Thread(target=generate, daemon=True)
+        thread.start()
+        try:
+            for text in streamer:
+                if text:
+                    yield text
+            if errors:
+                raise LLMGenerationError(f"LLM Generation Runtime Error: {errors[0]}") from errors[0]
+        finally:
+            stop.set()
+            thread.join()
+
+
+def stream_with_timings(fragments: Iterator[str], timings: dict) -> Iterator[str]:
+    """
+    Passes fragments through unchanged while recording time-to-first-token
+    ('ttft_ms') and total generation time ('total_ms') into timings.
+    """
+    start_time = time.perf_counter()
+    for fragment in fragments:
+        if "ttft_ms" not in timings:
+            timings["ttft_ms"] = (time.perf_counter() - start_time) * 1000
+        yield fragment
+    timings["total_ms"] = (time.perf_counter() - start_time) * 1000
 
 # --- Helper function for easy access in app.py ---
-def load_llama_service(model_name: str, device: str) -> LlamaService:
-    return LlamaService(model_name, device)
\ No newline at end of file
+def load_llama_service(
+    model_name: str,
+    device: str,
+    continuous_batching: bool = False,
+    max_batch_size: int = 8,
+    prefix_cache: bool = True,
+    snapshot_dir: Optional[str] = None
+) -> LlamaService:
+    return LlamaService(model_name, device, continuous_batching, max_batch_size, prefix_cache, snapshot_dir)
\ No newline at end of file
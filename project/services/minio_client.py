@@ -0,0 +1,223 @@
+import io
+import json
+import os
+import asyncio
+from concurrent.futures import Executor, Future
+from typing import List, Optional
+from urllib.parse import urlparse
+import urllib3
+from minio import Minio
+from PIL import Image
+
+def get_minio_client(
+    host: str,
+    access_key: str,
+    secret_key: str,
+    secure: bool,
+    pool_size: int = 32
+) -> Minio:
+    """
+    Initializes and returns the MinIO client.
+    The client keeps a pool of up to pool_size keep-alive connections so
+    concurrent page fetches reuse sockets instead of reconnecting.
+    """
+    print(f"Connecting to MinIO at {host}...")
+    try:
+        http_client = urllib3.PoolManager(
+            num_pools=4,
+            maxsize=pool_size,
+            block=True,
+            timeout=urllib3.Timeout(connect=5, read=60),
+            retries=urllib3.Retry(total=3, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+        )
+        client = Minio(
+            host,
+            access_key=access_key,
+            secret_key=secret_key,
+            secure=secure,
+            http_client=http_client
+        )
+        print("MinIO client created.")
+        return client
+    except Exception as e:
+        print(f"Error connecting to MinIO: {e}")
+        print("Please ensure MinIO Docker container is running.")
+        raise
+
+def list_images_in_bucket(client: Minio, bucket_name: str) -> list:
+    """Lists every object in the bucket, recursively."""
+    try:
+        return list(client.list_objects(bucket_name, recursive=True))
+    except Exception as e:
+        print(f"Error listing objects in bucket '{bucket_name}': {e}")
+        return []
+
+def download_image_to_pil(client: Minio, bucket_name: str, object_name: str) -> Optional[Image.Image]:
+    """Downloads an object from MinIO and returns it as a PIL RGB image."""
+    response = None
+    try:
+        response = client.get_object(bucket_name, object_name)
+        return Image.open(io.BytesIO(response.read())).convert("RGB")
+    except Exception as e:
+        print(f"Error downloading '{object_name}' from MinIO: {e}")
+        return None
+    finally:
+        if response is not None:
+            response.close()
+            response.release_conn()
+
+def upload_image_bytes(
+    client: Minio,
+    bucket_name: str,
+    object_name: str,
+    image: Image.Image,
+    image_format: str = "PNG"
+) -> bool:
+    """Encodes a PIL image and uploads it to MinIO, creating the bucket if needed."""
+    try:
+        if not client.bucket_exists(bucket_name):
+            client.make_bucket(bucket_name)
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format)
+        buffer.seek(0)
+        client.put_object(
+            bucket_name,
+            object_name,
+            buffer,
+            length=buffer.getbuffer().nbytes,
+            content_type=f"image/{image_format.lower()}"
+        )
+        return True
+    except Exception as e:
+        print(f"Error uploading '{object_name}' to MinIO: {e}")
+        return False
+
+def upload_file(client: Minio, bucket_name: str, object_name: str, file_path: str) -> bool:
+    """Uploads a local file (streamed, multipart for large files), creating the bucket if needed."""
+    try:
+        if not client.bucket_exists(bucket_name):
+            client.make_bucket(bucket_name)
+        client.fput_object(bucket_name, object_name, file_path)
+        return True
+    except Exception as e:
+        print(f"Error uploading '{file_path}' to MinIO: {e}")
+        return False
+
+def ensure_public_read_bucket(client: Minio, bucket_name: str) -> bool:
+    """
+    Creates the bucket if needed and lets anonymous clients read (but not
+    list or write) its objects, so browsers and the app can fetch them by
+    URL without credentials. Also applies to an existing private bucket.
+    """
+    policy = {
+        "Version": "2012-10-17",
+        "Statement": [{
+            "Effect": "Allow",
+            "Principal": {"AWS": ["*"]},
+            "Action": ["s3:GetObject"],
+            "Resource": [f"arn:aws:s3:::{bucket_name}/*"],
+        }],
+    }
+    try:
+        if not client.bucket_exists(bucket_name):
+            client.make_bucket(bucket_name)
+        client.set_bucket_policy(bucket_name, json.dumps(policy))
+        return True
+    except Exception as e:
+        print(f"Error setting read-only policy on bucket '{bucket_name}': {e}")
+        return False
+
+def download_file(client: Minio, bucket_name: str, object_name: str, file_path: str) -> bool:
+    """Downloads an object to a local file."""
+    try:
+        client.fget_object(bucket_name, object_name, file_path)
+        return True
+    except Exception as e:
+        print(f"Error downloading '{object_name}' from MinIO: {e}")
+        return False
+
+def thumbnail_object_name(object_name: str, width: int) -> str:
+    """Key of a page thumbnail: the page key under a w<width>/ prefix, as JPEG."""
+    stem, _ = os.path.splitext(object_name)
+    return f"w{width}/{stem}.jpg"
+
+def upload_thumbnails(
+    client: Minio,
+    bucket_name: str,
+    object_name: str,
+    image: Image.Image,
+    widths: List[int]
+) -> bool:
+    """
+    Uploads one JPEG thumbnail per width for a page image, keyed in parallel
+    to the full-resolution object (see thumbnail_object_name). The bucket
+    should be made readable first (ensure_public_read_bucket): thumbnail_url
+    is fetched without credentials.
+    """
+    success = True
+    for width in widths:
+        thumbnail = image.convert("RGB")
+        # Bound only the width; the page aspect ratio is preserved
+        thumbnail.thumbnail((width, width * 10), Image.Resampling.LANCZOS)
+        success &= upload_image_bytes(
+            client, bucket_name, thumbnail_object_name(object_name, width), thumbnail, image_format="JPEG"
+        )
+    return success
+
+def object_name_from_payload(payload: dict, bucket_name: str) -> Optional[str]:
+    """
+    Derives the MinIO object key for a page from its stored payload.
+    Prefers the explicit 'object_name' key and falls back to the path of
+    'page_url' (http://<host>/<bucket>/<object_name>) for older points.
+    """
+    if payload.get("object_name"):
+        return payload["object_name"]
+    page_url = payload.get("page_url")
+    if not page_url:
+        return None
+    path = urlparse(page_url).path.lstrip("/")
+    prefix = f"{bucket_name}/"
+    return path[len(prefix):] if path.startswith(prefix) else path
+
+def submit_image_downloads(
+    executor: Executor,
+    client: Minio,
+    bucket_name: str,
+    object_names: List[str]
+) -> List[Future]:
+    """
+    Schedules downloads on a bounded executor and returns their futures
+    in input order, so callers can wait for some and prefetch others.
+    """
+    return [
+        executor.submit(download_image_to_pil, client, bucket_name, name)
+        for name in object_names
+    ]
+
+# --- Async Variants ---
+# The MinIO SDK is blocking; the async variants run it on an executor so the
+# pooled connections above are shared across many concurrent coroutines.
+
+async def async_download_image_to_pil(
+    client: Minio,
+    bucket_name: str,
+    object_name: str,
+    executor: Optional[Executor] = None
+) -> Optional[Image.Image]:
+    """Async wrapper around download_image_to_pil."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor, download_image_to_pil, client, bucket_name, object_name
+    )
+
+async def async_download_images(
+    client: Minio,
+    bucket_name: str,
+    object_names: List[str],
+    executor: Optional[Executor] = None
+) -> List[Optional[Image.Image]]:
+    """Downloads several objects concurrently, preserving input order."""
+    return await asyncio.gather(*[
+        async_download_image_to_pil(client, bucket_name, name, executor)
+        for name in object_names
+    ])
@@ -0,0 +1,34 @@
+import json
+import socket
+import time
+from contextlib import contextmanager
+
+# One shared UDP socket; markers are fire-and-forget datagrams, so a
+# benchmark runs unchanged (and unslowed) when no monitor is listening.
+_socket = None
+
+
+def mark(phase: str, event: str, host: str, port: int, **fields):
+    """
+    Sends a phase marker ("start" or "end" of `phase`) to the resource
+    monitor (experiments/monitor.py). The send time travels with the
+    marker, so it lines up with the monitor's samples on the same host.
+    """
+    global _socket
+    if _socket is None:
+        _socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    message = {"phase": phase, "event": event, "time": time.time(), **fields}
+    try:
+        _socket.sendto(json.dumps(message).encode("utf-8"), (host, port))
+    except OSError:
+        pass
+
+
+@contextmanager
+def phase(name: str, host: str, port: int, **fields):
+    """Marks the enclosed block as benchmark phase `name`."""
+    mark(name, "start", host, port, **fields)
+    try:
+        yield
+    finally:
+        mark(name, "end", host, port, **fields)
@@ -1,11 +1,61 @@
-from typing import List
-from qdrant_client import QdrantClient, models
+from __future__ import annotations
 
-def get_qdrant_client(host: str, port: int) -> QdrantClient:
+import os
+import time
+import zlib
+from collections import defaultdict
+from typing import TYPE_CHECKING, List, Optional
+
+from services import metrics, tracing
+
+# The qdrant_client package (and its pydantic models) is imported on first
+# use so that importing this module is cheap for scripts that never search.
+if TYPE_CHECKING:
+    from qdrant_client import AsyncQdrantClient, QdrantClient, models
+
+# Every key written to a page payload by run_indexing.py.
+EXPECTED_PAYLOAD_KEYS = ["page_url", "thumbnail_url", "object_name", "page_number", "book_name", "page_text"]
+
+UPSERT_SECONDS = metrics.histogram("rag_qdrant_upsert_seconds", "Duration of one Qdrant upsert request.")
+UPSERT_POINTS = metrics.counter("rag_qdrant_upserted_points_total", "Points sent to Qdrant in successful upserts.")
+UPSERT_RETRIES = metrics.counter("rag_qdrant_upsert_retries_total", "Qdrant upserts retried after an error.")
+UPSERT_FAILURES = metrics.counter("rag_qdrant_upsert_failures_total", "Qdrant upserts dropped after the last retry.")
+
+def _connection_kwargs(
+    host: str,
+    port: int,
+    prefer_grpc: bool,
+    grpc_port: int,
+    pool_size: Optional[int]
+) -> dict:
+    """
+    Shared constructor arguments for the sync and async clients.
+    pool_size bounds the keep-alive HTTP connection pool; with gRPC all
+    requests are multiplexed over one HTTP/2 channel.
+    """
+    import httpx
+
+    kwargs = dict(host=host, port=port, grpc_port=grpc_port, prefer_grpc=prefer_grpc, timeout=60)
+    if pool_size:
+        kwargs["limits"] = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size
+        )
+    return kwargs
+
+def get_qdrant_client(
+    host: str,
+    port: int,
+    prefer_grpc: bool = False,
+    grpc_port: int = 6334,
+    pool_size: Optional[int] = None
+) -> QdrantClient:
     """Initializes and returns the Qdrant client."""
+    from qdrant_client import QdrantClient
+
     print(f"Connecting to Qdrant at {host}:{port}...")
     try:
-        client = QdrantClient(host=host, port=port, timeout=60)
+        client = QdrantClient(**_connection_kwargs(host, port, prefer_grpc, grpc_port, pool_size))
         client.get_collections()
         print("Qdrant connection successful.")
         return client
@@ -14,8 +64,110 @@ def get_qdrant_client(host: str, port: int) -> QdrantClient:
         print("Please ensure Qdrant Docker container is running.")
         raise
 
-def create_qdrant_collection_if_not_exists(client: QdrantClient, collection_name: str, size: int, force_recreate: bool = False):
-    """Creates a scalable Qdrant collection if it doesn't already exist."""
+async def get_async_qdrant_client(
+    host: str,
+    port: int,
+    prefer_grpc: bool = False,
+    grpc_port: int = 6334,
+    pool_size: Optional[int] = None
+) -> AsyncQdrantClient:
+    """
+    Initializes and returns a long-lived async Qdrant client.
+    Create it once per process and share it; call close() on shutdown.
+    """
+    from qdrant_client import AsyncQdrantClient
+
+    print(f"Connecting to Qdrant (async) at {host}:{port}...")
+    try:
+        client = AsyncQdrantClient(**_connection_kwargs(host, port, prefer_grpc, grpc_port, pool_size))
+        await client.get_collections()
+        print("Qdrant connection successful.")
+        return client
+    except Exception as e:
+        print(f"Error connecting to Qdrant: {e}")
+        print("Please ensure Qdrant Docker container is running.")
+        raise
+
+# Named collection layouts, selected with config.COLLECTION_PROFILE.
+#   shard_number / memmap_threshold / on_disk_payload: collection-level storage
+#   vectors_on_disk:   keep original vectors memory-mapped instead of in RAM
+#   hnsw_on_disk:      keep HNSW graphs memory-mapped
+#   binary_always_ram: binary-quantise `initial`, pinning codes in RAM (None = no quantisation)
+#   rerank_only:       vectors that get no HNSW graph (m=0); they are only used
+#                      to rescore candidates prefetched through another vector
+COLLECTION_PROFILES = {
+    "default": dict(
+        shard_number=4, memmap_threshold=20000, on_disk_payload=True,
+        vectors_on_disk=True, hnsw_on_disk=False, binary_always_ram=True, rerank_only=[],
+    ),
+    "ram_heavy": dict(
+        shard_number=4, memmap_threshold=None, on_disk_payload=False,
+        vectors_on_disk=False, hnsw_on_disk=False, binary_always_ram=True, rerank_only=[],
+    ),
+    "disk_heavy": dict(
+        shard_number=4, memmap_threshold=20000, on_disk_payload=True,
+        vectors_on_disk=True, hnsw_on_disk=True, binary_always_ram=False, rerank_only=[],
+    ),
+    "rerank_only": dict(
+        shard_number=4, memmap_threshold=20000, on_disk_payload=True,
+        vectors_on_disk=True, hnsw_on_disk=False, binary_always_ram=True, rerank_only=["initial"],
+    ),
+    "pooled_rerank_only": dict(
+        shard_number=4, memmap_threshold=20000, on_disk_payload=True,
+        vectors_on_disk=True, hnsw_on_disk=False, binary_always_ram=True,
+        rerank_only=["initial", "max_pooling"],
+    ),
+}
+
+
+def get_collection_profile(name: str) -> dict:
+    if name not in COLLECTION_PROFILES:
+        raise ValueError(f"Unknown collection profile '{name}', expected one of {sorted(COLLECTION_PROFILES)}")
+    return COLLECTION_PROFILES[name]
+
+
+def _multivector_params(size: int, profile: dict, rerank_only: bool, quantized: bool) -> models.VectorParams:
+    from qdrant_client import models
+
+    if rerank_only:
+        hnsw_config = models.HnswConfigDiff(m=0)
+    elif profile["hnsw_on_disk"]:
+        hnsw_config = models.HnswConfigDiff(on_disk=True)
+    else:
+        hnsw_config = None
+    quantization_config = None
+    if quantized and profile["binary_always_ram"] is not None:
+        quantization_config = models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=profile["binary_always_ram"]),
+        )
+    return models.VectorParams(
+        size=size,
+        distance=models.Distance.COSINE,
+        on_disk=profile["vectors_on_disk"],
+        multivector_config=models.MultiVectorConfig(
+            comparator=models.MultiVectorComparator.MAX_SIM
+        ),
+        hnsw_config=hnsw_config,
+        quantization_config=quantization_config,
+    )
+
+
+def create_qdrant_collection_if_not_exists(
+    client: QdrantClient,
+    collection_name: str,
+    size: int,
+    force_recreate: bool = False,
+    sparse_vector_name: str = "bm25",
+    profile: str = "default",
+    custom_sharding: bool = False
+):
+    """
+    Creates a scalable Qdrant collection if it doesn't already exist,
+    laid out according to one of COLLECTION_PROFILES. With custom_sharding,
+    points are placed by shard key (see shard_key_for_book) instead of by
+    hash, one shard per key; keys are created with ensure_shard_keys().
+    """
+    from qdrant_client import models
     
     try:
         if force_recreate:
@@ -28,59 +180,357 @@ def create_qdrant_collection_if_not_exists(client: QdrantClient, collection_name
     except Exception:
         print(f"--- Creating Qdrant Collection: {collection_name} ---")
     
-    vector_params_initial = models.VectorParams(
-        size=size,
-        distance=models.Distance.COSINE,
-        on_disk=True, 
-        multivector_config=models.MultiVectorConfig(
-            comparator=models.MultiVectorComparator.MAX_SIM
-        ),
-        quantization_config=models.BinaryQuantization(
-            binary=models.BinaryQuantizationConfig(always_ram=True),
-        ),
-    )
-    vector_params_pooled = models.VectorParams(
-        size=size,
-        distance=models.Distance.COSINE,
-        on_disk=True, 
-        multivector_config=models.MultiVectorConfig(
-            comparator=models.MultiVectorComparator.MAX_SIM
-        )
-    )
+    layout = get_collection_profile(profile)
+    vectors_config = {
+        name: _multivector_params(size, layout, name in layout["rerank_only"], quantized=name == "initial")
+        for name in ["initial", "max_pooling", "mean_pooling"]
+    }
 
     client.recreate_collection(
         collection_name=collection_name,
-        shard_number=4,
-        optimizers_config=models.OptimizersConfigDiff(memmap_threshold=20000),
-        on_disk_payload=True,
-        vectors_config={
-            "initial": vector_params_initial,
-            "max_pooling": vector_params_pooled,
-            "mean_pooling": vector_params_pooled,
+        shard_number=1 if custom_sharding else layout["shard_number"],
+        sharding_method=models.ShardingMethod.CUSTOM if custom_sharding else None,
+        optimizers_config=models.OptimizersConfigDiff(memmap_threshold=layout["memmap_threshold"]),
+        on_disk_payload=layout["on_disk_payload"],
+        vectors_config=vectors_config,
+        # BM25 term weights from page_text; Qdrant applies IDF at query time
+        sparse_vectors_config={
+            sparse_vector_name: models.SparseVectorParams(modifier=models.Modifier.IDF)
         }
     )
-    print("Scalable Qdrant collection created successfully.")
+    # Book-scoped searches filter on book_name
+    client.create_payload_index(
+        collection_name=collection_name,
+        field_name="book_name",
+        field_schema=models.PayloadSchemaType.KEYWORD
+    )
+    print(f"Scalable Qdrant collection created successfully (profile: {profile}"
+          f"{', sharded by book' if custom_sharding else ''}).")
+
+
+def shard_key_for_book(book_name: str, shard_groups: Optional[int] = None) -> str:
+    """
+    Shard key of a book: the book itself, or with shard_groups one of that
+    many stable hash buckets, so many small books can share a shard.
+    """
+    if not shard_groups:
+        return book_name
+    return f"books-{zlib.crc32(book_name.encode('utf-8')) % shard_groups}"
+
+
+def ensure_shard_keys(client: QdrantClient, collection_name: str, shard_keys: List[str], known: set) -> set:
+    """Creates the shard keys not yet in `known` and returns the updated set."""
+    for shard_key in sorted(set(shard_keys) - known):
+        try:
+            client.create_shard_key(collection_name, shard_key)
+        except Exception as e:
+            # Already created by an earlier run against the same collection
+            if "already exists" not in str(e):
+                raise
+        known.add(shard_key)
+    return known
+
+
+def book_scope_kwargs(
+    book_names: Optional[List[str]],
+    custom_sharding: bool = False,
+    shard_groups: Optional[int] = None
+) -> dict:
+    """
+    Search arguments restricting a query to the given books: a book_name
+    filter and, on a book-sharded collection, the shard keys to route to so
+    the query does not fan out to every shard.
+    """
+    from qdrant_client import models
+
+    if not book_names:
+        return {}
+    kwargs = {"query_filter": models.Filter(must=[
+        models.FieldCondition(key="book_name", match=models.MatchAny(any=list(book_names)))
+    ])}
+    if custom_sharding:
+        kwargs["shard_key_selector"] = sorted({shard_key_for_book(b, shard_groups) for b in book_names})
+    return kwargs
+
+
+def wait_for_collection_indexed(
+    client: QdrantClient,
+    collection_name: str,
+    timeout: float = 3600,
+    poll_interval: float = 1.0
+) -> float:
+    """
+    Blocks until the collection status is green (all optimisation and
+    index building finished) and returns the seconds waited.
+    """
+    from qdrant_client import models
+
+    start_time = time.perf_counter()
+    # A config update is picked up asynchronously; give the optimiser one
+    # poll to leave the green state before trusting it.
+    time.sleep(poll_interval)
+    while True:
+        info = client.get_collection(collection_name)
+        if info.status == models.CollectionStatus.GREEN:
+            return time.perf_counter() - start_time
+        if time.perf_counter() - start_time > timeout:
+            raise TimeoutError(f"Collection '{collection_name}' not indexed after {timeout:.0f}s (status: {info.status})")
+        time.sleep(poll_interval)
+
+def begin_bulk_load(client: QdrantClient, collection_name: str):
+    """
+    Stops HNSW index building (indexing_threshold=0) so ingestion only
+    appends to plain segments. Call end_bulk_load() when all points are in.
+    """
+    from qdrant_client import models
+
+    print(f"Bulk-load mode: indexing disabled for '{collection_name}'.")
+    client.update_collection(
+        collection_name=collection_name,
+        optimizers_config=models.OptimizersConfigDiff(indexing_threshold=0)
+    )
+
+
+def end_bulk_load(
+    client: QdrantClient,
+    collection_name: str,
+    indexing_threshold: int = 20000,
+    timeout: float = 3600
+) -> float:
+    """
+    Re-enables indexing, then blocks until the optimiser has built the
+    indexes (collection green). Returns the seconds spent waiting.
+    """
+    from qdrant_client import models
+
+    client.update_collection(
+        collection_name=collection_name,
+        optimizers_config=models.OptimizersConfigDiff(indexing_threshold=indexing_threshold)
+    )
+    print(f"Bulk-load mode: indexing re-enabled for '{collection_name}', waiting for the optimiser...")
+    return wait_for_collection_indexed(client, collection_name, timeout=timeout)
+
 
 def upsert_batch_to_qdrant(
     client: QdrantClient, 
     collection_name: str, 
     point_ids: List[int], 
     payloads: List[dict], 
-    vectors: dict
+    vectors: dict,
+    shard_keys: Optional[List[str]] = None,
+    retries: int = 3,
+    retry_backoff: float = 0.5
+) -> int:
+    """
+    Upserts a batch of points to Qdrant. On a custom-sharded collection,
+    shard_keys gives each point's key; the batch is split into one upsert
+    per key. A failed upsert (e.g. a timeout while Qdrant is busy
+    optimising) is retried up to `retries` times with exponential backoff
+    starting at retry_backoff seconds. Returns the number of points that
+    could not be written.
+    """
+    from qdrant_client import models
+
+    groups = {None: list(range(len(point_ids)))}
+    if shard_keys is not None:
+        groups = defaultdict(list)
+        for index, shard_key in enumerate(shard_keys):
+            groups[shard_key].append(index)
+
+    failed = 0
+    for shard_key, indices in groups.items():
+        batch = models.Batch( 
+            ids=[point_ids[i] for i in indices], 
+            payloads=[payloads[i] for i in indices],
+            vectors={name: [values[i] for i in indices] for name, values in vectors.items()}
+        )
+        for attempt in range(retries + 1):
+            try:
+                with tracing.span("qdrant.upsert", points=len(indices), shard_key=shard_key, attempt=attempt), \
+                        UPSERT_SECONDS.time():
+                    client.upsert(
+                        collection_name=collection_name,
+                        points=batch,
+                        shard_key_selector=shard_key,
+                        wait=False
+                    )
+                UPSERT_POINTS.inc(len(indices))
+                break
+            except Exception as e:
+                if attempt == retries:
+                    print(f"Error during Qdrant upsert, giving up after {retries} retries: {e}")
+                    UPSERT_FAILURES.inc()
+                    failed += len(indices)
+                    break
+                print(f"Error during Qdrant upsert (attempt {attempt + 1}), retrying: {e}")
+                UPSERT_RETRIES.inc()
+                time.sleep(retry_backoff * 2 ** attempt)
+    return failed
+
+
+# --- Versioned Collections ---
+# Indexing builds into <alias>_v<timestamp> while readers keep querying the
+# alias; once the new version is fully optimised the alias is switched in
+# one atomic operation and old versions are dropped. A version restored from
+# a snapshot carries a tag naming its contents: <alias>_v<timestamp>_<tag>.
+
+def versioned_collection_name(alias: str, tag: Optional[str] = None) -> str:
+    name = f"{alias}_v{time.strftime('%Y%m%d%H%M%S')}"
+    return f"{name}_{tag}" if tag else name
+
+
+def resolve_alias(client: QdrantClient, name: str) -> str:
+    """Returns the collection an alias points to, or name itself if it is not an alias."""
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == name:
+            return alias.collection_name
+    return name
+
+
+def list_collection_versions(client: QdrantClient, alias: str) -> List[str]:
+    """Versioned collections of an alias, oldest first."""
+    prefix = f"{alias}_v"
+    return sorted(c.name for c in client.get_collections().collections if c.name.startswith(prefix))
+
+
+def switch_alias(client: QdrantClient, alias: str, collection_name: str) -> Optional[str]:
+    """
+    Atomically points alias at collection_name and returns the collection
+    it previously pointed to (None if it was not an alias yet).
+    """
+    from qdrant_client import models
+
+    previous = resolve_alias(client, alias)
+    if previous == alias:
+        previous = None
+        if client.collection_exists(alias):
+            # One-off migration from the pre-alias layout: a real collection
+            # holds the name, so it has to go before the alias can exist.
+            print(f"Dropping legacy collection '{alias}' to replace it with an alias.")
+            client.delete_collection(alias)
+    operations = [models.CreateAliasOperation(
+        create_alias=models.CreateAlias(collection_name=collection_name, alias_name=alias)
+    )]
+    if previous is not None:
+        operations.insert(0, models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias)))
+    client.update_collection_aliases(change_aliases_operations=operations)
+    print(f"Alias '{alias}' now points to '{collection_name}'" + (f" (was '{previous}')." if previous else "."))
+    return previous
+
+
+def cleanup_collection_versions(client: QdrantClient, alias: str, keep: int = 1) -> List[str]:
+    """
+    Deletes versions older than the live one, keeping the `keep` most
+    recent of them for rollback. Newer, not-yet-live versions (a build in
+    progress) are left alone. Returns the deleted names.
+    """
+    live = resolve_alias(client, alias)
+    versions = list_collection_versions(client, alias)
+    if live not in versions:
+        return []
+    older = versions[:versions.index(live)]
+    stale = older[:max(len(older) - keep, 0)]
+    for name in stale:
+        print(f"Deleting old collection version '{name}'")
+        client.delete_collection(name)
+    return stale
+
+
+def get_collection_fingerprint(client: QdrantClient, collection_name: str) -> tuple:
+    """
+    Cheap identifier of the collection's current contents; it changes
+    whenever points are added/removed or the alias is switched to another
+    version. Index progress (indexed_vectors_count) is left out on purpose:
+    it moves while the optimizer runs although the contents do not.
+    """
+    info = client.get_collection(collection_name)
+    return (resolve_alias(client, collection_name), info.points_count)
+
+
+def create_collection_snapshot(client: QdrantClient, collection_name: str) -> models.SnapshotDescription:
+    """Creates a server-side snapshot of the collection and returns its description."""
+    print(f"Creating snapshot of '{collection_name}'...")
+    return client.create_snapshot(collection_name=collection_name, wait=True)
+
+
+def download_collection_snapshot(
+    host: str,
+    port: int,
+    collection_name: str,
+    snapshot_name: str,
+    file_path: str
+) -> str:
+    """
+    Streams a server-side snapshot to a local file over the REST API
+    (the client library only lists and creates snapshots).
+    """
+    import httpx
+
+    url = f"http://{host}:{port}/collections/{collection_name}/snapshots/{snapshot_name}"
+    with httpx.stream("GET", url, timeout=None) as response:
+        response.raise_for_status()
+        with open(file_path, "wb") as f:
+            for chunk in response.iter_bytes(chunk_size=1024 * 1024):
+                f.write(chunk)
+    return file_path
+
+
+def upload_collection_snapshot(
+    host: str,
+    port: int,
+    collection_name: str,
+    file_path: str
 ):
-    """Upserts a batch of points to Qdrant."""
-    try:
-        client.upsert(
-            collection_name=collection_name,
-            points=models.Batch( 
-                ids=point_ids, 
-                payloads=payloads,
-                vectors=vectors
-            ),
-            wait=False
+    """
+    Restores a collection on the target Qdrant from a local snapshot file,
+    creating or replacing it. Snapshot data takes priority over any
+    existing points.
+    """
+    import httpx
+
+    url = f"http://{host}:{port}/collections/{collection_name}/snapshots/upload"
+    print(f"Restoring '{collection_name}' from {file_path}...")
+    with open(file_path, "rb") as f:
+        response = httpx.post(
+            url,
+            params={"priority": "snapshot", "wait": "true"},
+            files={"snapshot": (os.path.basename(file_path), f)},
+            timeout=None
         )
-    except Exception as e:
-        print(f"Error during Qdrant upsert: {e}")
+    response.raise_for_status()
+
+
+def get_expected_payload_keys() -> List[str]:
+    """Returns the payload keys stored for every indexed page."""
+    return list(EXPECTED_PAYLOAD_KEYS)
+
+
+def build_search_params(
+    hnsw_ef: Optional[int] = None,
+    exact: bool = False,
+    rescore: Optional[bool] = None,
+    oversampling: Optional[float] = None,
+    ignore_quantization: bool = False
+) -> Optional[models.SearchParams]:
+    """
+    Builds the query-time search parameters; returns None (server defaults)
+    when nothing is overridden.
+    hnsw_ef:      HNSW beam width, higher is slower but more accurate.
+    exact:        brute-force scan, used as ground truth.
+    rescore:      re-rank quantised candidates with the original vectors.
+    oversampling: fetch oversampling * limit quantised candidates before
+                  rescoring.
+    """
+    from qdrant_client import models
+
+    quantization = None
+    if rescore is not None or oversampling is not None or ignore_quantization:
+        quantization = models.QuantizationSearchParams(
+            ignore=ignore_quantization, rescore=rescore, oversampling=oversampling
+        )
+    if hnsw_ef is None and not exact and quantization is None:
+        return None
+    return models.SearchParams(hnsw_ef=hnsw_ef, exact=exact, quantization=quantization)
 
 
 def search_qdrant(
@@ -88,21 +538,297 @@ def search_qdrant(
     collection_name: str, 
     query_vector: List[List[float]], 
     top_k: int,
-    vector_name: str = "mean_pooling"
+    vector_name: str = "initial",
+    payload_fields: Optional[List[str]] = None,
+    search_params: Optional[models.SearchParams] = None,
+    prefetch_vector_name: Optional[str] = None,
+    prefetch_limit: int = 100,
+    query_filter: Optional[models.Filter] = None,
+    shard_key_selector: Optional[List[str]] = None
 ) -> List[models.ScoredPoint]:
     """
-    Searches Qdrant using the ColPali multi-vector query.
+    Searches Qdrant using the ColPali multi-vector query against the
+    vector_name field ("initial", "max_pooling" or "mean_pooling"); every
+    field is queried with the query's token vectors (encode_query()["initial"]).
+    If payload_fields is given, only those payload keys are returned;
+    use hydrate_points() afterwards to fetch the heavy fields for the
+    final results. search_params comes from build_search_params().
+    With prefetch_vector_name, candidates come from that (HNSW-indexed)
+    vector and are rescored on the searched one, as needed by collection
+    profiles whose `initial` vector is rerank-only. query_filter and
+    shard_key_selector scope the search (see book_scope_kwargs).
     """
     print("Searching Qdrant for top matches...")
     try:
-        search_results = client.query_points(
-            collection_name=collection_name,
-            query=query_vector, 
-            limit=top_k, 
-            using="initial",
-            with_payload=True
-        )
+        with tracing.span("qdrant.search", vector_name=vector_name, top_k=top_k):
+            search_results = client.query_points(
+                collection_name=collection_name,
+                limit=top_k, 
+                query_filter=query_filter,
+                shard_key_selector=shard_key_selector,
+                with_payload=payload_fields if payload_fields is not None else True,
+                **_dense_query_kwargs(query_vector, vector_name, search_params, prefetch_vector_name, prefetch_limit)
+            )
         return search_results.points
     except Exception as e:
         print(f"Error during diagnostic search: {e}")
-        return []
\ No newline at end of file
+        return []
+
+
+def _dense_query_kwargs(
+    query_vector: List[List[float]],
+    vector_name: str,
+    search_params: Optional[models.SearchParams],
+    prefetch_vector_name: Optional[str],
+    prefetch_limit: int
+) -> dict:
+    """Builds the query_points arguments shared by the sync and async dense search."""
+    from qdrant_client import models
+
+    if prefetch_vector_name is None:
+        return dict(query=query_vector, using=vector_name, search_params=search_params)
+    prefetch = models.Prefetch(
+        query=query_vector, using=prefetch_vector_name, limit=prefetch_limit, params=search_params
+    )
+    return dict(prefetch=prefetch, query=query_vector, using=vector_name)
+
+
+def _hybrid_query_kwargs(
+    query_vector: List[List[float]],
+    sparse_vector: models.SparseVector,
+    mode: str,
+    prefetch_limit: int,
+    vector_name: str,
+    sparse_vector_name: str,
+    search_params: Optional[models.SearchParams] = None
+) -> dict:
+    """Builds the query_points arguments shared by the sync and async hybrid search."""
+    from qdrant_client import models
+
+    sparse_prefetch = models.Prefetch(
+        query=sparse_vector, using=sparse_vector_name, limit=prefetch_limit
+    )
+    if mode == "rerank":
+        return dict(prefetch=sparse_prefetch, query=query_vector, using=vector_name, search_params=search_params)
+    if mode == "rrf":
+        dense_prefetch = models.Prefetch(
+            query=query_vector, using=vector_name, limit=prefetch_limit, params=search_params
+        )
+        return dict(
+            prefetch=[sparse_prefetch, dense_prefetch],
+            query=models.FusionQuery(fusion=models.Fusion.RRF)
+        )
+    raise ValueError(f"Unknown hybrid search mode: {mode}")
+
+
+def hybrid_search_qdrant(
+    client: QdrantClient,
+    collection_name: str,
+    query_vector: List[List[float]],
+    sparse_vector: models.SparseVector,
+    top_k: int,
+    mode: str = "rerank",
+    prefetch_limit: int = 100,
+    vector_name: str = "initial",
+    sparse_vector_name: str = "bm25",
+    payload_fields: Optional[List[str]] = None,
+    search_params: Optional[models.SearchParams] = None,
+    query_filter: Optional[models.Filter] = None,
+    shard_key_selector: Optional[List[str]] = None
+) -> List[models.ScoredPoint]:
+    """
+    Searches Qdrant with a sparse BM25 first stage combined with ColPali.
+    mode="rerank": BM25 candidates are rescored with multi-vector MaxSim,
+                   so MaxSim only runs over prefetch_limit points.
+    mode="rrf":    BM25 and dense candidate lists are fused with
+                   Reciprocal Rank Fusion.
+    search_params applies to the dense stage.
+    """
+    query_kwargs = _hybrid_query_kwargs(
+        query_vector, sparse_vector, mode, prefetch_limit, vector_name, sparse_vector_name, search_params
+    )
+    print(f"Searching Qdrant (hybrid, {mode}) for top matches...")
+    try:
+        with tracing.span("qdrant.hybrid_search", mode=mode, vector_name=vector_name, top_k=top_k):
+            search_results = client.query_points(
+                collection_name=collection_name,
+                limit=top_k,
+                query_filter=query_filter,
+                shard_key_selector=shard_key_selector,
+                with_payload=payload_fields if payload_fields is not None else True,
+                **query_kwargs
+            )
+        return search_results.points
+    except Exception as e:
+        print(f"Error during hybrid search: {e}")
+        return []
+
+
+def _merge_payloads(points: List[models.ScoredPoint], records: List[models.Record]) -> List[models.ScoredPoint]:
+    """Merges retrieved payload fields into the scored points, in place."""
+    payload_by_id = {record.id: record.payload or {} for record in records}
+    for point in points:
+        point.payload = {**(point.payload or {}), **payload_by_id.get(point.id, {})}
+    return points
+
+
+def hydrate_points(
+    client: QdrantClient,
+    collection_name: str,
+    points: List[models.ScoredPoint],
+    payload_fields: List[str]
+) -> List[models.ScoredPoint]:
+    """
+    Fetches the given payload fields for already-scored points in a single
+    batched retrieve and merges them into each point's payload in place.
+    """
+    if not points:
+        return points
+    try:
+        with tracing.span("qdrant.hydrate", points=len(points)):
+            records = client.retrieve(
+                collection_name=collection_name,
+                ids=[point.id for point in points],
+                with_payload=payload_fields,
+                with_vectors=False
+            )
+    except Exception as e:
+        print(f"Error during payload hydration: {e}")
+        return points
+
+    return _merge_payloads(points, records)
+
+
+# --- Async Variants ---
+# These mirror the functions above for use with a shared AsyncQdrantClient.
+# They skip the per-call prints, which would dominate at high concurrency.
+
+async def async_get_collection_fingerprint(client: AsyncQdrantClient, collection_name: str) -> tuple:
+    """Async counterpart of get_collection_fingerprint."""
+    info = await client.get_collection(collection_name)
+    aliases = (await client.get_aliases()).aliases
+    resolved = next((a.collection_name for a in aliases if a.alias_name == collection_name), collection_name)
+    return (resolved, info.points_count)
+
+
+async def async_search_qdrant(
+    client: AsyncQdrantClient,
+    collection_name: str,
+    query_vector: List[List[float]],
+    top_k: int,
+    vector_name: str = "initial",
+    payload_fields: Optional[List[str]] = None,
+    search_params: Optional[models.SearchParams] = None,
+    prefetch_vector_name: Optional[str] = None,
+    prefetch_limit: int = 100,
+    query_filter: Optional[models.Filter] = None,
+    shard_key_selector: Optional[List[str]] = None
+) -> List[models.ScoredPoint]:
+    """Async counterpart of search_qdrant."""
+    try:
+        with tracing.span("qdrant.search", vector_name=vector_name, top_k=top_k):
+            search_results = await client.query_points(
+                collection_name=collection_name,
+                limit=top_k,
+                query_filter=query_filter,
+                shard_key_selector=shard_key_selector,
+                with_payload=payload_fields if payload_fields is not None else True,
+                **_dense_query_kwargs(query_vector, vector_name, search_params, prefetch_vector_name, prefetch_limit)
+            )
+        return search_results.points
+    except Exception as e:
+        print(f"Error during async search: {e}")
+        return []
+
+
+async def async_hybrid_search_qdrant(
+    client: AsyncQdrantClient,
+    collection_name: str,
+    query_vector: List[List[float]],
+    sparse_vector: models.SparseVector,
+    top_k: int,
+    mode: str = "rerank",
+    prefetch_limit: int = 100,
+    vector_name: str = "initial",
+    sparse_vector_name: str = "bm25",
+    payload_fields: Optional[List[str]] = None,
+    search_params: Optional[models.SearchParams] = None,
+    query_filter: Optional[models.Filter] = None,
+    shard_key_selector: Optional[List[str]] = None
+) -> List[models.ScoredPoint]:
+    """Async counterpart of hybrid_search_qdrant."""
+    query_kwargs = _hybrid_query_kwargs(
+        query_vector, sparse_vector, mode, prefetch_limit, vector_name, sparse_vector_name, search_params
+    )
+    try:
+        with tracing.span("qdrant.hybrid_search", mode=mode, vector_name=vector_name, top_k=top_k):
+            search_results = await client.query_points(
+                collection_name=collection_name,
+                limit=top_k,
+                query_filter=query_filter,
+                shard_key_selector=shard_key_selector,
+                with_payload=payload_fields if payload_fields is not None else True,
+                **query_kwargs
+            )
+        return search_results.points
+    except Exception as e:
+        print(f"Error during async hybrid search: {e}")
+        return []
+
+
+async def async_batch_search_qdrant(
+    client: AsyncQdrantClient,
+    collection_name: str,
+    query_vectors: List[List[List[float]]],
+    top_k: int,
+    vector_name: str = "initial",
+    payload_fields: Optional[List[str]] = None,
+    search_params: Optional[models.SearchParams] = None
+) -> List[List[models.ScoredPoint]]:
+    """Runs several multi-vector queries in one round trip."""
+    from qdrant_client import models
+
+    requests = [
+        models.QueryRequest(
+            query=query_vector,
+            using=vector_name,
+            limit=top_k,
+            params=search_params,
+            with_payload=payload_fields if payload_fields is not None else True
+        )
+        for query_vector in query_vectors
+    ]
+    try:
+        with tracing.span("qdrant.batch_search", queries=len(requests), vector_name=vector_name):
+            responses = await client.query_batch_points(
+                collection_name=collection_name,
+                requests=requests
+            )
+        return [response.points for response in responses]
+    except Exception as e:
+        print(f"Error during async batch search: {e}")
+        return [[] for _ in query_vectors]
+
+
+async def async_hydrate_points(
+    client: AsyncQdrantClient,
+    collection_name: str,
+    points: List[models.ScoredPoint],
+    payload_fields: List[str]
+) -> List[models.ScoredPoint]:
+    """Async counterpart of hydrate_points."""
+    if not points:
+        return points
+    try:
+        with tracing.span("qdrant.hydrate", points=len(points)):
+            records = await client.retrieve(
+                collection_name=collection_name,
+                ids=[point.id for point in points],
+                with_payload=payload_fields,
+                with_vectors=False
+            )
+    except Exception as e:
+        print(f"Error during async payload hydration: {e}")
+        return points
+
+    return _merge_payloads(points, records)
\ No newline at end of file
@@ -0,0 +1,92 @@
+import time
+from typing import Iterator, List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+
+def get_api_session(pool_size: int = 10) -> requests.Session:
+    """Returns a keep-alive HTTP session for talking to run_server.py."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def is_ready(session: requests.Session, base_url: str) -> bool:
+    """True once the service has loaded its models and can reach Qdrant."""
+    try:
+        return session.get(f"{base_url}/ready", timeout=5).status_code == 200
+    except requests.RequestException:
+        return False
+
+def search(
+    session: requests.Session,
+    base_url: str,
+    query: str,
+    top_k: int,
+    timeout: float = 120,
+    books: Optional[List[str]] = None
+) -> dict:
+    """
+    Calls /search, optionally restricted to the given books. Returns
+    {"results": [{"id", "score", "payload"}, ...], "query_embedding": [...],
+    "timings": {...}}; raises requests.HTTPError on a non-2xx response.
+    """
+    payload = {"query": query, "top_k": top_k}
+    if books:
+        payload["books"] = books
+    response = session.post(f"{base_url}/search", json=payload, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+def answer(
+    session: requests.Session,
+    base_url: str,
+    query: str,
+    sources: Optional[List[dict]] = None,
+    top_k: int = 5,
+    timeout: float = 120,
+    query_embedding: Optional[List[float]] = None
+) -> dict:
+    """
+    Calls /answer. Pass the results and query_embedding of a previous
+    search() to skip a second retrieval and encode; raises
+    requests.HTTPError on a non-2xx response.
+    """
+    body = {"query": query, "top_k": top_k}
+    if sources is not None:
+        body["sources"] = sources
+    if query_embedding is not None:
+        body["query_embedding"] = query_embedding
+    response = session.post(f"{base_url}/answer", json=body, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+def stream_answer(
+    session: requests.Session,
+    base_url: str,
+    query: str,
+    sources: Optional[List[dict]] = None,
+    top_k: int = 5,
+    timeout: float = 120,
+    timings: Optional[dict] = None,
+    query_embedding: Optional[List[float]] = None
+) -> Iterator[str]:
+    """
+    Calls /answer/stream and yields answer text as it arrives. If timings
+    is given, client-observed 'ttft_ms' and 'total_ms' are recorded in it.
+    """
+    body = {"query": query, "top_k": top_k}
+    if sources is not None:
+        body["sources"] = sources
+    if query_embedding is not None:
+        body["query_embedding"] = query_embedding
+    start_time = time.perf_counter()
+    with session.post(f"{base_url}/answer/stream", json=body, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        response.encoding = "utf-8"
+        for fragment in response.iter_content(chunk_size=None, decode_unicode=True):
+            if timings is not None and "ttft_ms" not in timings:
+                timings["ttft_ms"] = (time.perf_counter() - start_time) * 1000
+            yield fragment
+    if timings is not None:
+        timings["total_ms"] = (time.perf_counter() - start_time) * 1000
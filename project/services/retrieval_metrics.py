@@ -0,0 +1,68 @@
+import csv
+import math
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+# A relevant page is identified by (book_name, page_number)
+PageKey = Tuple[str, int]
+
+
+def load_qrels(path: str) -> Dict[str, Dict[PageKey, int]]:
+    """
+    Reads a tab-separated qrels file:
+        query <TAB> book_name <TAB> page_number [<TAB> grade]
+    Blank lines and lines starting with # are ignored; grade defaults to 1.
+    Grade 0 marks a page judged not relevant: the query is kept, the page
+    is not. Returns {query: {(book_name, page_number): grade}}, in file order.
+    """
+    qrels: Dict[str, Dict[PageKey, int]] = defaultdict(dict)
+    with open(path, newline="") as f:
+        for line_number, row in enumerate(csv.reader(f, delimiter="\t"), start=1):
+            if not row or not row[0].strip() or row[0].lstrip().startswith("#"):
+                continue
+            if len(row) not in (3, 4):
+                raise ValueError(f"{path}:{line_number}: expected 3 or 4 tab-separated columns, got {len(row)}")
+            grade = int(row[3]) if len(row) == 4 else 1
+            judged = qrels[row[0].strip()]
+            if grade > 0:
+                judged[(row[1].strip(), int(row[2]))] = grade
+    return dict(qrels)
+
+
+def page_key(payload: dict) -> PageKey:
+    return payload.get("book_name"), payload.get("page_number")
+
+
+def recall_at_k(ranked: Sequence[PageKey], relevant: Dict[PageKey, int], k: int) -> float:
+    """Fraction of the relevant pages found in the top k."""
+    if not relevant:
+        return 0.0
+    return len(set(ranked[:k]) & set(relevant)) / len(relevant)
+
+
+def reciprocal_rank(ranked: Sequence[PageKey], relevant: Dict[PageKey, int]) -> float:
+    """1 / rank of the first relevant page, 0 if none was retrieved."""
+    for rank, key in enumerate(ranked, start=1):
+        if key in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def ndcg_at_k(ranked: Sequence[PageKey], relevant: Dict[PageKey, int], k: int) -> float:
+    """Normalised DCG over the top k using the graded relevance (2^grade - 1 gain)."""
+    dcg = sum(
+        (2 ** relevant.get(key, 0) - 1) / math.log2(rank + 1)
+        for rank, key in enumerate(ranked[:k], start=1)
+    )
+    ideal = sorted(relevant.values(), reverse=True)[:k]
+    idcg = sum((2 ** grade - 1) / math.log2(rank + 1) for rank, grade in enumerate(ideal, start=1))
+    return dcg / idcg if idcg else 0.0
+
+
+def score_ranking(ranked: List[PageKey], relevant: Dict[PageKey, int], k: int) -> dict:
+    """All quality metrics for one query's ranking."""
+    return {
+        f"recall_at_{k}": recall_at_k(ranked, relevant, k),
+        "mrr": reciprocal_rank(ranked[:k], relevant),
+        f"ndcg_at_{k}": ndcg_at_k(ranked, relevant, k),
+    }
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import re
+import zlib
+from collections import Counter
+from typing import TYPE_CHECKING, Dict, List
+
+if TYPE_CHECKING:
+    from qdrant_client import models
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Small English stopword list; these carry no lexical signal for page retrieval.
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "does", "for", "from",
+    "how", "in", "is", "it", "of", "on", "or", "that", "the", "this", "to",
+    "was", "what", "when", "where", "which", "who", "why", "with",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercases and splits text into alphanumeric tokens, dropping stopwords."""
+    return [tok for tok in TOKEN_PATTERN.findall(text.lower()) if tok not in STOPWORDS]
+
+
+def token_index(token: str) -> int:
+    """Maps a token to a stable sparse-vector dimension via CRC32 hashing."""
+    return zlib.crc32(token.encode("utf-8")) & 0x7FFFFFFF
+
+
+def _to_sparse_vector(weights: Dict[int, float]) -> models.SparseVector:
+    from qdrant_client import models
+
+    indices = sorted(weights)
+    return models.SparseVector(indices=indices, values=[weights[i] for i in indices])
+
+
+def encode_document(
+    text: str,
+    k1: float = 1.2,
+    b: float = 0.75,
+    avg_doc_len: float = 256.0
+) -> models.SparseVector:
+    """
+    Encodes page text into the BM25 term-frequency component.
+    The IDF component is applied by Qdrant at query time (Modifier.IDF).
+    """
+    tokens = tokenize(text or "")
+    doc_len = len(tokens)
+    weights: Dict[int, float] = {}
+    for token, tf in Counter(tokens).items():
+        tf_weight = tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len / avg_doc_len))
+        idx = token_index(token)
+        # Hash collisions are rare; merge them rather than dropping a term
+        weights[idx] = weights.get(idx, 0.0) + tf_weight
+    return _to_sparse_vector(weights)
+
+
+def encode_query(text: str) -> models.SparseVector:
+    """Encodes a query as a binary bag of its unique terms."""
+    return _to_sparse_vector({token_index(tok): 1.0 for tok in set(tokenize(text))})
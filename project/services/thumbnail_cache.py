@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+import requests
+
+class ThumbnailCache:
+    """
+    Small in-process LRU cache of thumbnail bytes, bounded by total size.
+    Hot pages are served from memory instead of being re-downloaded on
+    every Streamlit rerun. Failed downloads are remembered for failure_ttl
+    seconds so a missing thumbnail is not re-requested on each rerun.
+    """
+
+    def __init__(self, max_bytes: int, failure_ttl: float = 300.0, max_failures: int = 1024):
+        self.max_bytes = max_bytes
+        self.failure_ttl = failure_ttl
+        self.max_failures = max_failures
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0  # requests answered by a remembered failure
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._failures: "OrderedDict[str, float]" = OrderedDict()  # url -> monotonic time of failure
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._entries.get(url)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(url)
+            self.hits += 1
+            return data
+
+    def put(self, url: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if url in self._entries:
+                self.current_bytes -= len(self._entries.pop(url))
+            self._entries[url] = data
+            self.current_bytes += len(data)
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+
+    def _recently_failed(self, url: str) -> bool:
+        with self._lock:
+            failed_at = self._failures.get(url)
+            if failed_at is None:
+                return False
+            if time.monotonic() - failed_at > self.failure_ttl:
+                del self._failures[url]
+                return False
+            self.negative_hits += 1
+            return True
+
+    def _record_failure(self, url: str):
+        with self._lock:
+            self._failures.pop(url, None)
+            self._failures[url] = time.monotonic()
+            while len(self._failures) > self.max_failures:
+                self._failures.popitem(last=False)
+
+    def fetch(self, session: requests.Session, url: str, timeout: float = 10) -> Optional[bytes]:
+        """
+        Returns the thumbnail bytes for url, downloading them on a miss, or
+        None if the download failed (now or within the last failure_ttl).
+        """
+        if self._recently_failed(url):
+            return None
+        data = self.get(url)
+        if data is not None:
+            return data
+        try:
+            response = session.get(url, timeout=timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"Error fetching thumbnail {url}: {e}")
+            self._record_failure(url)
+            return None
+        self.put(url, response.content)
+        return response.content
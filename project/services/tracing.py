@@ -0,0 +1,243 @@
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Iterator, List, Optional
+
+# Span timestamps come from perf_counter_ns (monotonic, high resolution) and
+# are shifted by this offset into Unix time for the exported files.
+_EPOCH_OFFSET_NS = time.time_ns() - time.perf_counter_ns()
+
+TRACE_FORMATS = ("chrome", "otlp")
+
+
+class Span:
+    """One timed operation. parent is None for the root span of a trace."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent", "lane", "thread_id", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: dict):
+        self.name = name
+        self.parent = parent
+        self.span_id = next(_span_ids)
+        if parent is None:
+            self.trace_id = _new_trace_id()
+            self.lane = next(_lanes)
+        else:
+            self.trace_id = parent.trace_id
+            self.lane = parent.lane
+        self.thread_id = threading.get_ident()
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return (self.end_ns - self.start_ns) / 1e6 if self.end_ns is not None else None
+
+
+class _Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.service_name = "rag"
+        self.max_spans = 100_000
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+
+_tracer = _Tracer()
+_current: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+_span_ids = itertools.count(1)
+_lanes = itertools.count(1)
+_flush_ids = itertools.count(1)
+
+
+def _new_trace_id() -> int:
+    return int.from_bytes(os.urandom(16), "big")
+
+
+def configure(enabled: bool, service_name: str = "rag", max_spans: int = 100_000):
+    """
+    Turns tracing on or off for this process. Finished spans are buffered in
+    memory (at most max_spans; later ones are counted as dropped) until
+    flush() writes them out.
+    """
+    _tracer.enabled = enabled
+    _tracer.service_name = service_name
+    _tracer.max_spans = max_spans
+
+
+def is_enabled() -> bool:
+    return _tracer.enabled
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def _finish(span: Span):
+    with _tracer.lock:
+        if len(_tracer.spans) < _tracer.max_spans:
+            _tracer.spans.append(span)
+        else:
+            _tracer.dropped += 1
+
+
+# Shared no-op context returned while tracing is disabled
+_DISABLED = nullcontext()
+
+
+def span(name: str, **attributes):
+    """
+    Times the enclosed block as a span nested under the current one (per
+    thread and per asyncio task). The with-target is the Span, or None when
+    tracing is disabled, in which case nothing is allocated or recorded.
+    """
+    if not _tracer.enabled:
+        return _DISABLED
+    return _active_span(name, attributes)
+
+
+@contextmanager
+def _active_span(name: str, attributes: dict) -> Iterator[Span]:
+    current = Span(name, _current.get(), attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.attributes["error"] = repr(e)
+        raise
+    finally:
+        current.end_ns = time.perf_counter_ns()
+        _current.reset(token)
+        _finish(current)
+
+
+def record_span(name: str, start_ns: int, end_ns: int, parent: Optional[Span] = None, **attributes) -> Optional[Span]:
+    """
+    Records a span measured elsewhere (perf_counter_ns timestamps), e.g.
+    phases inside a generator where a context manager cannot stay open
+    across yields.
+    """
+    if not _tracer.enabled:
+        return None
+    recorded = Span(name, parent, attributes)
+    recorded.start_ns, recorded.end_ns = start_ns, end_ns
+    _finish(recorded)
+    return recorded
+
+
+def run_in_context(func: Callable) -> Callable:
+    """
+    Binds func to a copy of the caller's context, so spans opened when it
+    later runs on an executor thread nest under the caller's span.
+    """
+    return functools.partial(contextvars.copy_context().run, func)
+
+
+def collect(clear: bool = True) -> List[Span]:
+    """Returns the finished spans (optionally emptying the buffer)."""
+    with _tracer.lock:
+        spans = list(_tracer.spans)
+        if clear:
+            _tracer.spans.clear()
+    return spans
+
+
+def _json_value(value):
+    return value if isinstance(value, (str, int, float, bool)) or value is None else str(value)
+
+
+def to_chrome_trace(spans: List[Span]) -> dict:
+    """
+    Chrome trace-event JSON (chrome://tracing, Perfetto). Each trace gets
+    its own row, so concurrent requests in an async server do not overlap.
+    """
+    pid = os.getpid()
+    events = [
+        {
+            "name": s.name,
+            "ph": "X",
+            "ts": (s.start_ns + _EPOCH_OFFSET_NS) / 1000,
+            "dur": (s.end_ns - s.start_ns) / 1000,
+            "pid": pid,
+            "tid": s.lane,
+            "args": {
+                **{k: _json_value(v) for k, v in s.attributes.items()},
+                "trace_id": f"{s.trace_id:032x}",
+                "thread_id": s.thread_id,
+            },
+        }
+        for s in spans
+    ]
+    return {
+        "traceEvents": events,
+        "displayTimeUnit": "ms",
+        "otherData": {"service": _tracer.service_name, "dropped_spans": _tracer.dropped},
+    }
+
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def to_otlp_json(spans: List[Span]) -> dict:
+    """OTLP/JSON trace export (ExportTraceServiceRequest), loadable by OpenTelemetry collectors."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", _tracer.service_name)]},
+            "scopeSpans": [{
+                "scope": {"name": __name__},
+                "spans": [
+                    {
+                        "traceId": f"{s.trace_id:032x}",
+                        "spanId": f"{s.span_id:016x}",
+                        "parentSpanId": f"{s.parent.span_id:016x}" if s.parent is not None else "",
+                        "name": s.name,
+                        "kind": 1,
+                        "startTimeUnixNano": str(s.start_ns + _EPOCH_OFFSET_NS),
+                        "endTimeUnixNano": str(s.end_ns + _EPOCH_OFFSET_NS),
+                        "attributes": [_otlp_attribute(k, v) for k, v in s.attributes.items()],
+                    }
+                    for s in spans
+                ],
+            }],
+        }]
+    }
+
+
+def flush(trace_dir: str, prefix: str, trace_format: str = "chrome") -> Optional[str]:
+    """
+    Writes the buffered spans to <trace_dir>/<prefix>_<timestamp>_<pid>_<n>.json
+    in the given format and empties the buffer, so long-running processes
+    can flush periodically. Returns the path, or None if there was nothing
+    to write.
+    """
+    if trace_format not in TRACE_FORMATS:
+        raise ValueError(f"Unknown trace format '{trace_format}', expected one of {TRACE_FORMATS}")
+    spans = collect()
+    if not spans:
+        return None
+    document = to_chrome_trace(spans) if trace_format == "chrome" else to_otlp_json(spans)
+    os.makedirs(trace_dir, exist_ok=True)
+    path = os.path.join(
+        trace_dir, f"{prefix}_{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}_{next(_flush_ids)}.json"
+    )
+    with open(path, "w") as f:
+        json.dump(document, f)
+    print(f"Wrote {len(spans)} spans to {path}")
+    return path
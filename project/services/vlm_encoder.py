@@ -1,18 +1,68 @@
-import torch
-from colpali_engine.models import ColPali, ColPaliProcessor
-from typing import List
-from PIL import Image
-
-def load_vlm_model(model_name: str, device: str):
-    """Loads the ColPali model and processor with memory optimizations."""
-    print(f"Loading VLM Model: {model_name} on {device}...")
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import Executor
+from functools import partial
+from typing import TYPE_CHECKING, List, Optional
+
+from services import tracing
+
+# torch and colpali_engine are imported inside the functions that need them,
+# so importing this module does not pay their start-up cost.
+if TYPE_CHECKING:
+    import torch
+    from colpali_engine.models import ColPali, ColPaliProcessor
+    from PIL import Image
+
+ENCODER_BACKENDS = ("bf16", "int8")
+
+
+def _sync_for_trace(device: str):
+    """
+    CUDA kernels run asynchronously; while tracing, wait for them so the
+    forward-pass span covers the GPU work instead of leaking it into the
+    next span that touches the result.
+    """
+    if tracing.is_enabled() and str(device).startswith("cuda"):
+        import torch
+        torch.cuda.synchronize(device)
+
+
+def load_vlm_model(
+    model_name: str,
+    device: str,
+    snapshot_dir: Optional[str] = None,
+    backend: str = "bf16"
+):
+    """
+    Loads the ColPali model and processor with memory optimizations.
+    If prepare_weights.py has written a snapshot under snapshot_dir, the
+    safetensors there are memory-mapped instead of resolving the Hub repo.
+
+    backend="int8" is for CPU nodes without native bf16 kernels: the model
+    is loaded in float32 and its Linear layers are replaced by dynamically
+    quantised int8 versions (weights int8, activations quantised per call).
+    """
+    import torch
+    from colpali_engine.models import ColPali, ColPaliProcessor
+    from services.weight_snapshot import resolve_model_path
+
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend '{backend}', expected one of {ENCODER_BACKENDS}")
+    if backend == "int8" and not str(device).startswith("cpu"):
+        raise ValueError(f"The int8 encoder backend runs on CPU only, got device '{device}'")
+
+    print(f"Loading VLM Model: {model_name} on {device} ({backend})...")
     try:
+        model_path = resolve_model_path(model_name, snapshot_dir)
         model = ColPali.from_pretrained(
-            model_name,
-            dtype=torch.bfloat16,  
+            model_path,
+            dtype=torch.bfloat16 if backend == "bf16" else torch.float32,  
             device_map={"": device},     
         ).eval()
-        processor = ColPaliProcessor.from_pretrained(model_name)
+        if backend == "int8":
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        processor = ColPaliProcessor.from_pretrained(model_path)
         return model, processor
     except Exception as e:
         print(f"\nFailed to initialize VLM model ({model_name}).")
@@ -31,55 +81,153 @@ def encode_batch(
     Encodes a batch of PIL images and returns a dictionary of
     multi-vector embeddings.
     """
+    import torch
+
     batch_size_current = len(image_batch)
     
-    with torch.no_grad():
-        batch_images_processed = processor.process_images(image_batch).to(device)
-        image_embeddings = model(**batch_images_processed)
+    with tracing.span("encode_batch", batch_size=batch_size_current):
+        with torch.no_grad():
+            with tracing.span("encode.process_images"):
+                batch_images_processed = processor.process_images(image_batch).to(device)
+            with tracing.span("encode.forward"):
+                image_embeddings = model(**batch_images_processed)
+                _sync_for_trace(device)
 
-    special_tokens = image_embeddings[:, image_seq_length:, :]
-    reshaped_embeddings = image_embeddings[:, :image_seq_length, :].reshape((batch_size_current, 32, 32, dim))
-    
-    max_pool = torch.cat((torch.max(reshaped_embeddings, dim=2).values, special_tokens), dim=1)
-    mean_pool = torch.cat((torch.mean(reshaped_embeddings, dim=2), special_tokens), dim=1)
+        with tracing.span("encode.pooling"):
+            special_tokens = image_embeddings[:, image_seq_length:, :]
+            reshaped_embeddings = image_embeddings[:, :image_seq_length, :].reshape((batch_size_current, 32, 32, dim))
+            
+            max_pool = torch.cat((torch.max(reshaped_embeddings, dim=2).values, special_tokens), dim=1)
+            mean_pool = torch.cat((torch.mean(reshaped_embeddings, dim=2), special_tokens), dim=1)
+            _sync_for_trace(device)
 
+        with tracing.span("encode.to_list"):
+            return {
+                "max_pooling": max_pool.cpu().float().numpy().tolist(), 
+                "initial": image_embeddings.cpu().float().numpy().tolist(),
+                "mean_pooling": mean_pool.cpu().float().numpy().tolist()
+            }
+
+def prune_query_tokens(
+    embeddings: torch.Tensor,
+    input_ids: torch.Tensor,
+    attention_mask: torch.Tensor,
+    drop_token_ids: List[int],
+    max_tokens: Optional[int] = None,
+    dedup_threshold: float = 0.98
+) -> torch.Tensor:
+    """
+    Selects which query token embeddings (tokens, dim) to send to MaxSim.
+    Every kept query vector is scored against every page token, so:
+      1. padding, special tokens and the <pad> augmentation tokens added by
+         process_queries are dropped (drop_token_ids),
+      2. near-duplicates (cosine >= dedup_threshold to a kept token) are
+         dropped,
+      3. if max_tokens is set, the tokens least similar to the query
+         centroid (the most distinctive ones) are kept.
+    Returns the kept token indices in their original order.
+    """
+    import torch
+
+    keep = attention_mask.bool() & ~torch.isin(input_ids, torch.tensor(drop_token_ids, device=input_ids.device))
+    candidates = keep.nonzero().flatten()
+    if len(candidates) == 0:
+        # Nothing but special tokens (e.g. an empty query): keep the original set
+        return attention_mask.bool().nonzero().flatten()
+
+    vectors = torch.nn.functional.normalize(embeddings[candidates].float(), dim=-1)
+    kept: List[int] = []
+    for i in range(len(candidates)):
+        if kept and float((vectors[kept] @ vectors[i]).max()) >= dedup_threshold:
+            continue
+        kept.append(i)
+
+    if max_tokens is not None and len(kept) > max_tokens:
+        centroid = torch.nn.functional.normalize(vectors[kept].mean(dim=0), dim=0)
+        order = torch.argsort(vectors[kept] @ centroid)[:max_tokens]
+        kept = sorted(kept[j] for j in order.tolist())
+    return candidates[kept]
 
-    return {
-        "max_pooling": max_pool.cpu().float().numpy().tolist(), 
-        "initial": image_embeddings.cpu().float().numpy().tolist(),
-        "mean_pooling": mean_pool.cpu().float().numpy().tolist()
-    }
 
 def encode_query(
     model: ColPali, 
     processor: ColPaliProcessor, 
     query_text: str, 
-    device: str
+    device: str,
+    prune_tokens: bool = False,
+    max_query_tokens: Optional[int] = None,
+    dedup_threshold: float = 0.98
 ) -> dict:
     """
     Encodes a single text query into its multi-vector representation.
+    With prune_tokens, the "initial" multivector only keeps the tokens
+    selected by prune_query_tokens; "mean_pooling" always covers all tokens.
     """
+    import torch
+
     print(f"Encoding query: '{query_text}'...")
 
-    # 1. Process on CPU
-    batch_query = processor.process_queries([query_text])
-    
-    # 2. Move inputs to the device. 
-    # Use the 'device' variable directly here since we will fix the model loading next.
-    batch_query = {k: v.to(device) if hasattr(v, "to") else v for k, v in batch_query.items()}
-
-    with torch.no_grad():
-        # batch_query = processor.process_queries([query_text])
-        # batch_query = {k: v.to(model.device) for k, v in batch_query.items()}
-        model.to(device) 
-        query_embeddings = model(**batch_query)
-    
-    full_vector_list = query_embeddings[0].cpu().float().numpy().tolist()
+    with tracing.span("encode_query") as query_span:
+        # 1. Process on CPU
+        with tracing.span("encode.process_queries"):
+            batch_query = processor.process_queries([query_text])
+            
+            # 2. Move inputs to the device. 
+            # Use the 'device' variable directly here since we will fix the model loading next.
+            batch_query = {k: v.to(device) if hasattr(v, "to") else v for k, v in batch_query.items()}
+
+        with torch.no_grad():
+            # batch_query = processor.process_queries([query_text])
+            # batch_query = {k: v.to(model.device) for k, v in batch_query.items()}
+            model.to(device) 
+            with tracing.span("encode.forward"):
+                query_embeddings = model(**batch_query)
+                _sync_for_trace(device)
+        
+        token_embeddings = query_embeddings[0]
+        if prune_tokens:
+            with tracing.span("encode.prune_tokens"):
+                kept = prune_query_tokens(
+                    token_embeddings,
+                    batch_query["input_ids"][0],
+                    batch_query["attention_mask"][0],
+                    processor.tokenizer.all_special_ids,
+                    max_tokens=max_query_tokens,
+                    dedup_threshold=dedup_threshold
+                )
+                token_embeddings = token_embeddings[kept]
+        if query_span is not None:
+            query_span.set(query_tokens=len(token_embeddings))
+
+        with tracing.span("encode.to_list"):
+            full_vector_list = token_embeddings.cpu().float().numpy().tolist()
 
-    mean_pooled_tensor = torch.mean(query_embeddings, dim=1) 
-    mean_pooled_list = mean_pooled_tensor[0].cpu().float().numpy().tolist()
+            mean_pooled_tensor = torch.mean(query_embeddings, dim=1) 
+            mean_pooled_list = mean_pooled_tensor[0].cpu().float().numpy().tolist()
 
     return {
         "initial": full_vector_list,
         "mean_pooling": mean_pooled_list 
-    }
\ No newline at end of file
+    }
+
+
+async def async_encode_query(
+    model: ColPali,
+    processor: ColPaliProcessor,
+    query_text: str,
+    device: str,
+    executor: Optional[Executor] = None,
+    **encode_kwargs
+) -> dict:
+    """
+    Runs encode_query on an executor so the event loop keeps serving other
+    retrievals while the forward pass runs. Pass a small dedicated executor
+    (config.ENCODE_WORKERS threads) to bound concurrent forward passes.
+    encode_kwargs (token pruning options) are forwarded to encode_query.
+    The caller's trace context is carried over to the executor thread.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor,
+        tracing.run_in_context(partial(encode_query, model, processor, query_text, device, **encode_kwargs))
+    )
\ No newline at end of file
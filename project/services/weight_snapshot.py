@@ -0,0 +1,65 @@
+import json
+import os
+import time
+from typing import Optional
+
+# Written last by save_snapshot, so a half-written directory is never used.
+MANIFEST_FILE = "snapshot.json"
+
+
+def snapshot_path(snapshot_dir: str, model_name: str, dtype: str = "bfloat16") -> str:
+    """Local directory holding the pre-converted weights of model_name."""
+    return os.path.join(snapshot_dir, f"{model_name.replace('/', '--')}-{dtype}")
+
+
+def has_snapshot(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+
+def resolve_model_path(model_name: str, snapshot_dir: Optional[str], dtype: str = "bfloat16") -> str:
+    """
+    Returns the local snapshot directory for model_name if one has been
+    prepared, otherwise model_name itself (resolved by from_pretrained
+    against the Hub cache as before).
+    """
+    if snapshot_dir:
+        path = snapshot_path(snapshot_dir, model_name, dtype)
+        if has_snapshot(path):
+            print(f"Using local weight snapshot: {path}")
+            return path
+    return model_name
+
+
+def _merge_adapters(model):
+    """
+    Folds loaded PEFT (LoRA) adapters into their base layers so the snapshot
+    is a plain checkpoint. ColPali ships as an adapter on top of its base
+    model; without merging, save_pretrained would only write the adapter.
+    """
+    if not getattr(model, "_hf_peft_config_loaded", False):
+        return model
+    from peft.tuners.tuners_utils import BaseTunerLayer
+
+    for name, module in list(model.named_modules()):
+        if isinstance(module, BaseTunerLayer):
+            module.merge()
+            parent_name, _, child_name = name.rpartition(".")
+            setattr(model.get_submodule(parent_name), child_name, module.get_base_layer())
+    model._hf_peft_config_loaded = False
+    if hasattr(model, "peft_config"):
+        del model.peft_config
+    return model
+
+
+def save_snapshot(model, preprocessor, path: str, source: str, dtype: str = "bfloat16"):
+    """
+    Writes model weights as safetensors (memory-mappable, already in the
+    target dtype) alongside its tokenizer/processor, then the manifest.
+    """
+    os.makedirs(path, exist_ok=True)
+    start_time = time.perf_counter()
+    _merge_adapters(model).save_pretrained(path, safe_serialization=True)
+    preprocessor.save_pretrained(path)
+    with open(os.path.join(path, MANIFEST_FILE), "w") as f:
+        json.dump({"source": source, "dtype": dtype, "created": time.time()}, f, indent=2)
+    print(f"Saved snapshot of {source} to {path} in {time.perf_counter() - start_time:.1f}s")